@@ -8,13 +8,18 @@ from tkinter import ttk, messagebox
 import threading
 import numpy as np
 import scipy.signal
-import random
 import pandas as pd
 import glob
 
 from repp.config import sms_tapping
 from repp.stimulus import REPPStimulus
-from repp.analysis import REPPAnalysis
+
+from experiment.prescreen import prescreen_recording
+from experiment.analysis_cache import AnalysisCache, cached_analysis
+from experiment.synth import ear_check_audio, route_to_ear
+from experiment.schedule import cell_for_position, claim_local_position
+from experiment.plan import build_plan, load_plan
+from experiment.sweep import configure
 
 def create_participant_analysis_csv(output, analysis_result, is_failed, trial_num, output_dir, stimulus_num, allocation):
     """
@@ -111,25 +116,50 @@ class RhythmExperimentGUI:
         self.setup_gui()
 
     def setup_experiment(self):
-        self.config = sms_tapping
-
-        # Define rhythms
-        self.simple_rhythms = [
-            [0, 520, 520, 520, 260, 260, 520, 520],
-            [0, 520, 260, 260, 520, 260, 260, 520, 520]
-        ]
-        self.complex_rhythms = [
-            [0, 130, 260, 390, 260, 130, 260, 390, 260],
-            [0, 390, 130, 260, 520, 260, 130, 390]
-        ]
-
-        # Random assignments
-        self.complexity = random.choice(['simple', 'complex'])
-        self.first_ear = random.choice(['right', 'left'])
-        self.sequence_order = random.choice([0, 1])
-
-        # Set rhythms based on complexity
-        self.rhythms = self.simple_rhythms if self.complexity == 'simple' else self.complex_rhythms
+        # The study plan (rhythm sets, trials, breaks, analysis config) comes from
+        # the JSON file in STUDY_PLAN, e.g. a plan exported from the web app;
+        # without one the original two-rhythm design is used
+        if os.environ.get('STUDY_PLAN'):
+            self.plan = load_plan(os.environ['STUDY_PLAN'])
+        else:
+            self.plan = build_plan({
+                'simple': [
+                    [0, 520, 520, 520, 260, 260, 520, 520],
+                    [0, 520, 260, 260, 520, 260, 260, 520, 520]
+                ],
+                'complex': [
+                    [0, 130, 260, 390, 260, 130, 260, 390, 260],
+                    [0, 390, 130, 260, 520, 260, 130, 390]
+                ],
+            })
+        overrides = self.plan.analysis_overrides()
+        self.config = configure(sms_tapping, overrides) if overrides else sms_tapping
+        self.analysis_cache = AnalysisCache()
+
+        # Conditions are allocated from the counterbalanced schedule once the
+        # participant ID is known (see allocate_conditions)
+        self.complexity = None
+        self.first_ear = None
+        self.sequence_order = None
+
+    def allocate_conditions(self):
+        """Claim the next counterbalanced cell, or reuse this participant's earlier allocation."""
+        allocation_path = os.path.join(self.output_dir, 'allocation.txt')
+        if os.path.exists(allocation_path):
+            with open(allocation_path) as f:
+                complexity, stimulus, ear = f.read().strip().split('-')
+            self.complexity = complexity
+            self.sequence_order = int(stimulus[len('stimulus'):]) - 1
+            self.first_ear = ear[:-len('ear')]
+        else:
+            position = claim_local_position(os.path.join('output', '.allocation'), self.participant_id.get())
+            cell = cell_for_position(position)
+            self.complexity = cell['complexity_level']
+            self.first_ear = 'left' if cell['ear_order'] == 'left_first' else 'right'
+            self.sequence_order = cell['sequence_order']
+
+        # Rhythms of the allocated complexity, in the order this participant hears them
+        self.rhythms = [rhythm.intervals for rhythm in self.plan.presentation_order(self.complexity, self.sequence_order)]
 
     def setup_gui(self):
         self.frame = ttk.Frame(self.master, padding="10")
@@ -175,6 +205,7 @@ class RhythmExperimentGUI:
         # Create output directory
         self.output_dir = os.path.join('output', self.participant_id.get())
         os.makedirs(self.output_dir, exist_ok=True)
+        self.allocate_conditions()
 
         # Save allocation
         allocation = f"{self.complexity}-stimulus{self.sequence_order + 1}-{self.first_ear}ear"
@@ -225,11 +256,9 @@ class RhythmExperimentGUI:
         self.next_button.config(text="Start Check", command=self.check_right_ear)
 
     def update_progress(self):
-        """Update the progress bar based on current trial block (6 trials)"""
-        trials_per_block = 6
-        
-        # Calculate progress for current block of 6 trials
-        progress = (self.current_trial % 12) / 12 * 100
+        """Update the progress bar based on the trials of the current stimulus"""
+        trial_count = self.plan.trial_count
+        progress = (self.current_trial % trial_count) / trial_count * 100
         self.progress['value'] = progress
 
     def check_right_ear(self):
@@ -250,21 +279,11 @@ class RhythmExperimentGUI:
         """
         Perform ear check with longer sound duration
         """
-        duration = 1.5  # Increased from 1
         fs = 44100
-        t = np.linspace(0, duration, int(fs * duration))
-        test_sound = np.sin(2 * np.pi * 440 * t)  # 440 Hz tone
+        # 1.5 s 440 Hz tone with 0.75 s of silence either side, rendered once per ear
+        stereo_audio = ear_check_audio(fs, ear)
 
-        # Extended silence before and after
-        silence = np.zeros(int(0.75 * fs))  # Increased from 0.5
-        full_audio = np.concatenate((silence, test_sound, silence))
-
-        if ear == 'left':
-            stereo_audio = np.vstack((full_audio, np.zeros_like(full_audio)))
-        else:  # right ear
-            stereo_audio = np.vstack((np.zeros_like(full_audio), full_audio))
-
-        recording = sd.playrec(stereo_audio.T, fs, channels=1)
+        recording = sd.playrec(stereo_audio, fs, channels=1)
         sd.wait()
 
         tap_detected = self.detect_tap(recording.flatten(), fs)
@@ -313,15 +332,15 @@ class RhythmExperimentGUI:
         return len(valid_peaks) > 0
 
     def start_rhythm_practice(self):
-        ear = self.first_ear if self.current_stimulus == 1 else ('left' if self.first_ear == 'right' else 'right')
-        rhythm = self.rhythms[self.sequence_order if self.current_stimulus == 1 else 1 - self.sequence_order]
+        ear = self.first_ear if self.current_stimulus % 2 == 1 else ('left' if self.first_ear == 'right' else 'right')
+        rhythm = self.rhythms[self.current_stimulus - 1]
 
-        practice_text = f"""You will now hear Rhythm {self.current_stimulus} of 2.
+        practice_text = f"""You will now hear Rhythm {self.current_stimulus} of {len(self.rhythms)}.
 
     1. The rhythm will play twice for practice
     2. Just LISTEN during practice - do not tap yet
     3. Notice the 3 marker beats at the start and end
-    4. After practice is finished, you'll tap along this rhythm for 12 trials
+    4. After practice is finished, you'll tap along this rhythm for {self.plan.trial_count} trials
 
     Press 'Start Practice' when ready."""
 
@@ -329,6 +348,8 @@ class RhythmExperimentGUI:
         self.current_repp_stimulus = REPPStimulus(f"rhythm_{self.current_stimulus}", config=self.config)
         stim_onsets = self.current_repp_stimulus.make_onsets_from_ioi(rhythm)
         self.stim_prepared, self.stim_info, _ = self.current_repp_stimulus.prepare_stim_from_onsets(stim_onsets)
+        # Route to the trial ear once; every trial of this stimulus plays the same buffer
+        self.stereo_stim = route_to_ear(self.stim_prepared.flatten(), ear)
 
         self.next_button.config(text="Start Practice", command=self.play_practice)
         self.next_button.grid()
@@ -352,7 +373,7 @@ class RhythmExperimentGUI:
 
     def start_trials(self):
         self.current_trial = 0
-        ear = self.first_ear if self.current_stimulus == 1 else ('left' if self.first_ear == 'right' else 'right')
+        ear = self.first_ear if self.current_stimulus % 2 == 1 else ('left' if self.first_ear == 'right' else 'right')
 
         self.label.config(text=f"""Ready to start Rhythm {self.current_stimulus} trials.
 
@@ -360,7 +381,7 @@ class RhythmExperimentGUI:
     2. The rhythm will be played only in your {ear.upper()} ear
     3. Remember to ignore the 3 marker beats at start/end
     4. Please remember to tap with your right index finger
-    5. This is trial 1 of 12
+    5. This is trial 1 of {self.plan.trial_count}
 
     Press 'Start Recording' when ready.""")
         
@@ -371,24 +392,17 @@ class RhythmExperimentGUI:
     def run_trial(self):
             self.next_button.grid_remove()
 
-            if self.current_trial < 12: #12
-                self.label.config(text=f"""Recording trial {self.current_trial + 2}/12
+            if self.current_trial < self.plan.trial_count:
+                self.label.config(text=f"""Recording trial {self.current_trial + 2}/{self.plan.trial_count}
                 
                 1. Tap along as accurately as possible with EACH beat
                 2. Remember to ignore the 3 marker beats at start/end
                 3. remember to tap with your right index finger
                 
-                you will have a 15 sec break after the 6th trial""")
+                you will have a {self.plan.break_seconds} sec break after trials {', '.join(map(str, self.plan.break_after))}""")
 
-                # Create ear-specific stereo audio
-                ear = self.first_ear if self.current_stimulus == 1 else ('left' if self.first_ear == 'right' else 'right')
-                stereo_stim = np.zeros((len(self.stim_prepared), 2))
-                
-                # Put the stimulus in the correct ear
-                if ear == 'right':
-                    stereo_stim[:, 1] = self.stim_prepared.flatten()  # Right channel
-                else:  # left ear
-                    stereo_stim[:, 0] = self.stim_prepared.flatten()  # Left channel
+                # Ear-specific stereo audio, routed once in start_rhythm_practice
+                stereo_stim = self.stereo_stim
 
                 # Record taps while playing stimulus
                 tapping_recording = sd.playrec(stereo_stim, 
@@ -396,19 +410,28 @@ class RhythmExperimentGUI:
                                             channels=1)  # Record in mono
                 sd.wait()
 
+                # Reject silent or clipped recordings before any processing
+                screen = prescreen_recording(tapping_recording, self.config.FS)
+                if screen['failed']:
+                    messagebox.showerror("Recording Problem",
+                                    f"{screen['reason']}. Please check the microphone levels and try again.")
+                    self.next_button.config(text="Retry Trial", command=self.run_trial)
+                    self.next_button.grid()
+                    return
+
                 # Normalize the tapping recording
-                tapping_recording = tapping_recording / np.max(np.abs(tapping_recording)) * 0.9
+                tapping_recording *= 0.9 / np.max(np.abs(tapping_recording))
 
                 # Get the mono stimulus for combining
                 mono_stimulus = self.stim_prepared.flatten()
-                mono_stimulus = mono_stimulus / np.max(np.abs(mono_stimulus)) * 0.9
+                mono_stimulus *= 0.9 / np.max(np.abs(mono_stimulus))
 
                 # Combine the recordings
                 # Add the stimulus and tapping recordings together
                 combined_recording = tapping_recording + mono_stimulus.reshape(-1, 1)
                 
                 # Normalize the combined recording to prevent clipping
-                combined_recording = combined_recording / np.max(np.abs(combined_recording)) * 0.9
+                combined_recording *= 0.9 / np.max(np.abs(combined_recording))
 
                 # Create directory for this trial
                 trial_dir = os.path.join(self.output_dir, f'stimulus_{self.current_stimulus}',
@@ -442,9 +465,11 @@ class RhythmExperimentGUI:
                 plt.close()
 
                 try:
-                    # Analyze using REPP with the combined recording
-                    analysis = REPPAnalysis(config=self.config)
-                    output, analysis_result, is_failed = analysis.do_analysis(
+                    # Analyze using REPP with the combined recording, reusing a cached
+                    # result when this recording was already analysed with this config
+                    output, analysis_result, is_failed = cached_analysis(
+                        self.analysis_cache,
+                        self.config,
                         self.stim_info,
                         combined_path,  # Use the combined recording for analysis
                         f"trial_{self.current_trial + 1}",
@@ -474,13 +499,13 @@ class RhythmExperimentGUI:
                     self.current_trial += 1
 
                     # Handle breaks
-                    if self.current_trial == 6:  # Break after 2nd trial
-                        self.take_break(15)
-                    elif self.current_trial == 12:  # After 4th trial
-                        if self.current_stimulus == 1:
-                            self.take_break(120)
+                    if self.current_trial == self.plan.trial_count:
+                        if self.current_stimulus < len(self.rhythms):
+                            self.take_break(self.plan.stimulus_break_seconds)
                         else:
                             self.experiment_complete()
+                    elif self.current_trial in self.plan.break_after:
+                        self.take_break(self.plan.break_seconds)
                     else:
                         self.master.after(1000, self.run_trial)
 
@@ -516,15 +541,15 @@ class RhythmExperimentGUI:
         if hasattr(self, 'timer_id'):
             self.master.after_cancel(self.timer_id)
 
-        if self.current_trial == 6: # needs to be changed
-            self.label.config(text=f"""Recording trial 7/12
+        if self.current_trial < self.plan.trial_count:  # Break within a stimulus
+            self.label.config(text=f"""Recording trial {self.current_trial + 1}/{self.plan.trial_count}
                 
                     1. Tap along as accurately as possible with EACH beat
                     2. Remember to ignore the 3 marker beats at start/end
                     3. remember to tap with your right index finger""")
             self.run_trial()
-        else:  # After stimulus 1
-            self.current_stimulus = 2
+        else:  # Between stimuli
+            self.current_stimulus += 1
             self.start_rhythm_practice()    
 
 
@@ -14,3 +14,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'api.settings')
 
 application = get_asgi_application()
+
+from experiment.warmup import start_warmup  # noqa: E402 (needs the app registry loaded above)
+
+start_warmup()
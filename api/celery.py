@@ -2,9 +2,17 @@
 
 import os
 from celery import Celery
+from celery.signals import worker_process_init
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'api.settings')
 
 app = Celery('api')
 app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
+
+
+@worker_process_init.connect
+def warm_up_worker(**kwargs):
+    # Each pool process warms up before it takes its first task
+    from experiment.warmup import start_warmup
+    start_warmup('blocking')
@@ -2,6 +2,7 @@ import os
 from pathlib import Path
 import environ
 import dj_database_url
+from experiment.analysis_cache import DEFAULT_CACHE_PATH as DEFAULT_ANALYSIS_CACHE_PATH
 
 
 # Define BASE_DIR (set to your project root directory)
@@ -44,6 +45,7 @@ MIDDLEWARE = [
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'experiment.middleware.RequestLogContextMiddleware',
     'django.middleware.locale.LocaleMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -78,9 +80,44 @@ TEMPLATES = [
     },
 ]
 
+# Persistent connections: each worker reuses its connection for CONN_MAX_AGE
+# seconds, checking it is still alive before reuse. Set
+# DISABLE_SERVER_SIDE_CURSORS when connecting through PgBouncer in
+# transaction pooling mode.
+DATABASE_OPTIONS = {
+    'conn_max_age': env.int('CONN_MAX_AGE', default=60),
+    'conn_health_checks': True,
+    'disable_server_side_cursors': env.bool('DISABLE_SERVER_SIDE_CURSORS', default=False),
+}
 DATABASES = {
-    'default': dj_database_url.parse(env('DATABASE_URL'))
+    'default': dj_database_url.parse(env('DATABASE_URL'), **DATABASE_OPTIONS)
+}
+
+# Optional read replica for analytics, export and admin reads
+if env('REPLICA_DATABASE_URL', default=''):
+    DATABASES['replica'] = dj_database_url.parse(
+        env('REPLICA_DATABASE_URL'), test_options={'MIRROR': 'default'}, **DATABASE_OPTIONS
+    )
+DATABASE_ROUTERS = ['experiment.routers.PrimaryReplicaRouter']
+
+# Cache: per-process local memory by default. Point CACHE_URL at a shared
+# backend (e.g. redis://host:6379/1) so every worker sees the same entries
+# and invalidations.
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
 }
+CACHES['default'].setdefault('KEY_PREFIX', env('CACHE_KEY_PREFIX', default='rhythm'))
+CACHES['default'].setdefault('TIMEOUT', env.int('CACHE_TIMEOUT', default=3600))
+
+# Sessions are read from the cache and written through to the database, so a
+# cache restart never logs participants out. With a shared cache,
+# SESSION_ENGINE=django.contrib.sessions.backends.cache skips the database.
+SESSION_ENGINE = env('SESSION_ENGINE', default='django.contrib.sessions.backends.cached_db')
+
+
+# Warm-up when a worker loads the app (experiment/warmup.py): 'background',
+# 'blocking' or 'off'. /healthz/ready/ answers 503 until it has finished.
+WARMUP = env('WARMUP', default='background')
 
 
 # Static and media files
@@ -91,6 +128,10 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
 
+# Persistent REPP analysis result cache used by the sweep_analysis command; by
+# default the same file New_experiment.py uses
+ANALYSIS_CACHE_PATH = env('ANALYSIS_CACHE_PATH', default=DEFAULT_ANALYSIS_CACHE_PATH)
+
 
 # Media files with AWS S3
 AWS_ACCESS_KEY_ID = env('AWS_ACCESS_KEY_ID')
@@ -138,27 +179,41 @@ if not DEBUG:
     SECURE_HSTS_PRELOAD = True
 
 # Logging configuration
+# Records are queued and written by a background thread as JSON lines, so
+# requests never block on log I/O. SQL debug output is sampled.
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
-    'handlers': {
-        'console': {
-            'class': 'logging.StreamHandler',
+    'filters': {
+        'request_context': {
+            '()': 'experiment.log.ContextFilter',
         },
-        'file': {
-            'level': 'DEBUG',
-            'class': 'logging.FileHandler',
+        'sample_sql': {
+            '()': 'experiment.log.SamplingFilter',
+            'rate': env.float('SQL_LOG_SAMPLE_RATE', default=0.01),
+        },
+    },
+    'handlers': {
+        'queue': {
+            '()': 'experiment.log.QueueLogHandler',
             'filename': os.path.join(BASE_DIR, 'debug.log'),
+            'max_bytes': env.int('LOG_MAX_BYTES', default=10 * 1024 * 1024),
+            'backup_count': env.int('LOG_BACKUP_COUNT', default=5),
+            'filters': ['request_context'],
+            'level': 'DEBUG',
         },
     },
     'loggers': {
         'django': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
             'level': 'DEBUG' if DEBUG else 'INFO',
-            'propagate': True,
+            'propagate': False,
+        },
+        'django.db.backends': {
+            'filters': ['sample_sql'],
         },
         'experiment': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
             'level': 'DEBUG' if DEBUG else 'INFO',
             'propagate': False,
         },
@@ -0,0 +1,43 @@
+# api/settings_participant.py
+"""
+Slim settings for the participant-facing serverless function (vercel.json).
+
+It serves only the welcome, practice, trial and completion pages and the
+health checks. It has no admin, REST framework, CORS or S3 storage apps, and
+it imports none of NumPy, SciPy, pandas, matplotlib, REPP or boto3. Trial
+submissions, stimulus audio, the REST API and the admin are routed to the
+worker deployment. That deployment runs api.settings with the full
+requirements.txt and the Celery workers. Both deployments must share
+DATABASE_URL, CACHE_URL and SECRET_KEY so that participant sessions carry
+over between them.
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import TEMPLATES
+
+INSTALLED_APPS = [
+    'experiment.apps.ExperimentConfig',
+    'django.contrib.auth',  # experiment.models references User
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+]
+
+MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'experiment.middleware.RequestLogContextMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+ROOT_URLCONF = 'api.urls_participant'
+
+TEMPLATES = [dict(TEMPLATES[0], OPTIONS={
+    'context_processors': [
+        'django.template.context_processors.debug',
+        'django.template.context_processors.request',
+    ],
+})]
+
+# Nothing heavy to warm up; the function is ready as soon as it has loaded
+WARMUP = 'off'
@@ -10,6 +10,9 @@ from django.conf import settings
 from django.conf.urls.static import static
 from experiment.views import (
     RhythmSequenceViewSet,  # Ensure this import now works
+    CohortConditionsAPIView,
+    AllocationCellsAPIView,
+    TrialExportView,
     # StartExperimentAPIView,
     # RecordTapAPIView,
 )
@@ -28,6 +31,9 @@ urlpatterns = [
     path('api/schema/redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),  # Redoc UI
 
     path('api/', include(router.urls)),
+    path('api/cohort-conditions/', CohortConditionsAPIView.as_view(), name='cohort-conditions'),
+    path('api/export/trials/', TrialExportView.as_view(), name='export-trials'),
+    path('api/allocation-cells/', AllocationCellsAPIView.as_view(), name='allocation-cells'),
     # path('api/start-experiment/', StartExperimentAPIView.as_view(), name='start-experiment'),
     # path('api/record-tap/', RecordTapAPIView.as_view(), name='record-tap'),
 ]
@@ -0,0 +1,26 @@
+# api/urls_participant.py
+"""
+URLconf of the slim participant deployment (api/settings_participant.py).
+
+Routes the worker deployment serves are declared with a placeholder view so
+the participant pages can still reverse them; vercel.json sends those
+requests to the worker before they reach this app.
+"""
+from django.urls import path, re_path
+
+from experiment.participant_views import (
+    CompletionView, LivenessView, PracticeView, ReadinessView, TrialPageView, WelcomeHomeView, worker_only,
+)
+
+urlpatterns = [
+    path('', WelcomeHomeView.as_view(), name='welcome_home'),
+    path('practice/', PracticeView.as_view(), name='practice'),
+    path('trial/<int:trial_number>/', TrialPageView.as_view(), name='trial'),
+    path('complete/', CompletionView.as_view(), name='complete'),
+    path('healthz/live/', LivenessView.as_view(), name='liveness'),
+    path('healthz/ready/', ReadinessView.as_view(), name='readiness'),
+
+    # Served by the worker deployment
+    re_path(r'^stimuli/(?P<fingerprint>[0-9a-f]{32})\.wav$', worker_only, name='stimulus_audio'),
+    path('api/rhythm-sequences/<int:pk>/', worker_only, name='rhythmsequence-detail'),
+]
@@ -16,3 +16,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'api.settings')
 
 application = get_wsgi_application()
 
+from experiment.warmup import start_warmup  # noqa: E402 (needs the app registry loaded above)
+
+start_warmup()
+
@@ -0,0 +1,16 @@
+"""
+WSGI entry point of the slim participant deployment; see api/settings_participant.py.
+"""
+
+# api/wsgi_participant.py
+
+import os
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'api.settings_participant')
+
+application = get_wsgi_application()
+
+from experiment.warmup import start_warmup  # noqa: E402 (needs the app registry loaded above)
+
+start_warmup()
@@ -1,7 +1,69 @@
 from django.contrib import admin
-from .models import Participant, ExperimentSession, RhythmSequence, Trial, Analysis
+from .models import Participant, ExperimentSession, RhythmSequence, Trial, Analysis, SessionSummary, StimulusSummary, AllocationSlot, Artifact, Study
+from .export import EXPORT_FORMATS, iter_trial_rows
+from .routers import analytics_db
 from django import forms
 from django.contrib.postgres.fields import JSONField  # For JSON handling
+from django.core.paginator import Paginator
+from django.db import connections
+from django.http import StreamingHttpResponse
+from django.utils.functional import cached_property
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that uses the Postgres planner's row estimate for unfiltered
+    changelists on large tables instead of running COUNT(*).
+    """
+    estimate_threshold = 100000
+
+    @cached_property
+    def count(self):
+        query = self.object_list.query
+        connection = connections[self.object_list.db]
+        if connection.vendor == 'postgresql' and not query.where:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT reltuples FROM pg_class WHERE relname = %s", [query.model._meta.db_table])
+                row = cursor.fetchone()
+            if row and row[0] >= self.estimate_threshold:
+                return int(row[0])
+        return super().count
+
+
+def stream_export(rows, export_format, filename):
+    stream, content_type, extension = EXPORT_FORMATS[export_format]
+    response = StreamingHttpResponse(stream(rows), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{extension}"'
+    return response
+
+
+@admin.action(description="Export selected rows as CSV")
+def export_as_csv(modeladmin, request, queryset):
+    rows = queryset.using(analytics_db()).values().iterator(chunk_size=2000)
+    return stream_export(rows, 'csv', modeladmin.model._meta.model_name)
+
+
+@admin.action(description="Export selected trials with taps and analysis as CSV")
+def export_trials_csv(modeladmin, request, queryset):
+    return stream_export(iter_trial_rows(queryset), 'csv', 'trials')
+
+
+@admin.action(description="Export selected trials with taps and analysis as Parquet")
+def export_trials_parquet(modeladmin, request, queryset):
+    return stream_export(iter_trial_rows(queryset), 'parquet', 'trials')
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = [export_as_csv]
+
+    def get_queryset(self, request):
+        # Browsing and searching read from the replica; edits go through the primary
+        queryset = super().get_queryset(request)
+        if request.method in ('GET', 'HEAD'):
+            queryset = queryset.using(analytics_db())
+        return queryset
 
 class RhythmSequenceAdminForm(forms.ModelForm):
     sequence_data = forms.CharField(
@@ -26,6 +88,41 @@ class RhythmSequenceAdmin(admin.ModelAdmin):
     sequence_data_display.short_description = 'Sequence Data'
 
 
+class StudyAdminForm(forms.ModelForm):
+    class Meta:
+        model = Study
+        fields = '__all__'
+
+    def clean_break_after(self):
+        break_after = self.cleaned_data['break_after'] or []
+        if not isinstance(break_after, list) or not all(isinstance(n, int) and n > 0 for n in break_after):
+            raise forms.ValidationError("Enter a list of trial numbers, e.g. [6].")
+        return sorted(set(break_after))
+
+    def clean_analysis_config(self):
+        from repp.config import sms_tapping
+        from .sweep import configure
+
+        analysis_config = self.cleaned_data['analysis_config'] or {}
+        if not isinstance(analysis_config, dict):
+            raise forms.ValidationError("Enter a JSON object of sms_tapping parameters.")
+        try:
+            configure(sms_tapping, analysis_config)
+        except ValueError as e:
+            raise forms.ValidationError(str(e))
+        return analysis_config
+
+
+@admin.register(Study)
+class StudyAdmin(admin.ModelAdmin):
+    form = StudyAdminForm
+    list_display = ('name', 'slug', 'is_active', 'trial_count', 'break_after', 'updated_at')
+    list_filter = ('is_active',)
+    search_fields = ('name', 'slug')
+    prepopulated_fields = {'slug': ('name',)}
+    filter_horizontal = ('rhythm_sequences',)
+
+
 class TrialAdminForm(forms.ModelForm):
     sequence_order = forms.IntegerField(help_text="Specify the sequence order for this trial.")
 
@@ -35,35 +132,76 @@ class TrialAdminForm(forms.ModelForm):
 
 
 @admin.register(Trial)
-class TrialAdmin(admin.ModelAdmin):
+class TrialAdmin(LargeTableAdmin):
     form = TrialAdminForm
     list_display = ('id', 'session', 'trial_number', 'rhythm_sequence', 'is_practice', 'sequence_order')
+    list_select_related = ('session', 'rhythm_sequence')
     ordering = ('trial_number',)
-    list_filter = ('is_practice', 'session', 'rhythm_sequence')
+    list_filter = ('is_practice', 'rhythm_sequence')
     search_fields = ('session__participant__id',)
+    autocomplete_fields = ('session', 'rhythm_sequence')
+    actions = [export_trials_csv, export_trials_parquet]
 
 
 @admin.register(Participant)
-class ParticipantAdmin(admin.ModelAdmin):
+class ParticipantAdmin(LargeTableAdmin):
     list_display = ('id', 'age', 'is_right_handed', 'has_music_background', 'email', 'agreed_to_terms')
     list_filter = ('is_right_handed', 'has_music_background', 'agreed_to_terms', 'age')
     search_fields = ('email',)
 
 
+class StimulusSummaryInline(admin.TabularInline):
+    model = StimulusSummary
+    extra = 0
+    can_delete = False
+    fields = ('stimulus_number', 'ear', 'trial_count', 'failed_count', 'mean_asynchrony', 'sd_asynchrony', 'percent_aligned')
+    readonly_fields = fields
+
+
 @admin.register(ExperimentSession)
-class ExperimentSessionAdmin(admin.ModelAdmin):
-    list_display = ('id', 'participant', 'start_time', 'end_time', 'complexity_level', 'ear_order')
-    list_filter = ('complexity_level', 'ear_order', 'start_time')
+class ExperimentSessionAdmin(LargeTableAdmin):
+    list_display = ('id', 'participant', 'study', 'start_time', 'end_time', 'complexity_level', 'ear_order', 'sequence_order', 'archived_at')
+    list_select_related = ('participant',)
+    list_filter = ('study', 'complexity_level', 'ear_order', 'sequence_order', 'start_time')
     search_fields = ('participant__id',)
+    autocomplete_fields = ('participant',)
+    inlines = [StimulusSummaryInline]
 
 
 @admin.register(Analysis)
-class AnalysisAdmin(admin.ModelAdmin):
+class AnalysisAdmin(LargeTableAdmin):
     list_display = ('id', 'trial', 'reaction_time', 'short_response')
+    list_select_related = ('trial',)
     search_fields = ('trial__id',)
-    list_filter = ('reaction_time',)
+    autocomplete_fields = ('trial',)
 
     def short_response(self, obj):
         """Display a truncated version of the response for readability."""
-        return str(obj.response)[:75] + '...' if obj.response and len(obj.response) > 75 else obj.response
+        response = str(obj.response_data) if obj.response_data is not None else ''
+        return response[:75] + '...' if len(response) > 75 else response
     short_response.short_description = 'Response'
+
+
+@admin.register(SessionSummary)
+class SessionSummaryAdmin(LargeTableAdmin):
+    list_display = ('session', 'trial_count', 'failed_count', 'mean_asynchrony', 'sd_asynchrony', 'percent_aligned', 'updated_at')
+    list_select_related = ('session__participant',)
+    search_fields = ('session__participant__id',)
+    readonly_fields = ('session', 'trial_count', 'failed_count', 'mean_asynchrony', 'sd_asynchrony', 'percent_aligned', 'updated_at')
+    exclude = ('asynchrony_count', 'asynchrony_sum', 'asynchrony_sumsq', 'percent_aligned_count', 'percent_aligned_sum')
+
+
+@admin.register(AllocationSlot)
+class AllocationSlotAdmin(LargeTableAdmin):
+    list_display = ('study', 'position', 'complexity_level', 'ear_order', 'sequence_order', 'session', 'allocated_at')
+    list_filter = ('study', 'complexity_level', 'ear_order', 'sequence_order')
+    readonly_fields = ('study', 'position', 'complexity_level', 'ear_order', 'sequence_order', 'allocated_at')
+    autocomplete_fields = ('session',)
+
+
+@admin.register(Artifact)
+class ArtifactAdmin(LargeTableAdmin):
+    list_display = ('storage_key', 'kind', 'status', 'size', 'updated_at')
+    list_filter = ('kind', 'status', 'session__complexity_level', 'session__ear_order')
+    search_fields = ('storage_key',)
+    readonly_fields = ('storage_key', 'kind', 'session', 'trial', 'local_path', 'status', 'size', 'sha256', 'created_at', 'updated_at')
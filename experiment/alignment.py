@@ -0,0 +1,222 @@
+# experiment/alignment.py
+"""
+Locate the start/end marker blocks of a recording and measure playback-to-
+recording latency and clock drift against the stimulus.
+
+Markers are searched with overlap-save FFT cross-correlation on decimated
+audio around where they are expected, then refined at the full sample rate.
+Correlation uses the analytic (complex) marker so its magnitude is the smooth
+correlation envelope, which avoids locking onto the wrong cycle of the tone.
+"""
+import numpy as np
+from scipy.signal import find_peaks, hilbert, resample_poly
+
+from .prescreen import (
+    MARKER_COUNT, MARKER_DURATION, MARKER_FREQUENCY, MARKER_GAP, MARKER_THRESHOLD, marker_template,
+    to_float_mono,
+)
+
+DECIMATION = 8  # 44.1 kHz -> ~5.5 kHz, still well above the 440 Hz marker
+SEARCH_SLACK = 1.0  # Seconds searched either side of where a marker block is expected
+MATCH_TOLERANCE = 0.25  # Largest pairing error, as a fraction of the marker spacing
+
+
+def _next_pow2(n):
+    return 1 << int(np.ceil(np.log2(max(n, 1))))
+
+
+def kernel_spectrum(kernel, block_size=None):
+    """FFT size and conjugate kernel spectrum used by overlap_save_correlate."""
+    n_fft = _next_pow2(block_size or 4 * len(kernel))
+    return n_fft, np.conj(np.fft.fft(kernel, n_fft))
+
+
+def overlap_save_correlate(signal, kernel, block_size=None, spectrum=None):
+    """
+    Valid-mode cross-correlation of `signal` with `kernel` computed block by block
+    (overlap-save), so long signals never need one huge FFT. Pass a precomputed
+    `spectrum` from kernel_spectrum to skip transforming the kernel again.
+    """
+    m = len(kernel)
+    n_valid = len(signal) - m + 1
+    if n_valid <= 0:
+        return np.zeros(0, dtype=complex)
+    n_fft, kernel_fft = spectrum or kernel_spectrum(kernel, block_size)
+    step = n_fft - m + 1
+    out = np.empty(n_valid, dtype=complex)
+    for start in range(0, n_valid, step):
+        block = np.fft.ifft(np.fft.fft(signal[start:start + n_fft], n_fft) * kernel_fft)
+        take = min(step, n_valid - start)
+        out[start:start + take] = block[:take]
+    return out
+
+
+def _normalize(corr, signal, m, kernel_norm):
+    energy = np.concatenate(([0.0], np.cumsum(np.square(signal, dtype=np.float64))))
+    norms = np.sqrt(np.maximum(energy[m:] - energy[:-m], 0))
+    # Near-silent windows would otherwise divide rounding noise into spurious peaks
+    floor = max(1e-3 * norms.max(initial=0.0), 1e-12)
+    return np.where(norms > floor, corr / (np.maximum(norms, floor) * kernel_norm), 0.0)
+
+
+def correlation_envelope(signal, analytic_kernel, kernel_norm, spectrum=None):
+    """Normalized correlation envelope of a real signal against an analytic kernel."""
+    corr = np.abs(overlap_save_correlate(signal, analytic_kernel, spectrum=spectrum))
+    return _normalize(corr, signal, len(analytic_kernel), kernel_norm)
+
+
+def direct_correlation_envelope(signal, analytic_kernel, kernel_norm):
+    """Same as correlation_envelope, computed directly; cheaper when only a few lags are needed."""
+    m = len(analytic_kernel)
+    if len(signal) < m:
+        return np.zeros(0)
+    windows = np.lib.stride_tricks.sliding_window_view(signal, m)
+    corr = np.abs(windows @ np.conj(analytic_kernel))
+    return _normalize(corr, signal, m, kernel_norm)
+
+
+def match_markers(found, expected, tolerance):
+    """
+    Pair detected marker onsets with the expected onsets of their block.
+
+    A missed marker must not shift the pairing, so the shift that lines the
+    most detected onsets up with expected ones (within `tolerance` samples)
+    is chosen first, preferring the smallest shift on a tie; each detected
+    onset is then paired with its nearest expected onset under that shift.
+    Returns the paired (found, expected) arrays.
+    """
+    found = np.asarray(found, dtype=float)
+    expected = np.asarray(expected, dtype=float)
+    best_shift, best_count = None, 0
+    for shift in (f - e for f in found for e in expected):
+        count = int(np.sum(np.min(np.abs(found[:, None] - (expected[None, :] + shift)), axis=1) <= tolerance))
+        if count > best_count or (count == best_count and best_shift is not None and abs(shift) < abs(best_shift)):
+            best_shift, best_count = shift, count
+    if best_shift is None:
+        return np.array([]), np.array([])
+    pairs = []
+    for onset in found:
+        errors = np.abs(onset - (expected + best_shift))
+        index = int(np.argmin(errors))
+        if errors[index] <= tolerance and index not in [i for _, i in pairs]:
+            pairs.append((onset, index))
+    return np.array([onset for onset, _ in pairs]), expected[[i for _, i in pairs]]
+
+
+def _parabolic_peak(values, index):
+    if 0 < index < len(values) - 1:
+        left, centre, right = values[index - 1], values[index], values[index + 1]
+        denominator = left - 2 * centre + right
+        if denominator != 0:
+            return index + 0.5 * (left - right) / denominator
+    return float(index)
+
+
+class MarkerAligner:
+    """Reusable aligner; templates and their spectra are built once per sample rate."""
+
+    def __init__(self, fs, decimation=DECIMATION, threshold=MARKER_THRESHOLD):
+        self.fs = fs
+        # Keep the decimated rate comfortably above the marker tone for low sample rates
+        self.decimation = max(1, min(decimation, int(fs // (4 * MARKER_FREQUENCY))))
+        self.threshold = threshold
+        template = marker_template(fs)
+        self.template = hilbert(template)
+        self.template_norm = np.linalg.norm(template)
+        coarse = marker_template(fs / self.decimation)
+        self.coarse_template = hilbert(coarse)
+        self.coarse_norm = np.linalg.norm(coarse)
+        self.coarse_spectrum = kernel_spectrum(self.coarse_template)
+        self.spacing = MARKER_DURATION + MARKER_GAP
+        self.match_tolerance = MATCH_TOLERANCE * self.spacing * fs
+
+    def expected_onsets(self, stimulus_length):
+        """Marker onsets (in samples) within the stimulus built by generate_rhythm_audio."""
+        block = int(self.fs * MARKER_DURATION) * MARKER_COUNT + int(self.fs * MARKER_GAP) * (MARKER_COUNT - 1)
+        offsets = [i * (int(self.fs * MARKER_DURATION) + int(self.fs * MARKER_GAP)) for i in range(MARKER_COUNT)]
+        start = np.array(offsets, dtype=float)
+        end = start + stimulus_length - block
+        return start, end
+
+    def find_block(self, signal, expected_start):
+        """Find the marker onsets of one block, searching around `expected_start` (samples)."""
+        block_seconds = MARKER_COUNT * MARKER_DURATION + (MARKER_COUNT - 1) * MARKER_GAP
+        lo = int(expected_start - SEARCH_SLACK * self.fs)
+        hi = min(int(expected_start + (block_seconds + SEARCH_SLACK) * self.fs), len(signal))
+        window = signal[max(lo, 0):hi]
+        if len(window) < len(self.template):
+            return np.array([])
+        window = to_float_mono(window)
+        window = window - window.mean()
+        if lo < 0:
+            # Pad with silence so a marker at the very start is still a peak
+            window = np.concatenate([np.zeros(-lo, dtype=window.dtype), window])
+
+        # Coarse pass at the decimated rate
+        q = self.decimation
+        decimated = resample_poly(window, 1, q)
+        envelope = correlation_envelope(decimated, self.coarse_template, self.coarse_norm, self.coarse_spectrum)
+        peaks, props = find_peaks(envelope, height=self.threshold, distance=max(int(0.8 * self.spacing * self.fs / q), 1))
+        if len(peaks) == 0:
+            return np.array([])
+        strongest = np.sort(peaks[np.argsort(props['peak_heights'])[-MARKER_COUNT:]])
+
+        # Refinement pass at the full rate, in a few samples around each coarse peak
+        m = len(self.template)
+        onsets = []
+        for peak in strongest:
+            centre = peak * q
+            seg_lo = max(centre - 2 * q, 0)
+            seg_hi = min(centre + 2 * q + m, len(window))
+            fine = direct_correlation_envelope(window[seg_lo:seg_hi], self.template, self.template_norm)
+            if len(fine) == 0:
+                continue
+            onsets.append(lo + seg_lo + _parabolic_peak(fine, int(np.argmax(fine))))
+        return np.array(onsets)
+
+    def align(self, recording, stimulus_length, start_offset=0):
+        """
+        Align a recording to a stimulus of `stimulus_length` samples that was
+        scheduled to start `start_offset` samples into the recording.
+
+        Returns latency (recording minus scheduled time of the start markers) and
+        clock drift (relative stretch between start and end markers) for the trial.
+        `recording` may be any array of frames, including a memory-mapped one;
+        only the windows around the marker blocks are converted and read.
+        """
+        signal = np.asarray(recording)
+        expected_start, expected_end = (onsets + start_offset for onsets in self.expected_onsets(stimulus_length))
+
+        start, expected_start = match_markers(
+            self.find_block(signal, expected_start[0]), expected_start, self.match_tolerance
+        )
+        if len(start) == 0:
+            return {'aligned': False, 'reason': 'Start markers not found'}
+        latency = float(np.mean(start - expected_start))
+
+        end, expected_end = match_markers(
+            self.find_block(signal, expected_end[0] + latency), expected_end, self.match_tolerance
+        )
+        result = {
+            'aligned': len(end) > 0,
+            'reason': 'N/A' if len(end) else 'End markers not found',
+            'latency_ms': latency / self.fs * 1000,
+            'start_markers_s': (start / self.fs).tolist(),
+            'end_markers_s': (end / self.fs).tolist(),
+            'clock_drift_ppm': None,
+        }
+        if len(end):
+            expected_span = float(np.mean(expected_end) - np.mean(expected_start))
+            measured_span = float(np.mean(end) - np.mean(start))
+            result['clock_drift_ppm'] = (measured_span / expected_span - 1) * 1e6
+        return result
+
+
+def resampled_length(length, fs, target_fs):
+    """Length in samples at `target_fs` of `length` samples at `fs`."""
+    return int(round(length * target_fs / fs))
+
+
+def align_recording(recording, fs, stimulus_length):
+    """Convenience wrapper around MarkerAligner for a single recording."""
+    return MarkerAligner(fs).align(recording, stimulus_length)
@@ -0,0 +1,102 @@
+# experiment/allocation.py
+import logging
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from .cache import PARTICIPANT_SESSION_CACHE, get_participant_session, invalidate
+from .models import AllocationSlot, ExperimentSession
+from .routers import analytics_db
+from .schedule import CELLS, cell_for_position
+
+logger = logging.getLogger(__name__)
+
+SCHEDULE_BLOCKS_AHEAD = 8  # Blocks of slots added whenever the schedule runs out
+
+
+def extend_schedule(study=None, blocks=SCHEDULE_BLOCKS_AHEAD):
+    """Append `blocks` more blocks of slots to a study's schedule. Safe to race: duplicate positions are ignored."""
+    last = AllocationSlot.objects.filter(study=study).aggregate(last=Max('position'))['last']
+    start = 0 if last is None else (last // len(CELLS) + 1) * len(CELLS)
+    AllocationSlot.objects.bulk_create(
+        [AllocationSlot(study=study, position=position, **cell_for_position(position))
+         for position in range(start, start + blocks * len(CELLS))],
+        ignore_conflicts=True,
+    )
+
+
+def _lock_free_slot(study):
+    """
+    Lock the lowest free slot of `study` until the surrounding transaction ends.
+    Rows another transaction is claiming are skipped, not waited on.
+    """
+    while True:
+        slot = (
+            AllocationSlot.objects
+            .select_for_update(skip_locked=True)
+            .filter(study=study, session__isnull=True)
+            .order_by('position')
+            .first()
+        )
+        if slot is not None:
+            return slot
+        extend_schedule(study)
+
+
+def allocate_session(participant, study=None):
+    """
+    Return the participant's ExperimentSession, creating it in the next
+    counterbalanced cell of `study` if they do not have one yet. Each study
+    has its own schedule, so concurrent studies are balanced independently.
+    """
+    session = get_participant_session(participant.id)
+    if session:
+        return session
+    try:
+        with transaction.atomic():
+            # The session is created with its cell, so the post_save signal builds
+            # its trials from the allocated level and order
+            slot = _lock_free_slot(study)
+            session = ExperimentSession.objects.create(
+                participant=participant,
+                study=study,
+                start_time=timezone.now(),
+                complexity_level=slot.complexity_level,
+                ear_order=slot.ear_order,
+                sequence_order=slot.sequence_order,
+            )
+            slot.session = session
+            slot.allocated_at = timezone.now()
+            slot.save(update_fields=['session', 'allocated_at'])
+    except IntegrityError:
+        # A concurrent request for the same participant created the session first
+        return ExperimentSession.objects.get(participant=participant)
+    logger.info(f"Allocated participant {participant.id} to slot {slot.position} ({slot.complexity_level}, {slot.ear_order}, {slot.sequence_order})")
+    return session
+
+
+def complete_session(session):
+    """
+    Record that a session has finished. Archiving and the completed cell counts
+    key off end_time; calling this again keeps the first end time.
+    """
+    if ExperimentSession.objects.filter(id=session.id, end_time__isnull=True).update(end_time=timezone.now()):
+        invalidate(PARTICIPANT_SESSION_CACHE, session.participant_id)
+        logger.info(f"Session {session.id} completed")
+
+
+def cell_counts(study=None):
+    """Live participant counts per condition cell of a study, including empty cells."""
+    rows = {
+        (row['complexity_level'], row['ear_order'], row['sequence_order']): row
+        for row in ExperimentSession.objects.using(analytics_db())
+        .filter(study=study)
+        .values('complexity_level', 'ear_order', 'sequence_order')
+        .annotate(allocated=Count('id'), completed=Count('id', filter=Q(end_time__isnull=False)))
+    }
+    counts = []
+    for cell in CELLS:
+        row = rows.get((cell['complexity_level'], cell['ear_order'], cell['sequence_order']), {})
+        counts.append({**cell, 'allocated': row.get('allocated', 0), 'completed': row.get('completed', 0)})
+    return counts
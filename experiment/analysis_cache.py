@@ -0,0 +1,171 @@
+# experiment/analysis_cache.py
+"""
+Persistent cache of REPP analysis results.
+
+Entries are keyed by (audio content hash, stimulus hash, analysis config hash,
+analysis code version) and hold `output`, `analysis_result` and `is_failed`
+as zlib-compressed pickles in a single SQLite file. The file is bounded in
+size by evicting least recently used entries.
+
+Only the standard library is used here so the standalone experiment script
+and the web pipeline can share one cache file.
+"""
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import time
+import zlib
+from contextlib import contextmanager
+from functools import lru_cache
+
+ANALYSIS_CACHE_VERSION = 1  # Bump when the way results are produced or stored changes
+DEFAULT_CACHE_PATH = os.environ.get(
+    'ANALYSIS_CACHE_PATH',
+    os.path.join(os.path.expanduser('~'), '.cache', 'rhythm_experiment', 'analysis_cache.sqlite3'),
+)
+DEFAULT_MAX_BYTES = int(os.environ.get('ANALYSIS_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    payload BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access);
+"""
+
+
+def _sha256_json(value):
+    payload = json.dumps(value, sort_keys=True, default=_json_default)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _json_default(value):
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    return repr(value)
+
+
+def file_hash(path, chunk_size=1024 * 1024):
+    """SHA-256 of a file's contents, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def stimulus_hash(stimulus):
+    """Hash whatever describes the stimulus: REPP's stim_info, an IOI list or a stimulus fingerprint."""
+    return _sha256_json(stimulus)
+
+
+def config_hash(config):
+    """Hash the upper-case settings of an analysis config such as `sms_tapping`."""
+    if isinstance(config, dict):
+        settings = config
+    else:
+        settings = {name: getattr(config, name) for name in dir(config) if name.isupper()}
+    return _sha256_json(settings)
+
+
+@lru_cache(maxsize=None)
+def analysis_code_version():
+    """Version of the analysis code: the installed REPP release plus this cache's format version."""
+    try:
+        from importlib.metadata import PackageNotFoundError, version
+        repp_version = version('repp')
+    except PackageNotFoundError:
+        repp_version = 'unknown'
+    return f"repp-{repp_version}/cache-{ANALYSIS_CACHE_VERSION}"
+
+
+def cache_key(audio_hash, stim_hash, cfg_hash, code_version=None):
+    parts = [audio_hash, stim_hash, cfg_hash, code_version or analysis_code_version()]
+    return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()
+
+
+class AnalysisCache:
+    """Size-bounded, least-recently-used store of (output, analysis_result, is_failed) tuples."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            # WAL lets the web workers and the experiment script read while one writes
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key):
+        """Return the cached (output, analysis_result, is_failed) tuple, or None on a miss."""
+        with self._connect() as conn:
+            row = conn.execute('SELECT payload FROM results WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute('UPDATE results SET last_access = ? WHERE key = ?', (time.time(), key))
+        return pickle.loads(zlib.decompress(row[0]))
+
+    def put(self, key, output, analysis_result, is_failed):
+        payload = zlib.compress(pickle.dumps((output, analysis_result, is_failed), protocol=pickle.HIGHEST_PROTOCOL), 6)
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO results (key, payload, size, last_access) VALUES (?, ?, ?, ?)',
+                (key, payload, len(payload), time.time()),
+            )
+            self._evict(conn)
+
+    def _evict(self, conn):
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        freed, stale = 0, []
+        for key, size in conn.execute('SELECT key, size FROM results ORDER BY last_access'):
+            stale.append((key,))
+            freed += size
+            if total - freed <= self.max_bytes:
+                break
+        conn.executemany('DELETE FROM results WHERE key = ?', stale)
+
+    def total_bytes(self):
+        with self._connect() as conn:
+            return conn.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+
+def cached_analysis(cache, config, stim_info, recording_path, title, plot_path, audio_hash=None, stimulus=None):
+    """
+    Run `REPPAnalysis.do_analysis` through the cache.
+
+    `stimulus` defaults to `stim_info` for the stimulus part of the key. The plot
+    is only drawn when the analysis actually runs, i.e. on a miss.
+    """
+    key = cache_key(
+        audio_hash or file_hash(recording_path),
+        stimulus_hash(stim_info if stimulus is None else stimulus),
+        config_hash(config),
+    )
+    hit = cache.get(key)
+    if hit is not None:
+        return hit
+    from repp.analysis import REPPAnalysis
+    output, analysis_result, is_failed = REPPAnalysis(config=config).do_analysis(stim_info, recording_path, title, plot_path)
+    cache.put(key, output, analysis_result, is_failed)
+    return output, analysis_result, is_failed
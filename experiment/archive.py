@@ -0,0 +1,91 @@
+# experiment/archive.py
+"""
+Archive tap and analysis data of completed sessions to Parquet.
+
+Each batch of sessions becomes one zstd-compressed Parquet file in the
+trial export layout. Once the file is stored, the sessions' TapRecords are
+deleted and their Analysis.response_data cleared. Participants, sessions,
+trials and the summary tables (SessionSummary, StimulusSummary, TrialMetric)
+stay in the database and remain queryable.
+"""
+import logging
+import os
+from datetime import timedelta
+
+import pyarrow.parquet as pq
+from django.db import transaction
+from django.utils import timezone
+
+from .analysis_cache import file_hash
+from .artifacts import local_artifact_path
+from .aws import upload_to_s3
+from .export import iter_trial_rows, parquet_stream
+from .lifecycle import register_artifact
+from .models import Analysis, ExperimentSession, TapRecord, Trial
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_AFTER = timedelta(days=30)  # How long after a session ends its raw data stays in the database
+ARCHIVE_BATCH_SIZE = 200  # Sessions per archive file
+
+
+def archivable_sessions(older_than=ARCHIVE_AFTER):
+    """Completed sessions that ended more than `older_than` ago and have not been archived."""
+    return ExperimentSession.objects.filter(
+        end_time__lt=timezone.now() - older_than, archived_at__isnull=True
+    ).order_by('id')
+
+
+def archive_key(session_ids):
+    return f"archive/trials_sessions_{min(session_ids):08d}-{max(session_ids):08d}.parquet"
+
+
+def archive_sessions(session_ids, upload=True, s3_client=None):
+    """
+    Write one Parquet file with the trials, taps and analysis of `session_ids`,
+    then remove the raw rows from the database. With `upload` the rows are
+    only removed once the bucket copy exists. Returns the archive Artifact, or
+    None if nothing was archived.
+    """
+    session_ids = list(session_ids)
+    if not session_ids:
+        return None
+    trials = Trial.objects.filter(session_id__in=session_ids)
+    key = archive_key(session_ids)
+    path = local_artifact_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # Read from the primary: rows are deleted right after, so a lagging replica must not be used
+    with open(path, 'wb') as f:
+        for chunk in parquet_stream(iter_trial_rows(trials, using='default')):
+            f.write(chunk)
+    expected = trials.count()
+    written = pq.read_metadata(path).num_rows
+    if written != expected:
+        logger.error(f"Archive {key} has {written} rows, expected {expected}; keeping raw data")
+        return None
+
+    sha256 = file_hash(path)
+    uploaded = upload_to_s3(path, key, content_hash=sha256, s3_client=s3_client) if upload else None
+    if upload and not uploaded:
+        logger.error(f"Archive {key} could not be uploaded; keeping raw data")
+        return None
+
+    with transaction.atomic():
+        artifact = register_artifact(path, key, kind='archive', sha256=sha256, uploaded=bool(uploaded))
+        taps_deleted, _ = TapRecord.objects.filter(trial__session_id__in=session_ids).delete()
+        Analysis.objects.filter(trial__session_id__in=session_ids).update(response_data=None)
+        ExperimentSession.objects.filter(id__in=session_ids).update(archived_at=timezone.now())
+    logger.info(f"Archived {len(session_ids)} sessions ({expected} trials, {taps_deleted} tap records) to {key}")
+    return artifact
+
+
+def archive_completed(older_than=ARCHIVE_AFTER, batch_size=ARCHIVE_BATCH_SIZE, upload=True, s3_client=None, limit=None):
+    """Archive every archivable session in batches. Returns the archive Artifacts written."""
+    session_ids = list(archivable_sessions(older_than).values_list('id', flat=True)[:limit])
+    artifacts = []
+    for start in range(0, len(session_ids), batch_size):
+        artifact = archive_sessions(session_ids[start:start + batch_size], upload=upload, s3_client=s3_client)
+        if artifact is not None:
+            artifacts.append(artifact)
+    return artifacts
@@ -0,0 +1,66 @@
+# experiment/artifacts.py
+"""
+Where trial files are stored, and how to find them again.
+
+`artifact_key` is the one place the bucket layout is spelled out. Everything
+that needs existing files queries the Artifact manifest instead of
+rebuilding paths or listing bucket prefixes.
+"""
+import os
+import re
+
+from django.conf import settings
+
+from .models import Artifact
+from .routers import analytics_db
+
+ARTIFACT_FILENAMES = {
+    'recording': 'recording_trial_{trial_number}.wav',
+    'plot': 'plot_trial_{trial_number}.png',
+}
+STREAM_CHUNK_SIZE = 2000
+
+_TRIAL_KEY = re.compile(r'^participant_(\d+)/stimulus_(\d+)/trial_(\d+)/(recording|plot)_trial_\d+\.\w+$')
+
+
+def artifact_key(kind, participant_id, trial_number=None, stimulus_number=1):
+    """Bucket key (and path relative to MEDIA_ROOT) of a trial's recording or plot, or a stimulus's analysis CSV."""
+    stimulus_dir = f"participant_{participant_id}/stimulus_{stimulus_number}"
+    if kind == 'analysis_csv':
+        return f"{stimulus_dir}/participant_analysis.csv"
+    return f"{stimulus_dir}/trial_{trial_number}/{ARTIFACT_FILENAMES[kind].format(trial_number=trial_number)}"
+
+
+def local_artifact_path(storage_key):
+    return os.path.join(settings.MEDIA_ROOT, *storage_key.split('/'))
+
+
+def parse_artifact_key(storage_key):
+    """(kind, participant_id, trial_number) of a trial file key, or None for anything else."""
+    match = _TRIAL_KEY.match(storage_key)
+    if not match:
+        return None
+    participant_id, _stimulus_number, trial_number, kind = match.groups()
+    return kind, int(participant_id), int(trial_number)
+
+
+def cohort_artifacts(kind='recording', complexity_level=None, ear_order=None, status=None, include_practice=False):
+    """
+    Artifacts of one kind for a condition cell, e.g. all recordings of
+    simple-condition, left-first participants. Runs on the analytics database.
+    """
+    queryset = Artifact.objects.using(analytics_db()).filter(kind=kind)
+    if complexity_level:
+        queryset = queryset.filter(session__complexity_level=complexity_level)
+    if ear_order:
+        queryset = queryset.filter(session__ear_order=ear_order)
+    if status:
+        queryset = queryset.filter(status=status)
+    if not include_practice:
+        queryset = queryset.exclude(trial__is_practice=True)
+    return queryset.order_by('id')
+
+
+def iter_storage_keys(queryset, chunk_size=STREAM_CHUNK_SIZE):
+    """Stream storage keys from a manifest query without loading it into memory."""
+    return queryset.values_list('storage_key', flat=True).iterator(chunk_size=chunk_size)
@@ -1,21 +1,48 @@
 import boto3
-from botocore.exceptions import NoCredentialsError
+from botocore.exceptions import ClientError, NoCredentialsError
 from django.conf import settings
+from functools import lru_cache
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
-# Utility function for uploading files to S3
-def upload_to_s3(file_path, s3_path):
-    s3_client = boto3.client(
+@lru_cache(maxsize=None)
+def get_s3_client():
+    """One client per process: creating it is slow, and it is thread-safe and pools its connections."""
+    return boto3.client(
         's3',
         aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
         aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
         region_name=settings.AWS_S3_REGION_NAME
     )
+
+
+def s3_object_has_hash(s3_client, s3_path, content_hash):
+    """Return True if the object at s3_path was uploaded with the given content hash."""
     try:
-        s3_client.upload_file(file_path, settings.AWS_STORAGE_BUCKET_NAME, s3_path)
-        s3_url = f"https://{settings.AWS_S3_CUSTOM_DOMAIN}/{s3_path}"
+        head = s3_client.head_object(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=s3_path)
+    except ClientError:
+        return False
+    return head.get('Metadata', {}).get('sha256') == content_hash
+
+
+# Utility function for uploading files to S3
+def upload_to_s3(file_path, s3_path, content_hash=None, s3_client=None):
+    s3_client = s3_client or get_s3_client()
+    s3_url = f"https://{settings.AWS_S3_CUSTOM_DOMAIN}/{s3_path}"
+    try:
+        if content_hash:
+            # Skip the upload when the same content is already stored under this key
+            if s3_object_has_hash(s3_client, s3_path, content_hash):
+                logger.info(f"Skipped upload of {file_path}, {s3_url} already has hash {content_hash}")
+                return s3_url
+            s3_client.upload_file(
+                file_path, settings.AWS_STORAGE_BUCKET_NAME, s3_path,
+                ExtraArgs={'Metadata': {'sha256': content_hash}}
+            )
+        else:
+            s3_client.upload_file(file_path, settings.AWS_STORAGE_BUCKET_NAME, s3_path)
         logger.info(f"Uploaded {file_path} to {s3_url}")
         return s3_url
     except FileNotFoundError:
@@ -24,4 +51,40 @@ def upload_to_s3(file_path, s3_path):
         logger.error("AWS credentials not available.")
     except Exception as e:
         logger.error(f"Failed to upload {file_path} to S3: {str(e)}")
-    return None
\ No newline at end of file
+    return None
+
+
+def download_from_s3(s3_path, file_path, s3_client=None):
+    """Fetch an object from the bucket into file_path. Returns True on success."""
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    try:
+        (s3_client or get_s3_client()).download_file(settings.AWS_STORAGE_BUCKET_NAME, s3_path, file_path)
+        logger.info(f"Downloaded {s3_path} to {file_path}")
+        return True
+    except NoCredentialsError:
+        logger.error("AWS credentials not available.")
+    except Exception as e:
+        logger.warning(f"Could not download {s3_path} from S3: {str(e)}")
+    return False
+
+
+def head_s3_object(s3_path, s3_client=None):
+    """Metadata of the object at s3_path, or None if it does not exist or cannot be reached."""
+    try:
+        return (s3_client or get_s3_client()).head_object(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=s3_path)
+    except ClientError:
+        return None
+    except NoCredentialsError:
+        logger.error("AWS credentials not available.")
+        return None
+
+
+def delete_from_s3(s3_path, s3_client=None):
+    """Delete the object at s3_path. Returns True on success."""
+    try:
+        (s3_client or get_s3_client()).delete_object(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=s3_path)
+        logger.info(f"Deleted {s3_path} from S3")
+        return True
+    except Exception as e:
+        logger.error(f"Failed to delete {s3_path} from S3: {str(e)}")
+    return False
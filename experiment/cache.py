@@ -0,0 +1,90 @@
+# experiment/cache.py
+from django.core.cache import cache
+
+from .models import ExperimentSession, RhythmSequence
+
+RHYTHM_SEQUENCE_CACHE = 'rhythm_sequences'
+PARTICIPANT_SESSION_CACHE = 'participant_sessions'
+STUDY_PLAN_CACHE = 'study_plans'
+STIMULUS_ONSETS_CACHE = 'stimulus_onsets'
+
+_MISSING = object()
+
+
+def _version_key(namespace):
+    return f"{namespace}:version"
+
+
+def get_version(namespace):
+    """Return the current version number of a cache namespace."""
+    version = cache.get(_version_key(namespace))
+    if version is None:
+        cache.add(_version_key(namespace), 1, timeout=None)
+        version = cache.get(_version_key(namespace), 1)
+    return version
+
+
+def bump_version(namespace):
+    """Invalidate every key in a namespace by moving it to a new version."""
+    try:
+        return cache.incr(_version_key(namespace))
+    except ValueError:
+        cache.set(_version_key(namespace), 2, timeout=None)
+        return 2
+
+
+def versioned_key(namespace, *parts):
+    """Build a cache key that stops matching as soon as the namespace is bumped."""
+    suffix = ':'.join(str(part) for part in parts)
+    return f"{namespace}:v{get_version(namespace)}:{suffix}"
+
+
+def get_or_load(namespace, parts, loader, timeout=None):
+    """
+    Return the cached value for `parts` in `namespace`, calling `loader` on a
+    miss. None results are not cached, so a missing row is looked up again.
+    `timeout=None` uses the cache's default timeout.
+    """
+    key = versioned_key(namespace, *parts)
+    value = cache.get(key, _MISSING)
+    if value is _MISSING:
+        value = loader()
+        if value is not None:
+            if timeout is None:
+                cache.set(key, value)
+            else:
+                cache.set(key, value, timeout=timeout)
+    return value
+
+
+def invalidate(namespace, *parts):
+    """Drop a single entry from a namespace without bumping the whole namespace."""
+    cache.delete(versioned_key(namespace, *parts))
+
+
+def get_rhythm_sequence(sequence_id):
+    """RhythmSequence by id, or None. Invalidated whenever any sequence changes."""
+    if sequence_id is None:
+        return None
+    return get_or_load(
+        RHYTHM_SEQUENCE_CACHE, ('id', sequence_id),
+        lambda: RhythmSequence.objects.filter(id=sequence_id).first(),
+    )
+
+
+def get_rhythm_sequences(rhythm_type):
+    """All RhythmSequences of one complexity level, ordered by id."""
+    return get_or_load(
+        RHYTHM_SEQUENCE_CACHE, ('type', rhythm_type),
+        lambda: list(RhythmSequence.objects.filter(rhythm_type=rhythm_type).order_by('id')),
+    )
+
+
+def get_participant_session(participant_id):
+    """The participant's allocated ExperimentSession, or None if they have not been allocated yet."""
+    if participant_id is None:
+        return None
+    return get_or_load(
+        PARTICIPANT_SESSION_CACHE, (participant_id,),
+        lambda: ExperimentSession.objects.filter(participant_id=participant_id).first(),
+    )
@@ -0,0 +1,73 @@
+# experiment/cohort.py
+import numpy as np
+import pandas as pd
+from django.db.models import Count, F, Q, Sum
+
+from .models import TrialMetric
+from .routers import analytics_db
+
+CONDITION_FIELDS = ['complexity_level', 'ear_order', 'has_music_background', 'block']
+
+
+def condition_aggregates(queryset=None):
+    """
+    Run the grouped aggregation in the database and return one row per condition cell.
+
+    Only counts, sums and sums of squares come back from the database; derived
+    statistics are computed afterwards in `condition_table`.
+    """
+    if queryset is None:
+        queryset = TrialMetric.objects.all()
+    queryset = queryset.using(analytics_db())
+    asynchrony_present = Q(mean_asynchrony__isnull=False)
+    aligned_present = Q(percent_aligned__isnull=False)
+    return (
+        queryset
+        .values(
+            complexity_level=F('session__complexity_level'),
+            ear_order=F('session__ear_order'),
+            has_music_background=F('session__participant__has_music_background'),
+            block_number=F('block'),
+        )
+        .annotate(
+            participants=Count('session__participant', distinct=True),
+            trials=Count('id'),
+            failed=Count('id', filter=Q(failed=True)),
+            asynchrony_n=Count('id', filter=asynchrony_present),
+            asynchrony_sum=Sum('mean_asynchrony', filter=asynchrony_present),
+            asynchrony_sumsq=Sum(F('mean_asynchrony') * F('mean_asynchrony'), filter=asynchrony_present),
+            aligned_n=Count('id', filter=aligned_present),
+            aligned_sum=Sum('percent_aligned', filter=aligned_present),
+        )
+        .order_by('complexity_level', 'ear_order', 'has_music_background', 'block_number')
+    )
+
+
+def condition_table(queryset=None):
+    """
+    Return the complexity x ear order x music background x block condition table
+    as a DataFrame with mean/SD/SEM asynchrony, percent aligned and failure rate.
+    """
+    df = pd.DataFrame.from_records(list(condition_aggregates(queryset)))
+    columns = CONDITION_FIELDS + [
+        'participants', 'trials', 'failed', 'failure_rate',
+        'mean_asynchrony', 'sd_asynchrony', 'sem_asynchrony', 'percent_aligned',
+    ]
+    if df.empty:
+        return pd.DataFrame(columns=columns)
+
+    df = df.rename(columns={'block_number': 'block'})
+    def column(name):
+        return pd.to_numeric(df[name]).fillna(0).to_numpy(dtype=float)
+
+    n, total, sumsq = column('asynchrony_n'), column('asynchrony_sum'), column('asynchrony_sumsq')
+    aligned_n, aligned_sum = column('aligned_n'), column('aligned_sum')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        variance = np.where(n > 1, (sumsq - total * total / n) / (n - 1), np.nan)
+        sd = np.sqrt(np.clip(variance, 0, None))
+        df['mean_asynchrony'] = np.where(n > 0, total / n, np.nan)
+        df['sd_asynchrony'] = sd
+        df['sem_asynchrony'] = sd / np.sqrt(n)
+        df['percent_aligned'] = np.where(aligned_n > 0, aligned_sum / aligned_n, np.nan)
+        df['failure_rate'] = column('failed') / column('trials')
+    return df[columns]
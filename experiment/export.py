@@ -0,0 +1,162 @@
+# experiment/export.py
+import csv
+import json
+
+from .models import Trial
+from .routers import analytics_db
+
+EXPORT_CHUNK_SIZE = 2000
+PARQUET_ROW_GROUP_SIZE = 10000
+
+
+def iter_trial_rows(queryset=None, chunk_size=EXPORT_CHUNK_SIZE, using=None):
+    """
+    Yield one flat dict per trial with its participant, session, taps and analysis.
+
+    Rows are read through a server-side cursor in chunks of `chunk_size`, and tap
+    records are prefetched per chunk, so memory use does not grow with the study.
+    Reads go to the analytics database unless `using` names another alias.
+    """
+    if queryset is None:
+        queryset = Trial.objects.all()
+    trials = (
+        queryset
+        .using(using or analytics_db())
+        .select_related('session', 'participant', 'rhythm_sequence', 'analysis')
+        .prefetch_related('tap_records')
+        .order_by('id')
+        .iterator(chunk_size=chunk_size)
+    )
+    for trial in trials:
+        session = trial.session
+        participant = trial.participant
+        analysis = getattr(trial, 'analysis', None)
+        tap_times = []
+        for tap_record in trial.tap_records.all():
+            tap_times.extend(tap_record.tap_times or [])
+        yield {
+            'participant_id': participant.id,
+            'age': participant.age,
+            'is_right_handed': participant.is_right_handed,
+            'has_music_background': participant.has_music_background,
+            'session_id': session.id,
+            'complexity_level': session.complexity_level,
+            'ear_order': session.ear_order,
+            'trial_id': trial.id,
+            'trial_number': trial.trial_number,
+            'is_practice': trial.is_practice,
+            'sequence_order': trial.sequence_order,
+            'rhythm_sequence': trial.rhythm_sequence.name,
+            'tap_times': [float(t) for t in tap_times],
+            'analysis': analysis.response_data if analysis else None,
+        }
+
+
+def ndjson_stream(rows):
+    """Encode rows as newline-delimited JSON, one line per row."""
+    for row in rows:
+        yield (json.dumps(row, default=str) + '\n').encode('utf-8')
+
+
+class _Echo:
+    """Pseudo-buffer that returns what csv.writer writes instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def csv_stream(rows):
+    """Encode rows as CSV, JSON-encoding list and dict values."""
+    writer = csv.writer(_Echo())
+    header = None
+    for row in rows:
+        if header is None:
+            header = list(row)
+            yield writer.writerow(header).encode('utf-8')
+        values = [
+            json.dumps(row[key], default=str) if isinstance(row[key], (list, dict)) else row[key]
+            for key in header
+        ]
+        yield writer.writerow(values).encode('utf-8')
+
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back to a generator."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def parquet_stream(rows, row_group_size=PARQUET_ROW_GROUP_SIZE):
+    """
+    Encode rows as a Parquet file, yielding the bytes of each row group as soon
+    as it is written. Requires pyarrow.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ('participant_id', pa.int64()),
+        ('age', pa.int32()),
+        ('is_right_handed', pa.bool_()),
+        ('has_music_background', pa.bool_()),
+        ('session_id', pa.int64()),
+        ('complexity_level', pa.string()),
+        ('ear_order', pa.string()),
+        ('trial_id', pa.int64()),
+        ('trial_number', pa.int32()),
+        ('is_practice', pa.bool_()),
+        ('sequence_order', pa.int32()),
+        ('rhythm_sequence', pa.string()),
+        ('tap_times', pa.list_(pa.float64())),
+        ('analysis', pa.string()),  # JSON-encoded Analysis.response_data
+    ])
+
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression='zstd')
+    batch = []
+
+    def write_batch():
+        for row in batch:
+            if row['analysis'] is not None:
+                row['analysis'] = json.dumps(row['analysis'], default=str)
+        writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+        batch.clear()
+
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= row_group_size:
+            write_batch()
+            yield sink.drain()
+    if batch:
+        write_batch()
+    writer.close()
+    yield sink.drain()
+
+
+EXPORT_FORMATS = {
+    'csv': (csv_stream, 'text/csv', 'csv'),
+    'ndjson': (ndjson_stream, 'application/x-ndjson', 'ndjson'),
+    'parquet': (parquet_stream, 'application/vnd.apache.parquet', 'parquet'),
+}
@@ -0,0 +1,203 @@
+# experiment/lifecycle.py
+"""
+Storage lifecycle for trial recordings and plots.
+
+Files are written under MEDIA_ROOT and uploaded to the bucket under the same
+relative key. Once the bucket copy is confirmed, the local copy is evicted;
+recordings that have gone cold are recompressed to FLAC in the bucket. Every
+step is recorded in the Artifact manifest, so a file is found by looking it
+up there rather than by listing the bucket. The per-stimulus analysis CSV is
+rewritten on every trial, so it stays local.
+
+Run periodically with `python manage.py storage_lifecycle`.
+"""
+import logging
+import os
+import tempfile
+from collections import Counter
+from datetime import timedelta
+
+import soundfile
+from django.conf import settings
+from django.utils import timezone
+
+from .analysis_cache import file_hash
+from .aws import delete_from_s3, download_from_s3, head_s3_object, upload_to_s3
+from .artifacts import parse_artifact_key
+from .models import Artifact, Trial
+
+logger = logging.getLogger(__name__)
+
+EVICT_AFTER = timedelta(hours=1)  # Grace period before a confirmed local copy is deleted
+COLD_AFTER = timedelta(days=7)  # Age at which recordings are recompressed
+FLAC_SUBTYPES = ('PCM_16', 'PCM_24')  # Sample formats FLAC stores without loss
+
+
+def register_artifact(local_path, storage_key, kind='recording', trial=None, sha256=None, uploaded=True):
+    """Record a file written to `local_path` and, if `uploaded`, sent to `storage_key`."""
+    artifact, _ = Artifact.objects.update_or_create(
+        storage_key=storage_key,
+        defaults={
+            'kind': kind,
+            'trial': trial,
+            'session_id': trial.session_id if trial else None,
+            'local_path': local_path,
+            'status': 'uploaded' if uploaded else 'local',
+            'size': os.path.getsize(local_path),
+            'sha256': sha256 or file_hash(local_path),
+        },
+    )
+    return artifact
+
+
+def register_existing(root=None):
+    """Add manifest entries for trial recordings and plots already on disk. Returns how many were new."""
+    root = root or settings.MEDIA_ROOT
+    created = 0
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            storage_key = os.path.relpath(path, root).replace(os.sep, '/')
+            parsed = parse_artifact_key(storage_key)
+            if parsed is None:
+                continue
+            kind, participant_id, trial_number = parsed
+            trial = (
+                Trial.objects.filter(participant_id=participant_id, trial_number=trial_number, is_practice=False)
+                .order_by('id').first()
+            )
+            _, was_created = Artifact.objects.get_or_create(
+                storage_key=storage_key,
+                defaults={
+                    'kind': kind,
+                    'trial': trial,
+                    'session_id': trial.session_id if trial else None,
+                    'local_path': path,
+                    'size': os.path.getsize(path),
+                    'sha256': file_hash(path),
+                },
+            )
+            created += was_created
+    return created
+
+
+def remote_matches(artifact, s3_client=None):
+    """True if the bucket holds this artifact's content under its key."""
+    head = head_s3_object(artifact.storage_key, s3_client)
+    if head is None:
+        return False
+    stored_hash = head.get('Metadata', {}).get('sha256')
+    if stored_hash:
+        return stored_hash == artifact.sha256
+    return head.get('ContentLength') == artifact.size
+
+
+def confirm_upload(artifact, s3_client=None):
+    """Move a local artifact to 'uploaded' once the bucket copy matches, uploading it again if needed."""
+    if not remote_matches(artifact, s3_client):
+        if not (artifact.local_path and os.path.exists(artifact.local_path)):
+            logger.error(f"Artifact {artifact.storage_key} is neither in the bucket nor on disk")
+            return False
+        upload_to_s3(artifact.local_path, artifact.storage_key, content_hash=artifact.sha256, s3_client=s3_client)
+        if not remote_matches(artifact, s3_client):
+            return False
+    artifact.status = 'uploaded'
+    artifact.save(update_fields=['status', 'updated_at'])
+    return True
+
+
+def evict_local(artifact, s3_client=None):
+    """Delete the local copy of an artifact whose bucket copy is confirmed to match."""
+    if artifact.status != 'uploaded' or not remote_matches(artifact, s3_client):
+        return False
+    try:
+        os.remove(artifact.local_path)
+    except FileNotFoundError:
+        pass
+    artifact.local_path = ''
+    artifact.status = 'remote'
+    artifact.save(update_fields=['local_path', 'status', 'updated_at'])
+    logger.info(f"Evicted local copy of {artifact.storage_key}")
+    return True
+
+
+def encode_flac(wav_path, flac_path):
+    """Losslessly re-encode a 16- or 24-bit PCM WAV as FLAC. Returns False for other sample formats."""
+    info = soundfile.info(wav_path)
+    if info.subtype not in FLAC_SUBTYPES:
+        return False
+    data, fs = soundfile.read(wav_path, dtype='int32', always_2d=True)
+    soundfile.write(flac_path, data, fs, format='FLAC', subtype=info.subtype)
+    return True
+
+
+def recompress_to_flac(artifact, s3_client=None):
+    """Replace a remote-only WAV recording in the bucket with a FLAC copy of the same samples."""
+    if artifact.status != 'remote' or not artifact.storage_key.endswith('.wav'):
+        return False
+    wav_key = artifact.storage_key
+    flac_key = f"{wav_key[:-len('.wav')]}.flac"
+    with tempfile.TemporaryDirectory() as workdir:
+        wav_path = os.path.join(workdir, 'recording.wav')
+        flac_path = os.path.join(workdir, 'recording.flac')
+        if not download_from_s3(wav_key, wav_path, s3_client=s3_client):
+            return False
+        if file_hash(wav_path) != artifact.sha256:
+            logger.error(f"Bucket copy of {wav_key} does not match the manifest hash; leaving it as is")
+            return False
+        if not encode_flac(wav_path, flac_path):
+            logger.info(f"Keeping {wav_key} as WAV: its sample format has no lossless FLAC equivalent")
+            return False
+        if not upload_to_s3(flac_path, flac_key, content_hash=artifact.sha256, s3_client=s3_client):
+            return False
+        artifact.storage_key = flac_key
+        artifact.size = os.path.getsize(flac_path)
+    # sha256 stays the hash of the original WAV, which the FLAC object carries as metadata
+    artifact.status = 'cold'
+    artifact.save(update_fields=['storage_key', 'size', 'status', 'updated_at'])
+    delete_from_s3(wav_key, s3_client=s3_client)
+    logger.info(f"Recompressed {wav_key} to {flac_key}")
+    return True
+
+
+def local_copy(artifact, path, s3_client=None):
+    """
+    Return a local path holding the artifact's content, downloading it to
+    `path` if the local copy was evicted. Cold recordings are decoded back
+    to WAV. Returns None if the bucket copy cannot be fetched.
+    """
+    if artifact.local_path and os.path.exists(artifact.local_path):
+        return artifact.local_path
+    if artifact.status != 'cold':
+        return path if download_from_s3(artifact.storage_key, path, s3_client=s3_client) else None
+    flac_path = f"{path}.flac"
+    if not download_from_s3(artifact.storage_key, flac_path, s3_client=s3_client):
+        return None
+    try:
+        info = soundfile.info(flac_path)
+        data, fs = soundfile.read(flac_path, dtype='int32', always_2d=True)
+        soundfile.write(path, data, fs, format='WAV', subtype=info.subtype)
+    finally:
+        os.remove(flac_path)
+    return path
+
+
+def run_lifecycle(evict_after=EVICT_AFTER, cold_after=COLD_AFTER, s3_client=None, limit=None):
+    """One pass of the lifecycle: confirm pending uploads, evict local copies, recompress cold recordings."""
+    now = timezone.now()
+    counts = Counter()
+    passes = [
+        ('confirmed', confirm_upload, Artifact.objects.filter(status='local')),
+        ('evicted', evict_local, Artifact.objects.filter(status='uploaded', updated_at__lt=now - evict_after)),
+        ('recompressed', recompress_to_flac, Artifact.objects.filter(
+            status='remote', storage_key__endswith='.wav', created_at__lt=now - cold_after,
+        )),
+    ]
+    for label, step, queryset in passes:
+        for artifact in queryset.order_by('id')[:limit].iterator():
+            try:
+                counts[label if step(artifact, s3_client=s3_client) else 'skipped'] += 1
+            except Exception as e:
+                counts['failed'] += 1
+                logger.error(f"Lifecycle step '{label}' failed for {artifact.storage_key}: {e}")
+    return counts
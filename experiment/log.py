@@ -0,0 +1,126 @@
+# experiment/log.py
+"""
+Logging pieces used by LOGGING in api/settings.py.
+
+Records are put on an in-memory queue by the request thread and written by a
+background listener thread, so requests never wait on disk. Each record
+carries the request, participant and trial IDs of the request that logged it,
+and is written as one JSON object per line to a rotating file.
+"""
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+CONTEXT_FIELDS = ('request_id', 'participant_id', 'trial_number')
+
+log_context = ContextVar('log_context', default={})
+
+
+def bind_context(**values):
+    """Attach IDs to every record logged from the current request; returns a token for reset_context."""
+    return log_context.set({**log_context.get(), **values})
+
+
+def reset_context(token):
+    log_context.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """Copy the current request's IDs onto the record. Runs in the logging thread, before queueing."""
+
+    def filter(self, record):
+        context = log_context.get()
+        for field in CONTEXT_FIELDS:
+            if not hasattr(record, field):
+                setattr(record, field, context.get(field))
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a `rate` fraction of records at or below `max_level`; anything above always passes."""
+
+    def __init__(self, rate=0.01, max_level=logging.DEBUG):
+        super().__init__()
+        self.rate = float(rate)
+        self.max_level = logging._checkLevel(max_level)
+
+    def filter(self, record):
+        return record.levelno > self.max_level or random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record with the context IDs and any exception text."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'line': record.lineno,
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class QueueLogHandler(QueueHandler):
+    """
+    Queue records for a background listener that writes JSON lines to a
+    rotating file (and plain text to stderr when `console` is set).
+
+    The queue is bounded: when the listener falls behind, records are dropped
+    and counted rather than making the request wait.
+    """
+
+    def __init__(self, filename, max_bytes=10 * 1024 * 1024, backup_count=5, console=True, queue_size=10000):
+        super().__init__(queue.Queue(maxsize=queue_size))
+        self.dropped = 0
+        file_handler = RotatingFileHandler(filename, maxBytes=max_bytes, backupCount=backup_count, delay=True)
+        file_handler.setFormatter(JsonFormatter())
+        handlers = [file_handler]
+        if console:
+            console_handler = logging.StreamHandler(sys.stderr)
+            console_handler.setFormatter(logging.Formatter('%(levelname)s %(name)s: %(message)s'))
+            handlers.append(console_handler)
+        self.listener = QueueListener(self.queue, *handlers, respect_handler_level=True)
+        self.listener.start()
+        atexit.register(self.stop)
+
+    def prepare(self, record):
+        # Resolve the message and exception text now, while the arguments are
+        # still valid, but keep them separate for the JSON formatter
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        if self.listener._thread is not None:
+            self.listener.stop()
+
+    def close(self):
+        self.stop()
+        super().close()
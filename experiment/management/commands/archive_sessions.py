@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from experiment.archive import ARCHIVE_AFTER, ARCHIVE_BATCH_SIZE, archivable_sessions, archive_completed
+from experiment.models import TapRecord
+from experiment.partitions import PARTITION_MONTHS_AHEAD, ensure_partitions
+
+
+class Command(BaseCommand):
+    help = "Create upcoming TapRecord partitions and archive completed sessions' taps and analysis to Parquet."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=float, default=ARCHIVE_AFTER.days,
+                            help="Archive sessions that ended more than this many days ago")
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE, help="Sessions per archive file")
+        parser.add_argument('--limit', type=int, help="Archive at most N sessions")
+        parser.add_argument('--months-ahead', type=int, default=PARTITION_MONTHS_AHEAD)
+        parser.add_argument('--no-upload', action='store_true', help="Keep archive files local instead of uploading them")
+        parser.add_argument('--dry-run', action='store_true', help="Only report how many sessions would be archived")
+
+    def handle(self, *args, **options):
+        older_than = timedelta(days=options['older_than_days'])
+        if options['dry_run']:
+            self.stdout.write(f"{archivable_sessions(older_than).count()} sessions to archive")
+            return
+
+        for name in ensure_partitions(TapRecord._meta.db_table, months_ahead=options['months_ahead']):
+            self.stderr.write(f"Created partition {name}")
+
+        artifacts = archive_completed(
+            older_than=older_than,
+            batch_size=options['batch_size'],
+            upload=not options['no_upload'],
+            limit=options['limit'],
+        )
+        for artifact in artifacts:
+            self.stdout.write(f"{artifact.storage_key} ({artifact.size} bytes)")
+        self.stderr.write(self.style.SUCCESS(f"Wrote {len(artifacts)} archive files"))
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = "Measure per-request database overhead with new connections per request versus persistent connections."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help="Simulated requests per mode")
+        parser.add_argument('--queries', type=int, default=3, help="Queries per simulated request")
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        configured = connection.settings_dict['CONN_MAX_AGE']
+        modes = [('new connection per request', 0), (f'persistent (CONN_MAX_AGE={configured or 600})', configured or 600)]
+        results = {}
+        try:
+            for label, max_age in modes:
+                connection.close()
+                connection.settings_dict['CONN_MAX_AGE'] = max_age
+                results[label] = self.run(connection, options['requests'], options['queries'])
+        finally:
+            connection.close()
+            connection.settings_dict['CONN_MAX_AGE'] = configured
+
+        self.stdout.write(f"{connection.vendor} '{options['database']}', {options['requests']} requests x {options['queries']} queries")
+        for label, per_request in results.items():
+            self.stdout.write(f"  {label:<40} {per_request * 1000:8.3f} ms/request")
+        per_request_new, per_request_persistent = results.values()
+        self.stdout.write(self.style.SUCCESS(
+            f"Connection overhead: {(per_request_new - per_request_persistent) * 1000:.3f} ms/request"
+        ))
+
+    def run(self, connection, requests, queries):
+        """Time simulated requests; the request signals open and close connections exactly as Django does."""
+        start = time.perf_counter()
+        for _ in range(requests):
+            request_started.send(sender=self.__class__)
+            with connection.cursor() as cursor:
+                for _ in range(queries):
+                    cursor.execute("SELECT 1")
+                    cursor.fetchone()
+            request_finished.send(sender=self.__class__)
+        return (time.perf_counter() - start) / requests
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from experiment.cohort import condition_table
+
+
+class Command(BaseCommand):
+    help = "Print the condition table (complexity x ear order x music background x block) across all participants."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=['table', 'csv', 'json'], default='table')
+        parser.add_argument('--output', help="Write to this file instead of stdout")
+
+    def handle(self, *args, **options):
+        df = condition_table()
+        output_format = options['format']
+        if output_format == 'csv':
+            text = df.to_csv(index=False)
+        elif output_format == 'json':
+            text = df.to_json(orient='records')
+        else:
+            text = df.to_string(index=False)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(text)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {len(df)} condition rows to {options['output']}"))
+        else:
+            self.stdout.write(text)
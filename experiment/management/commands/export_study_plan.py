@@ -0,0 +1,29 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from experiment.models import Study
+from experiment.studies import get_plan
+
+
+class Command(BaseCommand):
+    help = "Write a study's compiled plan as JSON, for New_experiment.py (STUDY_PLAN=<file>)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('study', nargs='?', help="Study slug (default: the plan used by sessions without a study)")
+        parser.add_argument('--output', help="Write to this file instead of stdout")
+
+    def handle(self, *args, **options):
+        study_id = None
+        if options['study']:
+            study = Study.objects.filter(slug=options['study']).first()
+            if study is None:
+                raise CommandError(f"No study with slug '{options['study']}'")
+            study_id = study.id
+        payload = json.dumps(get_plan(study_id).to_dict(), indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(payload)
+            self.stderr.write(self.style.SUCCESS(f"Wrote plan to {options['output']}"))
+        else:
+            self.stdout.write(payload)
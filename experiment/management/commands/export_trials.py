@@ -0,0 +1,28 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from experiment.export import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, iter_trial_rows
+
+
+class Command(BaseCommand):
+    help = "Stream all trials with their taps and analysis to NDJSON or Parquet."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='ndjson')
+        parser.add_argument('--output', help="Write to this file instead of stdout")
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        stream = EXPORT_FORMATS[options['format']][0]
+        chunks = stream(iter_trial_rows(chunk_size=options['chunk_size']))
+
+        if options['output']:
+            with open(options['output'], 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+            self.stderr.write(self.style.SUCCESS(f"Exported trials to {options['output']}"))
+        else:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.flush()
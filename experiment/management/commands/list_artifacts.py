@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from experiment.artifacts import STREAM_CHUNK_SIZE, cohort_artifacts, iter_storage_keys
+from experiment.models import Artifact, ExperimentSession
+
+
+class Command(BaseCommand):
+    help = "Stream storage keys of artifacts for a condition cell from the manifest, one per line."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=[kind for kind, _ in Artifact.KIND_CHOICES], default='recording')
+        parser.add_argument('--complexity-level', choices=[value for value, _ in ExperimentSession._meta.get_field('complexity_level').choices])
+        parser.add_argument('--ear-order', choices=[value for value, _ in ExperimentSession._meta.get_field('ear_order').choices])
+        parser.add_argument('--status', choices=[status for status, _ in Artifact.STATUS_CHOICES])
+        parser.add_argument('--include-practice', action='store_true')
+        parser.add_argument('--chunk-size', type=int, default=STREAM_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        queryset = cohort_artifacts(
+            options['kind'],
+            complexity_level=options['complexity_level'],
+            ear_order=options['ear_order'],
+            status=options['status'],
+            include_practice=options['include_practice'],
+        )
+        for storage_key in iter_storage_keys(queryset, chunk_size=options['chunk_size']):
+            self.stdout.write(storage_key)
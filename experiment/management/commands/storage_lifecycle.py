@@ -0,0 +1,34 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from experiment.lifecycle import COLD_AFTER, EVICT_AFTER, register_existing, run_lifecycle
+
+
+class Command(BaseCommand):
+    help = "Confirm uploads, evict confirmed local copies and recompress cold recordings to FLAC."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--evict-after-hours', type=float, default=EVICT_AFTER.total_seconds() / 3600,
+                            help="Keep confirmed local copies this long before deleting them")
+        parser.add_argument('--cold-after-days', type=float, default=COLD_AFTER.days,
+                            help="Recompress recordings older than this")
+        parser.add_argument('--limit', type=int, help="At most N artifacts per step")
+        parser.add_argument('--scan', action='store_true', help="First add files already under MEDIA_ROOT to the manifest")
+        parser.add_argument('--loop', type=float, metavar='SECONDS', help="Keep running, one pass every SECONDS")
+
+    def handle(self, *args, **options):
+        if options['scan']:
+            self.stderr.write(f"Registered {register_existing()} existing files")
+        while True:
+            counts = run_lifecycle(
+                evict_after=timedelta(hours=options['evict_after_hours']),
+                cold_after=timedelta(days=options['cold_after_days']),
+                limit=options['limit'],
+            )
+            summary = ', '.join(f"{label} {count}" for label, count in sorted(counts.items())) or 'nothing to do'
+            self.stdout.write(summary)
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
@@ -0,0 +1,85 @@
+import json
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from experiment.artifacts import cohort_artifacts
+from experiment.lifecycle import local_copy
+from experiment.sweep import expand_grid, run_sweep
+
+
+class Command(BaseCommand):
+    help = "Re-analyse stored trial recordings under a grid of sms_tapping overrides and report metrics per config."
+
+    def add_arguments(self, parser):
+        parser.add_argument('grid', help='JSON object of parameter -> list of values, or a path to a JSON file')
+        parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: one per CPU, 0 runs in-process)")
+        parser.add_argument('--limit', type=int, help="Only use the first N recordings")
+        parser.add_argument('--output', default='sweep_summary.csv', help="Per-config summary CSV")
+        parser.add_argument('--trials-output', help="Also write the per-trial metrics to this CSV")
+
+    def handle(self, *args, **options):
+        grid = self.load_grid(options['grid'])
+
+        def progress(done, total):
+            if done == total or done % 50 == 0:
+                self.stderr.write(f"{done}/{total} tasks finished")
+
+        # Recordings fetched back from the bucket live only as long as the sweep,
+        # so the sweep never refills the disk the storage lifecycle frees
+        with tempfile.TemporaryDirectory(prefix='sweep_recordings_') as download_dir:
+            recordings = self.study_recordings(download_dir, options['limit'])
+            if not recordings:
+                raise CommandError("No trial recordings found in the artifact manifest.")
+            self.stderr.write(f"Sweeping {len(expand_grid(grid))} configs over {len(recordings)} recordings")
+            summary, trials = run_sweep(
+                recordings, grid, workers=options['workers'], cache_path=settings.ANALYSIS_CACHE_PATH, progress=progress
+            )
+        summary.to_csv(options['output'], index=False)
+        if options['trials_output']:
+            trials.to_csv(options['trials_output'], index=False)
+        self.stdout.write(summary.head(10).to_string(index=False))
+        self.stderr.write(self.style.SUCCESS(f"Wrote {len(summary)} config rows to {options['output']}"))
+
+    def load_grid(self, value):
+        try:
+            if os.path.exists(value):
+                with open(value) as f:
+                    grid = json.load(f)
+            else:
+                grid = json.loads(value)
+        except ValueError as e:
+            raise CommandError(f"Invalid grid JSON: {e}")
+        if not isinstance(grid, dict) or not all(isinstance(values, list) for values in grid.values()):
+            raise CommandError("Grid must map each parameter to a list of values.")
+        return grid
+
+    def study_recordings(self, download_dir, limit=None, s3_client=None):
+        """
+        Main-trial recordings from the artifact manifest, with stim_info rebuilt
+        once per rhythm sequence. Recordings without a local copy are downloaded
+        into `download_dir`.
+        """
+        from repp.config import sms_tapping
+        from repp.stimulus import REPPStimulus
+
+        stim_infos = {}
+        recordings = []
+        artifacts = cohort_artifacts('recording').filter(trial__isnull=False).select_related('trial__rhythm_sequence')
+        for artifact in artifacts.iterator():
+            trial = artifact.trial
+            path = local_copy(artifact, os.path.join(download_dir, f"recording_{artifact.id}.wav"), s3_client=s3_client)
+            if path is None:
+                continue
+            sequence = trial.rhythm_sequence
+            if sequence.id not in stim_infos:
+                stimulus = REPPStimulus("generated_rhythm", config=sms_tapping)
+                _audio, stim_infos[sequence.id], _alignment = stimulus.prepare_stim_from_onsets(
+                    stimulus.make_onsets_from_ioi(sequence.sequence_data)
+                )
+            recordings.append({'id': trial.id, 'path': path, 'stim_info': stim_infos[sequence.id]})
+            if limit and len(recordings) >= limit:
+                break
+        return recordings
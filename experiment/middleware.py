@@ -0,0 +1,30 @@
+# experiment/middleware.py
+import uuid
+
+from .log import bind_context, reset_context
+
+
+class RequestLogContextMiddleware:
+    """Tag every log record of a request with its request, participant and trial IDs."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+        session = getattr(request, 'session', None)
+        token = bind_context(
+            request_id=request_id,
+            participant_id=session.get('participant_id') if session is not None else None,
+        )
+        try:
+            response = self.get_response(request)
+        finally:
+            reset_context(token)
+        response['X-Request-ID'] = request_id
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if 'trial_number' in view_kwargs:
+            bind_context(trial_number=view_kwargs['trial_number'])
+        return None
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.2 on 2026-10-19 16:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('experiment', '0003_remove_trial_tap_accuracy_score_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrialSubmission',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trial_number', models.IntegerField()),
+                ('idempotency_key', models.CharField(help_text='Client-generated key identifying one submission attempt', max_length=64, unique=True)),
+                ('audio_hash', models.CharField(blank=True, default='', help_text='SHA-256 of the uploaded recording', max_length=64)),
+                ('response', models.JSONField(help_text='Stored response returned for repeated submissions')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='submissions', to='experiment.experimentsession')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['session', 'trial_number', 'audio_hash'], name='experiment__session_12442f_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.1.2 on 2026-10-19 16:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('experiment', '0004_trialsubmission'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SessionSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trial_count', models.IntegerField(default=0)),
+                ('failed_count', models.IntegerField(default=0)),
+                ('asynchrony_count', models.IntegerField(default=0, help_text='Trials with a finite mean asynchrony')),
+                ('asynchrony_sum', models.FloatField(default=0.0)),
+                ('asynchrony_sumsq', models.FloatField(default=0.0)),
+                ('percent_aligned_count', models.IntegerField(default=0)),
+                ('percent_aligned_sum', models.FloatField(default=0.0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('session', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='summary', to='experiment.experimentsession')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='StimulusSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trial_count', models.IntegerField(default=0)),
+                ('failed_count', models.IntegerField(default=0)),
+                ('asynchrony_count', models.IntegerField(default=0, help_text='Trials with a finite mean asynchrony')),
+                ('asynchrony_sum', models.FloatField(default=0.0)),
+                ('asynchrony_sumsq', models.FloatField(default=0.0)),
+                ('percent_aligned_count', models.IntegerField(default=0)),
+                ('percent_aligned_sum', models.FloatField(default=0.0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('stimulus_number', models.IntegerField()),
+                ('ear', models.CharField(choices=[('left', 'Left'), ('right', 'Right')], max_length=5)),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stimulus_summaries', to='experiment.experimentsession')),
+            ],
+            options={
+                'unique_together': {('session', 'stimulus_number')},
+            },
+        ),
+    ]
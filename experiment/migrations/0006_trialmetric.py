@@ -0,0 +1,32 @@
+# Generated by Django 5.1.2 on 2026-10-19 16:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('experiment', '0005_session_summaries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrialMetric',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stimulus_number', models.IntegerField()),
+                ('trial_number', models.IntegerField()),
+                ('block', models.IntegerField(help_text='Trial block within the stimulus, split at the mid-stimulus break')),
+                ('failed', models.BooleanField(default=False)),
+                ('mean_asynchrony', models.FloatField(blank=True, null=True)),
+                ('sd_asynchrony', models.FloatField(blank=True, null=True)),
+                ('percent_aligned', models.FloatField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trial_metrics', to='experiment.experimentsession')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['session', 'stimulus_number', 'trial_number'], name='experiment__session_ff06a7_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-19 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("experiment", "0006_trialmetric"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="rhythmsequence",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
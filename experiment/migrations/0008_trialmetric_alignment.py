@@ -0,0 +1,31 @@
+# Generated by Django 5.1.2 on 2026-10-19 16:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("experiment", "0007_rhythmsequence_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="trialmetric",
+            name="clock_drift_ppm",
+            field=models.FloatField(
+                blank=True,
+                help_text="Recording clock drift relative to the stimulus",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="trialmetric",
+            name="latency_ms",
+            field=models.FloatField(
+                blank=True,
+                help_text="Playback-to-recording latency from marker alignment",
+                null=True,
+            ),
+        ),
+    ]
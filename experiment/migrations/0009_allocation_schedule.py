@@ -0,0 +1,60 @@
+# Generated by Django 5.1.2 on 2026-10-19 16:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("experiment", "0008_trialmetric_alignment"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="experimentsession",
+            name="sequence_order",
+            field=models.IntegerField(
+                default=0,
+                help_text="Which of the complexity level's rhythms is played first",
+            ),
+        ),
+        migrations.CreateModel(
+            name="AllocationSlot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("position", models.BigIntegerField(unique=True)),
+                ("complexity_level", models.CharField(max_length=50)),
+                ("ear_order", models.CharField(max_length=50)),
+                ("sequence_order", models.IntegerField()),
+                ("allocated_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "session",
+                    models.OneToOneField(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="allocation_slot",
+                        to="experiment.experimentsession",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("session__isnull", True)),
+                        fields=["position"],
+                        name="allocationslot_free_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 5.1.2 on 2026-10-19 17:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("experiment", "0009_allocation_schedule"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Artifact",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "storage_key",
+                    models.CharField(
+                        help_text="Object key in the bucket",
+                        max_length=512,
+                        unique=True,
+                    ),
+                ),
+                (
+                    "local_path",
+                    models.CharField(
+                        blank=True,
+                        default="",
+                        help_text="Local copy, empty once evicted",
+                        max_length=512,
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("local", "Local only"),
+                            ("uploaded", "Local and remote"),
+                            ("remote", "Remote only"),
+                            ("cold", "Remote, recompressed"),
+                        ],
+                        default="local",
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "size",
+                    models.BigIntegerField(
+                        default=0, help_text="Size in bytes of the stored object"
+                    ),
+                ),
+                (
+                    "sha256",
+                    models.CharField(
+                        blank=True,
+                        default="",
+                        help_text="SHA-256 of the original file",
+                        max_length=64,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["status", "updated_at"],
+                        name="experiment__status_80913f_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 5.1.2 on 2026-10-19 17:06
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+TRIAL_KEY = re.compile(r"^participant_(\d+)/stimulus_\d+/trial_(\d+)/(recording|plot)_trial_\d+\.\w+$")
+
+
+def link_existing_artifacts(apps, schema_editor):
+    """Fill kind, session and trial of artifacts registered before these fields existed."""
+    Artifact = apps.get_model("experiment", "Artifact")
+    Trial = apps.get_model("experiment", "Trial")
+    for artifact in Artifact.objects.filter(trial__isnull=True).iterator():
+        match = TRIAL_KEY.match(artifact.storage_key)
+        if not match:
+            continue
+        participant_id, trial_number, kind = match.groups()
+        trial = (
+            Trial.objects.filter(participant_id=participant_id, trial_number=trial_number, is_practice=False)
+            .order_by("id")
+            .first()
+        )
+        artifact.kind = kind
+        artifact.trial = trial
+        artifact.session_id = trial.session_id if trial else None
+        artifact.save(update_fields=["kind", "trial", "session"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("experiment", "0010_artifact"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="artifact",
+            name="kind",
+            field=models.CharField(
+                choices=[
+                    ("recording", "Recording"),
+                    ("plot", "Plot"),
+                    ("analysis_csv", "Analysis CSV"),
+                ],
+                default="recording",
+                max_length=20,
+            ),
+        ),
+        migrations.AddField(
+            model_name="artifact",
+            name="session",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="artifacts",
+                to="experiment.experimentsession",
+            ),
+        ),
+        migrations.AddField(
+            model_name="artifact",
+            name="trial",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="artifacts",
+                to="experiment.trial",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="artifact",
+            index=models.Index(
+                fields=["kind", "session"], name="experiment__kind_063a95_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="experimentsession",
+            index=models.Index(
+                fields=["complexity_level", "ear_order"],
+                name="experiment__complex_3c69f9_idx",
+            ),
+        ),
+        migrations.RunPython(link_existing_artifacts, migrations.RunPython.noop),
+    ]
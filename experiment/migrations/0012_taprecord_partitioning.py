@@ -0,0 +1,177 @@
+# Generated by Django 5.1.2 on 2026-10-19 17:40
+
+from datetime import datetime, timezone
+
+import django.utils.timezone
+from django.db import migrations, models
+
+# The SQL is frozen here rather than imported from experiment/partitions.py, so
+# later changes to the maintenance code cannot change what this migration did.
+
+PARTITION_MONTHS_AHEAD = 3
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1, tzinfo=timezone.utc)
+
+
+def next_month(value):
+    return month_start(datetime(value.year + value.month // 12, value.month % 12 + 1, 1))
+
+
+def is_partitioned(cursor, table):
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))", [table])
+    return cursor.fetchone()[0]
+
+
+def create_month_partitions(cursor, quote, table, start):
+    """Monthly partitions from `start` until PARTITION_MONTHS_AHEAD months from now."""
+    month = month_start(start or datetime.now(timezone.utc))
+    end = month_start(datetime.now(timezone.utc))
+    for _ in range(PARTITION_MONTHS_AHEAD):
+        end = next_month(end)
+    while month <= end:
+        name = f"{table}_y{month.year}m{month.month:02d}"
+        bounds = [month, next_month(month)]
+        cursor.execute(f"CREATE TABLE {quote(name)} (LIKE {quote(table)} INCLUDING DEFAULTS)")
+        cursor.execute(
+            f"ALTER TABLE {quote(table)} ATTACH PARTITION {quote(name)} FOR VALUES FROM (%s) TO (%s)",
+            bounds,
+        )
+        month = next_month(month)
+
+
+def rename_and_recreate(cursor, quote, table, old, create_sql):
+    """Rename `table` to `old` and create its replacement with `create_sql`, moving the id sequence over."""
+    cursor.execute(f"ALTER TABLE {quote(table)} RENAME TO {quote(old)}")
+    cursor.execute(create_sql)
+    cursor.execute("SELECT attidentity FROM pg_attribute WHERE attrelid = to_regclass(%s) AND attname = 'id'", [old])
+    if not cursor.fetchone()[0]:
+        # A serial (pre-identity) id: keep its sequence alive past the old table
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [old])
+        cursor.execute(f"ALTER SEQUENCE {cursor.fetchone()[0]} OWNED BY {quote(table)}.id")
+
+
+def restore_rows(cursor, quote, model, old):
+    """Copy the rows of `old` into `model`'s table, then drop `old` and recreate the foreign keys."""
+    table = model._meta.db_table
+    cursor.execute(f"INSERT INTO {quote(table)} OVERRIDING SYSTEM VALUE SELECT * FROM {quote(old)}")
+    cursor.execute(
+        f"SELECT setval(pg_get_serial_sequence(%s, 'id'), COALESCE(MAX(id), 0) + 1, false) FROM {quote(table)}",
+        [table],
+    )
+    cursor.execute(f"DROP TABLE {quote(old)}")
+    for field in model._meta.concrete_fields:
+        if field.is_relation:
+            target = field.target_field
+            cursor.execute(
+                f"ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(f'{table}_{field.column}_fk')} "
+                f"FOREIGN KEY ({quote(field.column)}) "
+                f"REFERENCES {quote(target.model._meta.db_table)} ({quote(target.column)}) DEFERRABLE INITIALLY DEFERRED"
+            )
+            cursor.execute(f"CREATE INDEX {quote(f'{table}_{field.column}_idx')} ON {quote(table)} ({quote(field.column)})")
+
+
+def brin_index_name(table):
+    return f"{table}_created_at_brin"
+
+
+def partition_tables(apps, schema_editor):
+    """
+    Rebuild TapRecord's table range-partitioned by month on created_at, with
+    a DEFAULT partition, and add BRIN indexes on created_at to it and to
+    Analysis. Ids, the id sequence and foreign keys are kept; the primary
+    key becomes (id, created_at), as PostgreSQL requires the partition key
+    in every unique constraint. PostgreSQL only.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        return
+    quote = connection.ops.quote_name
+    TapRecord = apps.get_model("experiment", "TapRecord")
+    table = TapRecord._meta.db_table
+    old = f"{table}_unpartitioned"
+    with connection.cursor() as cursor:
+        if is_partitioned(cursor, table):
+            return
+        rename_and_recreate(
+            cursor, quote, table, old,
+            f"CREATE TABLE {quote(table)} (LIKE {quote(old)} INCLUDING DEFAULTS INCLUDING IDENTITY) "
+            f"PARTITION BY RANGE (created_at)",
+        )
+        cursor.execute(f"ALTER TABLE {quote(table)} ADD PRIMARY KEY (id, created_at)")
+        cursor.execute(f"CREATE TABLE {quote(table + '_default')} PARTITION OF {quote(table)} DEFAULT")
+        cursor.execute(f"SELECT MIN(created_at) FROM {quote(old)}")
+        create_month_partitions(cursor, quote, table, cursor.fetchone()[0])
+        restore_rows(cursor, quote, TapRecord, old)
+        for brin_table in (table, apps.get_model("experiment", "Analysis")._meta.db_table):
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {quote(brin_index_name(brin_table))} "
+                f"ON {quote(brin_table)} USING brin (created_at)"
+            )
+
+
+def unpartition_tables(apps, schema_editor):
+    """Rebuild TapRecord's table unpartitioned, with primary key id, and drop the BRIN indexes."""
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        return
+    quote = connection.ops.quote_name
+    TapRecord = apps.get_model("experiment", "TapRecord")
+    table = TapRecord._meta.db_table
+    old = f"{table}_partitioned"
+    with connection.cursor() as cursor:
+        if not is_partitioned(cursor, table):
+            return
+        rename_and_recreate(
+            cursor, quote, table, old,
+            f"CREATE TABLE {quote(table)} (LIKE {quote(old)} INCLUDING DEFAULTS INCLUDING IDENTITY)",
+        )
+        # Dropping the partitioned table frees its constraint and index names
+        restore_rows(cursor, quote, TapRecord, old)
+        cursor.execute(f"ALTER TABLE {quote(table)} ADD PRIMARY KEY (id)")
+        cursor.execute(
+            f"DROP INDEX IF EXISTS {quote(brin_index_name(apps.get_model('experiment', 'Analysis')._meta.db_table))}"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("experiment", "0011_artifact_kind_trial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="analysis",
+            name="created_at",
+            field=models.DateTimeField(
+                auto_now_add=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="experimentsession",
+            name="archived_at",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="When tap and analysis data were moved to an archive file",
+                null=True,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="artifact",
+            name="kind",
+            field=models.CharField(
+                choices=[
+                    ("recording", "Recording"),
+                    ("plot", "Plot"),
+                    ("analysis_csv", "Analysis CSV"),
+                    ("archive", "Archive"),
+                ],
+                default="recording",
+                max_length=20,
+            ),
+        ),
+        migrations.RunPython(partition_tables, unpartition_tables),
+    ]
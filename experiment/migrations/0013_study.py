@@ -0,0 +1,134 @@
+# Generated by Django 5.1.2 on 2026-10-19 17:12
+
+import django.db.models.deletion
+import experiment.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("experiment", "0012_taprecord_partitioning"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Study",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100, unique=True)),
+                (
+                    "slug",
+                    models.SlugField(
+                        help_text="Used in links: /?study=<slug>", unique=True
+                    ),
+                ),
+                ("is_active", models.BooleanField(default=True)),
+                (
+                    "trial_count",
+                    models.PositiveIntegerField(
+                        default=12, help_text="Trials per stimulus"
+                    ),
+                ),
+                (
+                    "break_after",
+                    models.JSONField(
+                        blank=True,
+                        default=experiment.models.default_break_after,
+                        help_text="Trial numbers after which participants get a break",
+                    ),
+                ),
+                ("break_seconds", models.PositiveIntegerField(default=15)),
+                (
+                    "stimulus_break_seconds",
+                    models.PositiveIntegerField(
+                        default=120, help_text="Break between stimuli"
+                    ),
+                ),
+                (
+                    "analysis_config",
+                    models.JSONField(
+                        blank=True,
+                        default=dict,
+                        help_text="Overrides of REPP's sms_tapping config",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name_plural": "studies",
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name="allocationslot",
+            name="allocationslot_free_idx",
+        ),
+        migrations.AlterField(
+            model_name="allocationslot",
+            name="position",
+            field=models.BigIntegerField(),
+        ),
+        migrations.AddField(
+            model_name="study",
+            name="rhythm_sequences",
+            field=models.ManyToManyField(
+                blank=True,
+                help_text="Rhythm set; leave empty to use every sequence",
+                related_name="studies",
+                to="experiment.rhythmsequence",
+            ),
+        ),
+        migrations.AddField(
+            model_name="allocationslot",
+            name="study",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="allocation_slots",
+                to="experiment.study",
+            ),
+        ),
+        migrations.AddField(
+            model_name="experimentsession",
+            name="study",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="sessions",
+                to="experiment.study",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="allocationslot",
+            index=models.Index(
+                condition=models.Q(("session__isnull", True)),
+                fields=["study", "position"],
+                name="allocationslot_free_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="allocationslot",
+            constraint=models.UniqueConstraint(
+                fields=("study", "position"), name="allocationslot_study_position_uniq"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="allocationslot",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("study__isnull", True)),
+                fields=("position",),
+                name="allocationslot_default_position_uniq",
+            ),
+        ),
+    ]
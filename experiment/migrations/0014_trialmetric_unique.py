@@ -0,0 +1,73 @@
+# Generated by Django 5.1.2 on 2026-10-19 17:38
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+TOTALS = (
+    "trial_count", "failed_count", "asynchrony_count", "asynchrony_sum",
+    "asynchrony_sumsq", "percent_aligned_count", "percent_aligned_sum",
+)
+
+
+def metric_totals(metrics):
+    totals = dict.fromkeys(TOTALS, 0)
+    for metric in metrics:
+        totals["trial_count"] += 1
+        totals["failed_count"] += 1 if metric.failed else 0
+        if metric.mean_asynchrony is not None:
+            totals["asynchrony_count"] += 1
+            totals["asynchrony_sum"] += metric.mean_asynchrony
+            totals["asynchrony_sumsq"] += metric.mean_asynchrony ** 2
+        if metric.percent_aligned is not None:
+            totals["percent_aligned_count"] += 1
+            totals["percent_aligned_sum"] += metric.percent_aligned
+    return totals
+
+
+def drop_duplicate_metrics(apps, schema_editor):
+    """Keep the latest metrics row of each trial and rebuild the summaries of sessions that had duplicates."""
+    TrialMetric = apps.get_model("experiment", "TrialMetric")
+    SessionSummary = apps.get_model("experiment", "SessionSummary")
+    StimulusSummary = apps.get_model("experiment", "StimulusSummary")
+    duplicates = (
+        TrialMetric.objects.values("session_id", "stimulus_number", "trial_number")
+        .annotate(rows=Count("id"), latest=Max("id"))
+        .filter(rows__gt=1)
+    )
+    sessions = set()
+    for group in duplicates:
+        TrialMetric.objects.filter(
+            session_id=group["session_id"],
+            stimulus_number=group["stimulus_number"],
+            trial_number=group["trial_number"],
+        ).exclude(id=group["latest"]).delete()
+        sessions.add(group["session_id"])
+    for session_id in sessions:
+        metrics = list(TrialMetric.objects.filter(session_id=session_id))
+        SessionSummary.objects.filter(session_id=session_id).update(**metric_totals(metrics))
+        for summary in StimulusSummary.objects.filter(session_id=session_id):
+            StimulusSummary.objects.filter(id=summary.id).update(
+                **metric_totals(m for m in metrics if m.stimulus_number == summary.stimulus_number)
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("experiment", "0013_study"),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_metrics, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name="trialmetric",
+            name="experiment__session_ff06a7_idx",
+        ),
+        migrations.AddConstraint(
+            model_name="trialmetric",
+            constraint=models.UniqueConstraint(
+                fields=("session", "stimulus_number", "trial_number"),
+                name="trialmetric_session_trial_uniq",
+            ),
+        ),
+    ]
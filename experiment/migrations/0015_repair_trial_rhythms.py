@@ -0,0 +1,44 @@
+# Generated by Django 5.1.2 on 2026-10-19 17:48
+
+from django.db import migrations
+
+
+def repair_trial_rhythms(apps, schema_editor):
+    """
+    Point every session's trials at the rhythm PracticeView played: the first
+    of the session's level in its sequence order. Trials used to be built
+    before the allocated level was saved, and always from the level's first
+    rhythm. Rhythm sets follow experiment/studies.py: the study's own
+    sequences if it has any, otherwise all sequences, ordered by id.
+    """
+    ExperimentSession = apps.get_model("experiment", "ExperimentSession")
+    RhythmSequence = apps.get_model("experiment", "RhythmSequence")
+    Study = apps.get_model("experiment", "Study")
+    Trial = apps.get_model("experiment", "Trial")
+
+    sequences = {}
+    for session in ExperimentSession.objects.iterator():
+        if session.study_id not in sequences:
+            study = Study.objects.filter(id=session.study_id).first() if session.study_id else None
+            study_sequences = study.rhythm_sequences.all() if study is not None else RhythmSequence.objects.none()
+            if not study_sequences.exists():
+                study_sequences = RhythmSequence.objects.all()
+            sequences[session.study_id] = list(study_sequences.order_by("id").values_list("id", "rhythm_type"))
+        rhythms = [sequence_id for sequence_id, rhythm_type in sequences[session.study_id] if rhythm_type == session.complexity_level]
+        if not rhythms:
+            continue
+        rhythm_id = rhythms[session.sequence_order % len(rhythms)]
+        Trial.objects.filter(session_id=session.id, is_practice=False).exclude(rhythm_sequence_id=rhythm_id).update(
+            rhythm_sequence_id=rhythm_id
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("experiment", "0014_trialmetric_unique"),
+    ]
+
+    operations = [
+        migrations.RunPython(repair_trial_rhythms, migrations.RunPython.noop),
+    ]
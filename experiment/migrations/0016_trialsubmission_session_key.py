@@ -0,0 +1,28 @@
+# Generated by Django 5.1.2 on 2026-10-19 18:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("experiment", "0015_repair_trial_rhythms"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="trialsubmission",
+            name="idempotency_key",
+            field=models.CharField(
+                help_text="Client-generated key identifying one submission attempt",
+                max_length=64,
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="trialsubmission",
+            constraint=models.UniqueConstraint(
+                fields=("session", "idempotency_key"),
+                name="trialsubmission_session_key_uniq",
+            ),
+        ),
+    ]
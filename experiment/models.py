@@ -1,3 +1,5 @@
+from itertools import accumulate
+
 from django.db import models
 from django.contrib.auth.models import User
 from django.contrib.postgres.fields import JSONField
@@ -20,13 +22,21 @@ class Participant(models.Model):
 
 class ExperimentSession(models.Model):
     participant = models.OneToOneField(Participant, on_delete=models.CASCADE)  # Enforce uniqueness
+    study = models.ForeignKey('Study', on_delete=models.PROTECT, blank=True, null=True, related_name='sessions')
     start_time = models.DateTimeField(auto_now_add=True)
     end_time = models.DateTimeField(blank=True, null=True)
     complexity_level = models.CharField(max_length=50, choices=[('simple', 'Simple'), ('complex', 'Complex')], default='simple')
     ear_order = models.CharField(max_length=50, choices=[('left_first', 'Left First'), ('right_first', 'Right First')], default='left_first')
+    sequence_order = models.IntegerField(default=0, help_text="Which of the complexity level's rhythms is played first")
+    archived_at = models.DateTimeField(blank=True, null=True, help_text="When tap and analysis data were moved to an archive file")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['complexity_level', 'ear_order']),
+        ]
 
     def __str__(self):
-        return f"Session {self.id} for Participant {self.participant.id}"
+        return f"Session {self.id} for Participant {self.participant_id}"
 
 
 
@@ -39,10 +49,46 @@ class RhythmSequence(models.Model):
     name = models.CharField(max_length=100, unique=True)
     rhythm_type = models.CharField(max_length=10, choices=RHYTHM_TYPE_CHOICES, default='simple')
     sequence_data = models.JSONField(help_text="Enter the rhythm sequence in JSON format")
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.name} ({self.rhythm_type})"
 
+    @property
+    def onsets(self):
+        """Stimulus onsets in ms, accumulated from the inter-onset intervals in sequence_data."""
+        return list(accumulate(self.sequence_data))
+
+
+def default_break_after():
+    return [6]
+
+
+class Study(models.Model):
+    """
+    One study run on this deployment. Compiled into an immutable StudyPlan
+    (experiment/studies.py) that everything else reads.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    slug = models.SlugField(unique=True, help_text="Used in links: /?study=<slug>")
+    is_active = models.BooleanField(default=True)
+    rhythm_sequences = models.ManyToManyField(
+        RhythmSequence, blank=True, related_name='studies', help_text="Rhythm set; leave empty to use every sequence"
+    )
+    trial_count = models.PositiveIntegerField(default=12, help_text="Trials per stimulus")
+    break_after = models.JSONField(default=default_break_after, blank=True, help_text="Trial numbers after which participants get a break")
+    break_seconds = models.PositiveIntegerField(default=15)
+    stimulus_break_seconds = models.PositiveIntegerField(default=120, help_text="Break between stimuli")
+    analysis_config = models.JSONField(default=dict, blank=True, help_text="Overrides of REPP's sms_tapping config")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'studies'
+
+    def __str__(self):
+        return self.name
+
 class Trial(models.Model):
     session = models.ForeignKey(ExperimentSession, on_delete=models.CASCADE)
     participant = models.ForeignKey(Participant, on_delete=models.CASCADE)  # Ensure this is defined
@@ -52,12 +98,15 @@ class Trial(models.Model):
     sequence_order = models.IntegerField(default=1)
 
     def __str__(self):
-        return f"Trial {self.trial_number} - Session {self.session.id}"
+        return f"Trial {self.trial_number} - Session {self.session_id}"
 
 class Analysis(models.Model):
     trial = models.OneToOneField(Trial, on_delete=models.CASCADE)
     reaction_time = models.DurationField(blank=True, null=True)
     response_data = models.JSONField(blank=True, null=True, help_text="Structured response data in JSON format")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    # On PostgreSQL created_at carries a BRIN index (migration 0012)
 
     def __str__(self):
         return f"Analysis for Trial {self.trial.trial_number}"
@@ -69,8 +118,176 @@ class TapRecord(models.Model):
     average_reaction_time = models.DurationField(blank=True, null=True, help_text="Average reaction time per tap")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # On PostgreSQL the table is range-partitioned by month on created_at, with
+    # a BRIN index on it and primary key (id, created_at); see migration 0012
+    # and experiment/partitions.py
+
+    def __str__(self):
+        return f"TapRecord for Trial {self.trial_id} by Participant {self.participant_id}"
+
+class TrialSubmission(models.Model):
+    session = models.ForeignKey(ExperimentSession, on_delete=models.CASCADE, related_name='submissions')
+    trial_number = models.IntegerField()
+    idempotency_key = models.CharField(max_length=64, help_text="Client-generated key identifying one submission attempt")
+    audio_hash = models.CharField(max_length=64, blank=True, default='', help_text="SHA-256 of the uploaded recording")
+    response = models.JSONField(help_text="Stored response returned for repeated submissions")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['session', 'trial_number', 'audio_hash']),
+        ]
+        # Keys are generated per participant, so they are only unique within a session
+        constraints = [
+            models.UniqueConstraint(fields=['session', 'idempotency_key'], name='trialsubmission_session_key_uniq'),
+        ]
+
     def __str__(self):
-        return f"TapRecord for Trial {self.trial.trial_number} by Participant {self.participant.id}"
+        return f"Submission {self.idempotency_key} for Trial {self.trial_number}"
 
 
+class SummaryStats(models.Model):
+    """Running totals for trial metrics, updated in place as each trial is analysed."""
+    trial_count = models.IntegerField(default=0)
+    failed_count = models.IntegerField(default=0)
+    asynchrony_count = models.IntegerField(default=0, help_text="Trials with a finite mean asynchrony")
+    asynchrony_sum = models.FloatField(default=0.0)
+    asynchrony_sumsq = models.FloatField(default=0.0)
+    percent_aligned_count = models.IntegerField(default=0)
+    percent_aligned_sum = models.FloatField(default=0.0)
+    updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        abstract = True
+
+    @property
+    def mean_asynchrony(self):
+        if not self.asynchrony_count:
+            return None
+        return self.asynchrony_sum / self.asynchrony_count
+
+    @property
+    def sd_asynchrony(self):
+        if self.asynchrony_count < 2:
+            return None
+        n = self.asynchrony_count
+        variance = (self.asynchrony_sumsq - self.asynchrony_sum ** 2 / n) / (n - 1)
+        return max(variance, 0.0) ** 0.5
+
+    @property
+    def percent_aligned(self):
+        if not self.percent_aligned_count:
+            return None
+        return self.percent_aligned_sum / self.percent_aligned_count
+
+
+class SessionSummary(SummaryStats):
+    session = models.OneToOneField(ExperimentSession, on_delete=models.CASCADE, related_name='summary')
+
+    def __str__(self):
+        return f"Summary for Session {self.session_id}"
+
+
+class StimulusSummary(SummaryStats):
+    EAR_CHOICES = [('left', 'Left'), ('right', 'Right')]
+
+    session = models.ForeignKey(ExperimentSession, on_delete=models.CASCADE, related_name='stimulus_summaries')
+    stimulus_number = models.IntegerField()
+    ear = models.CharField(max_length=5, choices=EAR_CHOICES)
+
+    class Meta:
+        unique_together = ('session', 'stimulus_number')
+
+    def __str__(self):
+        return f"Stimulus {self.stimulus_number} summary for Session {self.session_id}"
+
+
+class TrialMetric(models.Model):
+    """One typed row of headline metrics per analysed trial, for grouped queries across participants."""
+    session = models.ForeignKey(ExperimentSession, on_delete=models.CASCADE, related_name='trial_metrics')
+    stimulus_number = models.IntegerField()
+    trial_number = models.IntegerField()
+    block = models.IntegerField(help_text="Trial block within the stimulus, split at the mid-stimulus break")
+    failed = models.BooleanField(default=False)
+    mean_asynchrony = models.FloatField(blank=True, null=True)
+    sd_asynchrony = models.FloatField(blank=True, null=True)
+    percent_aligned = models.FloatField(blank=True, null=True)
+    latency_ms = models.FloatField(blank=True, null=True, help_text="Playback-to-recording latency from marker alignment")
+    clock_drift_ppm = models.FloatField(blank=True, null=True, help_text="Recording clock drift relative to the stimulus")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['session', 'stimulus_number', 'trial_number'], name='trialmetric_session_trial_uniq'
+            ),
+        ]
+
+    def __str__(self):
+        return f"Metrics for Trial {self.trial_number} - Session {self.session_id}"
+
+
+class AllocationSlot(models.Model):
+    """One position of the counterbalanced schedule; claimed by a session with SELECT ... FOR UPDATE SKIP LOCKED."""
+    study = models.ForeignKey(Study, on_delete=models.CASCADE, blank=True, null=True, related_name='allocation_slots')
+    position = models.BigIntegerField()
+    complexity_level = models.CharField(max_length=50)
+    ear_order = models.CharField(max_length=50)
+    sequence_order = models.IntegerField()
+    session = models.OneToOneField(ExperimentSession, on_delete=models.SET_NULL, blank=True, null=True, related_name='allocation_slot')
+    allocated_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['study', 'position'], name='allocationslot_free_idx', condition=models.Q(session__isnull=True)),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['study', 'position'], name='allocationslot_study_position_uniq'),
+            models.UniqueConstraint(
+                fields=['position'], condition=models.Q(study__isnull=True), name='allocationslot_default_position_uniq'
+            ),
+        ]
+
+    def __str__(self):
+        return f"Slot {self.position}: {self.complexity_level}/{self.ear_order}/{self.sequence_order}"
+
+
+class Artifact(models.Model):
+    """
+    Manifest entry for a file the experiment wrote: what it is, which trial
+    it belongs to, where it lives now and what it should hash to. Storage
+    states are maintained by experiment/lifecycle.py; query it through
+    experiment/artifacts.py instead of listing the bucket.
+    """
+    KIND_CHOICES = [
+        ('recording', 'Recording'),
+        ('plot', 'Plot'),
+        ('analysis_csv', 'Analysis CSV'),
+        ('archive', 'Archive'),
+    ]
+    STATUS_CHOICES = [
+        ('local', 'Local only'),
+        ('uploaded', 'Local and remote'),
+        ('remote', 'Remote only'),
+        ('cold', 'Remote, recompressed'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default='recording')
+    session = models.ForeignKey(ExperimentSession, on_delete=models.SET_NULL, blank=True, null=True, related_name='artifacts')
+    trial = models.ForeignKey(Trial, on_delete=models.SET_NULL, blank=True, null=True, related_name='artifacts')
+    storage_key = models.CharField(max_length=512, unique=True, help_text="Object key in the bucket")
+    local_path = models.CharField(max_length=512, blank=True, default='', help_text="Local copy, empty once evicted")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='local')
+    size = models.BigIntegerField(default=0, help_text="Size in bytes of the stored object")
+    sha256 = models.CharField(max_length=64, blank=True, default='', help_text="SHA-256 of the original file")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'updated_at']),
+            models.Index(fields=['kind', 'session']),
+        ]
+
+    def __str__(self):
+        return f"{self.storage_key} ({self.status})"
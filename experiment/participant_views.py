@@ -0,0 +1,157 @@
+# experiment/participant_views.py
+"""
+Participant-facing pages and health checks.
+
+Everything here runs in the slim participant deployment (api/settings_participant.py),
+so this module must not import NumPy, SciPy, pandas, matplotlib, REPP or boto3,
+directly or through the modules it uses. Trial submissions, stimulus audio
+and the REST API are served by the worker deployment from experiment/views.py.
+"""
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
+from django.views.generic import TemplateView, View
+
+from .allocation import allocate_session, complete_session
+from .cache import get_participant_session, get_rhythm_sequence
+from .forms import ParticipantForm
+from .models import Participant, Study
+from .scoring import scoring_thresholds
+from .stimuli import stimulus_fingerprint
+from .studies import active_study, get_plan
+from .warmup import is_ready, warmup_status
+
+
+def session_stimulus_urls(plan, complexity_level, sequence_order):
+    """Stimulus URLs of a session in presentation order; StimulusAudioView renders any not yet on disk."""
+    return [
+        reverse('stimulus_audio', args=[stimulus_fingerprint(list(rhythm.intervals))])
+        for rhythm in plan.presentation_order(complexity_level, sequence_order)
+    ]
+
+
+class LivenessView(View):
+    """The process is up and serving; reports the warm-up state without depending on it."""
+
+    def get(self, request):
+        return JsonResponse({'status': 'alive', 'warmup': warmup_status()['state']})
+
+
+class ReadinessView(View):
+    """503 until this process has warmed up, so the platform routes no participants to it before then."""
+
+    def get(self, request):
+        warmup = warmup_status()
+        return JsonResponse(
+            {'status': 'ready' if is_ready() else 'warming', 'warmup': warmup},
+            status=200 if is_ready() else 503,
+        )
+
+
+class CompletionView(TemplateView):
+    template_name = 'experiment/completion.html'
+
+    def get(self, request):
+        experiment_session = get_participant_session(request.session.get('participant_id'))
+        if experiment_session is not None:
+            complete_session(experiment_session)
+        return render(request, self.template_name)
+
+
+class WelcomeHomeView(View):
+    template_name = 'experiment/welcome.html'
+
+    def get(self, request):
+        # Study links look like /?study=<slug>; without one, sessions use the default plan
+        study = active_study(request.GET.get('study'))
+        if study:
+            request.session['study_id'] = study.id
+        form = ParticipantForm()
+        return render(request, self.template_name, {'form': form})
+
+    def post(self, request):
+        form = ParticipantForm(request.POST)
+        if form.is_valid():
+            participant = form.save()
+            request.session['participant_id'] = participant.id
+            return redirect('practice')
+        return render(request, self.template_name, {'form': form})
+
+
+class PracticeView(View):
+    template_name = 'experiment/practice.html'
+
+    def get(self, request):
+        participant_id = request.session.get('participant_id')
+        if not participant_id:
+            return redirect('welcome_home')
+
+        experiment_session = get_participant_session(participant_id)
+        if experiment_session is None:
+            study = Study.objects.filter(id=request.session.get('study_id')).first()
+            experiment_session = allocate_session(get_object_or_404(Participant, id=participant_id), study=study)
+
+        # The allocated sequence order picks which of the level's rhythms comes first
+        plan = get_plan(experiment_session.study_id)
+        rhythms = plan.presentation_order(experiment_session.complexity_level, experiment_session.sequence_order)
+        rhythm_sequence = get_rhythm_sequence(rhythms[0].id) if rhythms else None
+        if not rhythm_sequence:
+            return redirect('welcome_home')
+
+        request.session['rhythm_sequence_id'] = rhythm_sequence.id
+        context = {
+            'participant_id': participant_id,
+            'complexity_level': experiment_session.complexity_level,
+            'ear_order': experiment_session.ear_order,
+            'rhythm_sequence': rhythm_sequence,
+            'rhythm_sequence_data': {
+                'name': rhythm_sequence.name,
+                'sequence_data': rhythm_sequence.sequence_data,
+            },
+            # Preloaded by the browser during practice so trials play without fetching
+            'stimulus_urls': session_stimulus_urls(
+                plan, experiment_session.complexity_level, experiment_session.sequence_order
+            ),
+            'trial_number': 1
+        }
+        return render(request, self.template_name, context)
+
+
+class TrialPageView(View):
+    """The trial page; experiment.views.TrialView adds the submission handler."""
+    template_name = 'experiment/trials.html'
+
+    def get(self, request, trial_number):
+        participant_id = request.session.get('participant_id')
+        if not participant_id:
+            return redirect('welcome_home')
+
+        experiment_session = get_participant_session(participant_id)
+        rhythm_sequence = get_rhythm_sequence(request.session.get('rhythm_sequence_id'))
+        if experiment_session is None or rhythm_sequence is None:
+            raise Http404("No experiment session or rhythm sequence for this participant.")
+
+        # Content-addressed URL, so the browser fetches it once and reuses it for every trial.
+        # StimulusAudioView renders it on first request; warm-up renders it ahead of time.
+        audio_url = reverse('stimulus_audio', args=[stimulus_fingerprint(rhythm_sequence.sequence_data)])
+        plan = get_plan(experiment_session.study_id)
+        context = {
+            'participant_id': participant_id,
+            'complexity_level': experiment_session.complexity_level,
+            'ear_order': experiment_session.ear_order,
+            'rhythm_sequence': rhythm_sequence,
+            'audio_url': audio_url,
+            'trial_number': trial_number,
+            'trial_plan': {
+                'total_trials': plan.trial_count,
+                'break_after': list(plan.break_after),
+                'break_seconds': plan.break_seconds,
+            },
+            'tap_scoring': scoring_thresholds(),
+        }
+        return render(request, self.template_name, context)
+
+
+def worker_only(request, *args, **kwargs):
+    """Placeholder for routes the worker deployment serves, so the participant app can still reverse them."""
+    return JsonResponse({'error': 'Served by the worker deployment.'}, status=404)
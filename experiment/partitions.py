@@ -0,0 +1,75 @@
+# experiment/partitions.py
+"""
+Monthly range partitioning of TapRecord on created_at (PostgreSQL only).
+
+Migration 0012 rebuilt the table this way. The parent table keeps a DEFAULT
+partition so an insert never fails when the maintenance job is late; `ensure_partitions` moves any such rows into the
+right monthly partition when it creates it. On other databases every
+function here is a no-op.
+"""
+import logging
+from datetime import datetime, timezone
+
+from django.db import connection as default_connection, transaction
+
+logger = logging.getLogger(__name__)
+
+PARTITION_MONTHS_AHEAD = 3
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1, tzinfo=timezone.utc)
+
+
+def next_month(value):
+    return month_start(datetime(value.year + value.month // 12, value.month % 12 + 1, 1))
+
+
+def partition_name(table, month):
+    return f"{table}_y{month.year}m{month.month:02d}"
+
+
+def is_partitioned(table, connection=default_connection):
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))", [table])
+        return cursor.fetchone()[0]
+
+
+def ensure_partitions(table, start=None, months_ahead=PARTITION_MONTHS_AHEAD, connection=default_connection):
+    """
+    Create monthly partitions of `table` from `start` (default: this month)
+    until `months_ahead` months from now. Returns the names created.
+    """
+    if not is_partitioned(table, connection):
+        return []
+    month = month_start(start or datetime.now(timezone.utc))
+    end = month_start(datetime.now(timezone.utc))
+    for _ in range(months_ahead):
+        end = next_month(end)
+    quote = connection.ops.quote_name
+    created = []
+    with connection.cursor() as cursor:
+        while month <= end:
+            name = partition_name(table, month)
+            cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [name])
+            if not cursor.fetchone()[0]:
+                bounds = [month, next_month(month)]
+                # Rows that landed in the default partition for this month move with it
+                with transaction.atomic(using=connection.alias):
+                    cursor.execute(f"CREATE TABLE {quote(name)} (LIKE {quote(table)} INCLUDING DEFAULTS)")
+                    cursor.execute(
+                        f"WITH moved AS (DELETE FROM {quote(table + '_default')} "
+                        f"WHERE created_at >= %s AND created_at < %s RETURNING *) "
+                        f"INSERT INTO {quote(name)} SELECT * FROM moved",
+                        bounds,
+                    )
+                    cursor.execute(
+                        f"ALTER TABLE {quote(table)} ATTACH PARTITION {quote(name)} FOR VALUES FROM (%s) TO (%s)",
+                        bounds,
+                    )
+                created.append(name)
+                logger.info(f"Created partition {name}")
+            month = next_month(month)
+    return created
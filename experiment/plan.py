@@ -0,0 +1,113 @@
+# experiment/plan.py
+"""
+Immutable, precompiled shape of a study: rhythm sets, trials per stimulus,
+break schedule and analysis config overrides.
+
+A StudyPlan is compiled once from a Study row (see experiment/studies.py)
+and shared by views, signals, summaries and the analysis pipeline, so none
+of them re-derives the schedule. Only the standard library is used here so
+New_experiment.py can load the same plan from JSON.
+"""
+import json
+from dataclasses import dataclass, field
+
+DEFAULT_TRIAL_COUNT = 12
+DEFAULT_BREAK_AFTER = (6,)
+DEFAULT_BREAK_SECONDS = 15
+DEFAULT_STIMULUS_BREAK_SECONDS = 120
+
+
+@dataclass(frozen=True)
+class Rhythm:
+    id: int
+    name: str
+    intervals: tuple
+
+
+@dataclass(frozen=True)
+class StudyPlan:
+    study_id: int = None
+    name: str = 'default'
+    trial_count: int = DEFAULT_TRIAL_COUNT
+    break_after: tuple = DEFAULT_BREAK_AFTER
+    break_seconds: int = DEFAULT_BREAK_SECONDS
+    stimulus_break_seconds: int = DEFAULT_STIMULUS_BREAK_SECONDS
+    # (complexity_level, (Rhythm, ...)) pairs, in presentation order
+    rhythm_sets: tuple = ()
+    # Sorted (name, value) pairs overriding REPP's sms_tapping
+    analysis_config: tuple = field(default=())
+
+    def rhythms(self, complexity_level):
+        for level, rhythms in self.rhythm_sets:
+            if level == complexity_level:
+                return rhythms
+        return ()
+
+    def presentation_order(self, complexity_level, sequence_order=0):
+        """The level's rhythms in the order a session with `sequence_order` hears them."""
+        rhythms = self.rhythms(complexity_level)
+        if not rhythms:
+            return ()
+        start = sequence_order % len(rhythms)
+        return rhythms[start:] + rhythms[:start]
+
+    def stimulus_number(self, complexity_level, sequence_order, rhythm_id):
+        """1-based position of a rhythm in the session's presentation order (1 if it is not in the set)."""
+        for number, rhythm in enumerate(self.presentation_order(complexity_level, sequence_order), start=1):
+            if rhythm.id == rhythm_id:
+                return number
+        return 1
+
+    def block_for_trial(self, trial_number):
+        """1-based block of a trial; each break starts a new block."""
+        return 1 + sum(1 for after in self.break_after if trial_number > after)
+
+    def analysis_overrides(self):
+        return dict(self.analysis_config)
+
+    def to_dict(self):
+        return {
+            'study_id': self.study_id,
+            'name': self.name,
+            'trial_count': self.trial_count,
+            'break_after': list(self.break_after),
+            'break_seconds': self.break_seconds,
+            'stimulus_break_seconds': self.stimulus_break_seconds,
+            'rhythm_sets': {
+                level: [{'id': r.id, 'name': r.name, 'intervals': list(r.intervals)} for r in rhythms]
+                for level, rhythms in self.rhythm_sets
+            },
+            'analysis_config': dict(self.analysis_config),
+        }
+
+
+def build_plan(rhythm_sets, analysis_config=None, **fields):
+    """
+    StudyPlan from plain data: `rhythm_sets` maps complexity level to a list
+    of rhythms (dicts with id/name/intervals, or bare interval lists).
+    """
+    compiled = []
+    for level, rhythms in rhythm_sets.items():
+        entries = []
+        for index, rhythm in enumerate(rhythms):
+            if not isinstance(rhythm, dict):
+                rhythm = {'id': index, 'name': f"{level}_{index + 1}", 'intervals': rhythm}
+            entries.append(Rhythm(rhythm['id'], rhythm['name'], tuple(rhythm['intervals'])))
+        compiled.append((level, tuple(entries)))
+    if 'break_after' in fields:
+        fields['break_after'] = tuple(sorted(fields['break_after']))
+    return StudyPlan(
+        rhythm_sets=tuple(compiled),
+        analysis_config=tuple(sorted((analysis_config or {}).items())),
+        **fields,
+    )
+
+
+def plan_from_dict(data):
+    data = dict(data)
+    return build_plan(data.pop('rhythm_sets'), analysis_config=data.pop('analysis_config', None), **data)
+
+
+def load_plan(path):
+    with open(path) as f:
+        return plan_from_dict(json.load(f))
@@ -0,0 +1,71 @@
+# experiment/prescreen.py
+"""
+Cheap quality checks on a raw recording, run before REPP analysis so that
+silent, clipped or DC-shifted trials are rejected in milliseconds.
+
+Only the signal level is checked. Web recordings rarely pick up the markers
+(headphones, echo cancellation), and REPP finds its own markers in the
+standalone script's recordings, so marker detection is left to
+experiment/alignment.py and REPP. The marker shape is defined here for them.
+
+Only NumPy is used here so the standalone experiment script can import it
+without Django.
+"""
+import numpy as np
+
+# Marker shape used by generate_rhythm_audio: three 440 Hz tones separated by silence
+MARKER_FREQUENCY = 440
+MARKER_DURATION = 0.25
+MARKER_GAP = 0.2
+MARKER_COUNT = 3
+
+MIN_RMS = 1e-3  # About -60 dBFS; anything quieter is treated as silence
+MAX_CLIPPING_RATIO = 0.01
+CLIPPING_LEVEL = 0.99
+MAX_DC_OFFSET = 0.05
+MARKER_THRESHOLD = 0.3  # Normalized cross-correlation needed to count a marker
+
+
+def marker_template(fs, frequency=MARKER_FREQUENCY, duration=MARKER_DURATION):
+    """The marker tone exactly as generate_rhythm_audio synthesizes it."""
+    return np.sin(2 * np.pi * frequency * np.linspace(0, duration, int(fs * duration)))
+
+
+def to_float_mono(audio):
+    """Convert integer PCM or multi-channel audio to a float mono signal in [-1, 1]."""
+    audio = np.asarray(audio)
+    if audio.dtype == np.uint8:
+        audio = (audio.astype(np.float32) - 128) / 128
+    elif np.issubdtype(audio.dtype, np.integer):
+        audio = audio.astype(np.float32) / (np.iinfo(audio.dtype).max + 1)
+    else:
+        audio = audio.astype(np.float32, copy=False)
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+    return audio
+
+
+def prescreen_recording(audio, fs):
+    """
+    Run the pre-screen on a raw recording.
+
+    Returns a dict shaped like REPP's `is_failed` ({'failed', 'reason'}) with the
+    measured RMS, clipping ratio and DC offset added.
+    """
+    signal = to_float_mono(audio)
+    result = {'failed': False, 'reason': 'N/A'}
+    if signal.size == 0:
+        result.update(failed=True, reason='Empty recording')
+        return result
+
+    result['rms'] = float(np.sqrt(np.mean(np.square(signal, dtype=np.float64))))
+    result['clipping_ratio'] = float(np.count_nonzero(np.abs(signal) >= CLIPPING_LEVEL) / signal.size)
+    result['dc_offset'] = float(np.mean(signal, dtype=np.float64))
+
+    if result['rms'] < MIN_RMS:
+        result.update(failed=True, reason='Recording is silent')
+    elif result['clipping_ratio'] > MAX_CLIPPING_RATIO:
+        result.update(failed=True, reason='Recording is clipped')
+    elif abs(result['dc_offset']) > MAX_DC_OFFSET:
+        result.update(failed=True, reason='Recording has a large DC offset')
+    return result
@@ -0,0 +1,30 @@
+# experiment/routers.py
+from django.conf import settings
+
+REPLICA_DB = 'replica'
+
+
+def analytics_db():
+    """Alias that analytics, export and admin reads should use: the replica when one is configured."""
+    return REPLICA_DB if REPLICA_DB in settings.DATABASES else 'default'
+
+
+class PrimaryReplicaRouter:
+    """
+    Participant traffic reads and writes the primary. Heavy research reads
+    opt in to the replica with `.using(analytics_db())`; anything they load
+    is still saved to the primary, and only the primary is migrated.
+    """
+
+    def db_for_read(self, model, **hints):
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
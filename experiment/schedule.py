@@ -0,0 +1,64 @@
+# experiment/schedule.py
+"""
+Counterbalanced condition schedule.
+
+Every cell of complexity x ear order x sequence order appears once in each
+block of len(CELLS) consecutive allocations, so cells never differ by more
+than one participant at a block boundary. Successive blocks follow the rows
+of a Latin square, so each cell also takes every position within a block
+equally often. The square is shuffled with a fixed seed, which makes the
+schedule reproducible but not obvious.
+
+Only the standard library is used here so the standalone experiment script
+can allocate from the same schedule.
+"""
+import itertools
+import os
+import random
+from functools import lru_cache
+
+COMPLEXITY_LEVELS = ('simple', 'complex')
+EAR_ORDERS = ('left_first', 'right_first')
+SEQUENCE_ORDERS = (0, 1)
+CELLS = [
+    {'complexity_level': complexity, 'ear_order': ear_order, 'sequence_order': sequence_order}
+    for complexity, ear_order, sequence_order in itertools.product(COMPLEXITY_LEVELS, EAR_ORDERS, SEQUENCE_ORDERS)
+]
+SCHEDULE_SEED = 20241
+
+
+@lru_cache(maxsize=None)
+def latin_square(n, seed=SCHEDULE_SEED):
+    """A cyclic n x n Latin square with its rows, columns and symbols shuffled by `seed`."""
+    rng = random.Random(seed)
+    rows, columns, symbols = list(range(n)), list(range(n)), list(range(n))
+    rng.shuffle(rows)
+    rng.shuffle(columns)
+    rng.shuffle(symbols)
+    return tuple(tuple(symbols[(r + c) % n] for c in columns) for r in rows)
+
+
+def cell_for_position(position, seed=SCHEDULE_SEED):
+    """The condition cell assigned to the `position`-th allocation (0-based)."""
+    square = latin_square(len(CELLS), seed)
+    block, offset = divmod(position, len(CELLS))
+    return CELLS[square[block % len(CELLS)][offset]]
+
+
+def claim_local_position(directory, participant_id):
+    """
+    Claim the next free schedule position using exclusively created marker
+    files, so several experiment machines sharing `directory` never hand out
+    the same position.
+    """
+    os.makedirs(directory, exist_ok=True)
+    position = len(os.listdir(directory))
+    while True:
+        try:
+            fd = os.open(os.path.join(directory, f"{position:06d}"), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            position += 1
+            continue
+        with os.fdopen(fd, 'w') as f:
+            f.write(str(participant_id))
+        return position
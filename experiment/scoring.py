@@ -0,0 +1,151 @@
+# experiment/scoring.py
+"""
+Tap scoring against stimulus onsets.
+
+The trial page scores a trial in the browser (static/js/tap_scorer.js) as
+soon as it ends, to decide on a retry without a server round trip, and sends
+its summary with the raw taps. `score_taps` is the same computation, step
+for step; the server reruns it on the raw taps, which is cheap, and checks
+the browser's summary against it with `verify_tap_summary`. It is plain
+Python so the participant deployment can import this module.
+
+Times are in ms from the start of the served stimulus file. The thresholds
+below are passed to the browser by the trial page, so both sides always use
+the same ones.
+"""
+import math
+from bisect import bisect_left
+
+from .cache import STIMULUS_ONSETS_CACHE, get_or_load
+from .stimuli import stimulus_fingerprint
+
+MATCH_WINDOW_MS = 200  # A tap further than this from an onset is never aligned to it
+MATCH_WINDOW_FRACTION = 0.5  # ...nor further than this share of the rhythm's shortest IOI, so windows never overlap
+MIN_PERCENT_ALIGNED = 50.0  # Below this share of onsets with an aligned tap a trial should be retried
+SUMMARY_TOLERANCE = 1.0  # ms for asynchronies, percentage points for percent_aligned
+
+
+def scoring_thresholds():
+    return {
+        'match_window_ms': MATCH_WINDOW_MS,
+        'match_window_fraction': MATCH_WINDOW_FRACTION,
+        'min_percent_aligned': MIN_PERCENT_ALIGNED,
+    }
+
+
+def compile_stimulus_onsets(sequence_data):
+    """
+    Onsets (ms) of a rhythm within its served stimulus file: the marker block
+    that generate_rhythm_audio puts in front, plus each onset's position in
+    the audio REPP prepares, which REPP reports as stim_shifted_onsets.
+    """
+    from repp.config import sms_tapping
+    from repp.stimulus import REPPStimulus
+
+    from .synth import marker_block
+
+    stimulus = REPPStimulus("generated_rhythm", config=sms_tapping)
+    onsets = stimulus.make_onsets_from_ioi(sequence_data)
+    _audio, stim_info, _alignment = stimulus.prepare_stim_from_onsets(onsets)
+    shifted = (stim_info or {}).get('stim_shifted_onsets', onsets)
+    lead_ms = 1000 * len(marker_block(sms_tapping.FS)) / sms_tapping.FS
+    return [lead_ms + float(onset) for onset in shifted]
+
+
+def stimulus_onsets(sequence_data):
+    """Compiled onsets of a rhythm, cached by stimulus fingerprint (which changes with the synthesis)."""
+    return get_or_load(
+        STIMULUS_ONSETS_CACHE, (stimulus_fingerprint(sequence_data),),
+        lambda: compile_stimulus_onsets(sequence_data), timeout=None,
+    )
+
+
+def match_window(onset_ms, match_window_ms=MATCH_WINDOW_MS, match_window_fraction=MATCH_WINDOW_FRACTION):
+    """Match window (ms) for a rhythm: `match_window_ms`, narrowed to a share of its shortest IOI."""
+    onsets = sorted(onset_ms)
+    iois = [b - a for a, b in zip(onsets, onsets[1:]) if b > a]
+    return min([match_window_ms] + [match_window_fraction * ioi for ioi in iois])
+
+
+def nearest_unused_tap(taps, onset, window, used):
+    """Index of the nearest of the sorted `taps` within `window` of `onset` not in `used`; the earlier on a tie."""
+    best = None
+    index = bisect_left(taps, onset - window)
+    while index < len(taps) and taps[index] <= onset + window:
+        if index not in used and (best is None or abs(taps[index] - onset) < abs(taps[best] - onset)):
+            best = index
+        index += 1
+    return best
+
+
+def score_taps(tap_ms, onset_ms, match_window_ms=MATCH_WINDOW_MS, min_percent_aligned=MIN_PERCENT_ALIGNED,
+               match_window_fraction=MATCH_WINDOW_FRACTION):
+    """
+    Match onsets to taps one to one, each onset in turn taking the nearest
+    unused tap within the match window, and summarise the asynchronies (tap
+    minus onset). `quality` is 'ok', 'no_taps' or 'too_few_aligned'.
+    """
+    taps = sorted(float(tap) for tap in tap_ms)
+    window = match_window(onset_ms, match_window_ms, match_window_fraction)
+    asynchronies = []
+    used = set()
+    for onset in sorted(onset_ms):
+        index = nearest_unused_tap(taps, onset, window, used)
+        if index is not None:
+            used.add(index)
+            asynchronies.append(taps[index] - onset)
+
+    matched = len(asynchronies)
+    percent_aligned = 100 * matched / len(onset_ms) if onset_ms else 0.0
+    if not taps:
+        quality = 'no_taps'
+    elif percent_aligned < min_percent_aligned:
+        quality = 'too_few_aligned'
+    else:
+        quality = 'ok'
+
+    mean = sd = None
+    if matched:
+        mean = sum(asynchronies) / matched
+        sd = math.sqrt(sum((a - mean) ** 2 for a in asynchronies) / (matched - 1)) if matched > 1 else 0.0
+    return {
+        'tap_count': len(taps),
+        'matched': matched,
+        'mean_asynchrony': mean,
+        'sd_asynchrony': sd,
+        'percent_aligned': percent_aligned,
+        'quality': quality,
+    }
+
+
+def verify_tap_summary(client_summary, server_summary, tolerance=SUMMARY_TOLERANCE):
+    """True if the browser's summary agrees with the server's score of the same taps."""
+    if not isinstance(client_summary, dict):
+        return False
+    for key in ('tap_count', 'matched', 'quality'):
+        if client_summary.get(key) != server_summary[key]:
+            return False
+    for key in ('mean_asynchrony', 'sd_asynchrony', 'percent_aligned'):
+        expected, reported = server_summary[key], client_summary.get(key)
+        if expected is None or reported is None:
+            if expected is not reported:
+                return False
+        elif not isinstance(reported, (int, float)) or abs(reported - expected) > tolerance:
+            return False
+    return True
+
+
+def tap_analysis(score, tap_ms, onset_ms):
+    """(output, analysis_result, is_failed) in the shape of a REPP result, from a tap score."""
+    taps = sorted(tap_ms)
+    output = {
+        'stim_ioi': [b - a for a, b in zip(onset_ms, onset_ms[1:])],
+        'resp_ioi': [b - a for a, b in zip(taps, taps[1:])],
+    }
+    analysis_result = {
+        'mean_async_all': score['mean_asynchrony'],
+        'sd_async_all': score['sd_asynchrony'],
+        'percent_resp_aligned_all': score['percent_aligned'],
+    }
+    is_failed = {'failed': score['quality'] != 'ok', 'reason': score['quality']}
+    return output, analysis_result, is_failed
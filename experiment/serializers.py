@@ -1,12 +1,28 @@
 from rest_framework import serializers
 from .models import RhythmSequence, Participant, ExperimentSession, Trial, Analysis
+from .scoring import stimulus_onsets
 
 class RhythmSequenceSerializer(serializers.ModelSerializer):
+    onsets = serializers.ListField(child=serializers.FloatField(), read_only=True)
+
     class Meta:
         model = RhythmSequence
-        fields = ['id', 'name', 'rhythm_type', 'sequence_data']
+        fields = ['id', 'name', 'rhythm_type', 'sequence_data', 'onsets', 'updated_at']
+        read_only_fields = ['updated_at']
         # Future field for audio if needed: 'audio_url'
-        
+
+
+class RhythmSequenceDetailSerializer(RhythmSequenceSerializer):
+    # Onsets within the served stimulus file, used by the trial page to score taps.
+    # Compiling them synthesizes the stimulus on a cold cache, so lists leave them out.
+    stimulus_onsets = serializers.SerializerMethodField()
+
+    class Meta(RhythmSequenceSerializer.Meta):
+        fields = RhythmSequenceSerializer.Meta.fields + ['stimulus_onsets']
+
+    def get_stimulus_onsets(self, obj):
+        return stimulus_onsets(obj.sequence_data)
+
 
 class StartExperimentSerializer(serializers.ModelSerializer):
     class Meta:
@@ -1,30 +1,51 @@
 # experiment/signals.py
 
-from django.db.models.signals import post_save
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
-from .models import ExperimentSession, Trial, RhythmSequence
-
-TRIAL_COUNT = 12  # Define the number of trials per session
+from .cache import PARTICIPANT_SESSION_CACHE, RHYTHM_SEQUENCE_CACHE, STUDY_PLAN_CACHE, bump_version, invalidate
+from .models import ExperimentSession, Trial, RhythmSequence, Study
+from .studies import get_plan
 
 @receiver(post_save, sender=ExperimentSession)
 def create_trials_for_session(sender, instance, created, **kwargs):
     if created:
         print(f"Signal triggered for ExperimentSession {instance.id}")
         try:
-            # Choose the appropriate rhythm sequence based on session complexity level
-            rhythm_sequence = RhythmSequence.objects.filter(rhythm_type=instance.complexity_level).first()
-            if not rhythm_sequence:
+            # The rhythm PracticeView plays: the first of the level in the session's sequence order
+            plan = get_plan(instance.study_id)
+            rhythms = plan.presentation_order(instance.complexity_level, instance.sequence_order)
+            if not rhythms:
                 raise ValueError("No RhythmSequence found for specified complexity level.")
 
             # Create trials and associate them with both session and participant
-            for i in range(1, TRIAL_COUNT + 1):
+            for i in range(1, plan.trial_count + 1):
                 Trial.objects.create(
                     session=instance,
                     participant=instance.participant,  # Set the participant explicitly
                     trial_number=i,
-                    rhythm_sequence=rhythm_sequence
+                    rhythm_sequence_id=rhythms[0].id
                 )
-            print(f"Created {TRIAL_COUNT} trials for ExperimentSession {instance.id}")
+            print(f"Created {plan.trial_count} trials for ExperimentSession {instance.id}")
         
         except Exception as e:
             print(f"Error creating trials: {e}")
+
+
+@receiver(post_save, sender=RhythmSequence)
+@receiver(post_delete, sender=RhythmSequence)
+def invalidate_rhythm_sequence_cache(sender, instance, **kwargs):
+    bump_version(RHYTHM_SEQUENCE_CACHE)
+    bump_version(STUDY_PLAN_CACHE)
+
+
+@receiver(post_save, sender=Study)
+@receiver(post_delete, sender=Study)
+@receiver(m2m_changed, sender=Study.rhythm_sequences.through)
+def invalidate_study_plans(sender, instance, **kwargs):
+    bump_version(STUDY_PLAN_CACHE)
+
+
+@receiver(post_save, sender=ExperimentSession)
+@receiver(post_delete, sender=ExperimentSession)
+def invalidate_participant_session_cache(sender, instance, **kwargs):
+    invalidate(PARTICIPANT_SESSION_CACHE, instance.participant_id)
@@ -0,0 +1,145 @@
+# experiment/stimuli.py
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+STIMULUS_VERSION = 1  # Bump when the synthesis changes so cached URLs stop matching
+STIMULUS_DIR = 'rhythm_audios'
+STIMULUS_MAX_AGE = 60 * 60 * 24 * 365
+RANGE_CHUNK_SIZE = 64 * 1024
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def stimulus_fingerprint(sequence_data):
+    """Content key for a rendered stimulus: a hash of everything the audio is synthesized from."""
+    payload = json.dumps({'sequence': sequence_data, 'version': STIMULUS_VERSION}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+def stimulus_filename(fingerprint):
+    return f"stimulus_{fingerprint}.wav"
+
+
+def local_stimulus_path(fingerprint):
+    return os.path.join(settings.MEDIA_ROOT, STIMULUS_DIR, stimulus_filename(fingerprint))
+
+
+@contextmanager
+def atomic_path(path):
+    """
+    Yield a temporary path in the same directory that is renamed over `path`
+    once the block finishes, so readers never see a partly written file.
+    """
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.', suffix=os.path.splitext(path)[1])
+    os.close(fd)
+    try:
+        yield temp_path
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def write_compressed_variant(path):
+    """Write a gzip copy next to the WAV so it can be served pre-compressed."""
+    with atomic_path(f"{path}.gz") as temp_path:
+        with open(path, 'rb') as src, gzip.open(temp_path, 'wb', compresslevel=9) as dst:
+            shutil.copyfileobj(src, dst)
+    return f"{path}.gz"
+
+
+def parse_byte_range(header, size):
+    """
+    Parse a single `Range: bytes=...` header into an inclusive (start, end) pair.
+
+    Returns None when the header should be ignored (malformed or multi-range) and
+    raises ValueError when the range cannot be satisfied for a file of `size` bytes.
+    """
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the final `last` bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError("Range not satisfiable")
+    return start, min(end, size - 1)
+
+
+def _iter_file_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(RANGE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def serve_stimulus(request, path, fingerprint):
+    """
+    Serve a stimulus WAV as an immutable, content-addressed resource with
+    byte-range support and an optional pre-compressed gzip variant. The gzip
+    representation has its own ETag; byte ranges always refer to the WAV.
+    """
+    range_header = request.headers.get('Range')
+    compressed_path = f"{path}.gz"
+    use_gzip = (
+        not range_header
+        and 'gzip' in request.headers.get('Accept-Encoding', '')
+        and os.path.exists(compressed_path)
+    )
+    etag = f'"{fingerprint}-gzip"' if use_gzip else f'"{fingerprint}"'
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+    else:
+        size = os.path.getsize(path)
+        byte_range = None
+        if range_header:
+            try:
+                byte_range = parse_byte_range(range_header, size)
+            except ValueError:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{size}'
+                return response
+
+        if byte_range:
+            start, end = byte_range
+            length = end - start + 1
+            response = StreamingHttpResponse(
+                _iter_file_range(path, start, length), status=206, content_type='audio/wav'
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = str(length)
+        elif use_gzip:
+            response = FileResponse(open(compressed_path, 'rb'), content_type='audio/wav')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = FileResponse(open(path, 'rb'), content_type='audio/wav')
+        response['Accept-Ranges'] = 'bytes'
+
+    response['ETag'] = etag
+    patch_vary_headers(response, ['Accept-Encoding'])
+    patch_cache_control(response, public=True, max_age=STIMULUS_MAX_AGE, immutable=True)
+    return response
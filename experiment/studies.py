@@ -0,0 +1,54 @@
+# experiment/studies.py
+"""
+Compile Study rows into StudyPlans and serve them from the cache.
+
+A plan is compiled once per study and kept in the shared cache, so every
+worker reuses the same compiled plan. Any change to a study or rhythm
+sequence bumps the cache namespace (see signals.py), so workers pick up
+edits on their next lookup.
+"""
+from .cache import STUDY_PLAN_CACHE, get_or_load
+from .models import RhythmSequence, Study
+from .plan import build_plan
+
+
+def compile_plan(study=None):
+    """
+    StudyPlan for `study`. Without a study (sessions created before studies
+    existed) the defaults apply, with every rhythm sequence grouped by type.
+    """
+    sequences = RhythmSequence.objects.order_by('id')
+    if study is not None and study.rhythm_sequences.exists():
+        sequences = study.rhythm_sequences.order_by('id')
+    rhythm_sets = {}
+    for sequence in sequences:
+        rhythm_sets.setdefault(sequence.rhythm_type, []).append(
+            {'id': sequence.id, 'name': sequence.name, 'intervals': sequence.sequence_data}
+        )
+    if study is None:
+        return build_plan(rhythm_sets)
+    return build_plan(
+        rhythm_sets,
+        analysis_config=study.analysis_config,
+        study_id=study.id,
+        name=study.name,
+        trial_count=study.trial_count,
+        break_after=study.break_after,
+        break_seconds=study.break_seconds,
+        stimulus_break_seconds=study.stimulus_break_seconds,
+    )
+
+
+def get_plan(study_id=None):
+    """The compiled plan of a study, or the default plan for `None` or an unknown id."""
+    return get_or_load(
+        STUDY_PLAN_CACHE, (study_id or 'default',),
+        lambda: compile_plan(Study.objects.filter(id=study_id).first() if study_id else None),
+    )
+
+
+def active_study(slug):
+    """The active study with this slug, or None."""
+    if not slug:
+        return None
+    return Study.objects.filter(slug=slug, is_active=True).first()
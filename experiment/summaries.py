@@ -0,0 +1,110 @@
+# experiment/summaries.py
+import logging
+import math
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import SessionSummary, StimulusSummary, TrialMetric
+from .studies import get_plan
+
+logger = logging.getLogger(__name__)
+
+def ear_for_stimulus(experiment_session, stimulus_number):
+    """Return the ear a stimulus is played in, following the session's ear order."""
+    first_ear = 'left' if experiment_session.ear_order == 'left_first' else 'right'
+    if stimulus_number == 1:
+        return first_ear
+    return 'right' if first_ear == 'left' else 'left'
+
+
+def _finite(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+
+def trial_contribution(metric):
+    """The amounts one TrialMetric row adds to the running totals of its summaries."""
+    contribution = {
+        'trial_count': 1,
+        'failed_count': 1 if metric.failed else 0,
+        'asynchrony_count': 0,
+        'asynchrony_sum': 0.0,
+        'asynchrony_sumsq': 0.0,
+        'percent_aligned_count': 0,
+        'percent_aligned_sum': 0.0,
+    }
+    if metric.mean_asynchrony is not None:
+        contribution['asynchrony_count'] = 1
+        contribution['asynchrony_sum'] = metric.mean_asynchrony
+        contribution['asynchrony_sumsq'] = metric.mean_asynchrony * metric.mean_asynchrony
+    if metric.percent_aligned is not None:
+        contribution['percent_aligned_count'] = 1
+        contribution['percent_aligned_sum'] = metric.percent_aligned
+    return contribution
+
+
+def summary_increments(metric, previous=None):
+    """
+    Build the F() increments that fold one trial's metrics into the running
+    totals. When the trial was already counted as `previous`, only the
+    difference from its old values is applied.
+    """
+    new = trial_contribution(metric)
+    old = trial_contribution(previous) if previous is not None else {}
+    return {
+        field: F(field) + (value - old.get(field, 0))
+        for field, value in new.items()
+        if value != old.get(field, 0)
+    }
+
+
+def record_trial_summary(experiment_session, stimulus_number, trial_number, analysis_result, is_failed):
+    """
+    Store one analysed trial's metrics row and fold it into the session and
+    per-stimulus summary rows.
+
+    The update is a single UPDATE per row using F() expressions, so concurrent
+    trials for the same session never lose increments and nothing is recomputed.
+    A resubmitted trial replaces its metrics row, and the summaries take only
+    the difference from what it contributed before.
+    """
+    values = {
+        'block': get_plan(experiment_session.study_id).block_for_trial(trial_number),
+        'failed': bool(is_failed.get('failed', False)),
+        'mean_asynchrony': _finite(analysis_result.get('mean_async_all')),
+        'sd_asynchrony': _finite(analysis_result.get('sd_async_all')),
+        'percent_aligned': _finite(analysis_result.get('percent_resp_aligned_all')),
+        'latency_ms': _finite(analysis_result.get('latency_ms')),
+        'clock_drift_ppm': _finite(analysis_result.get('clock_drift_ppm')),
+    }
+    with transaction.atomic():
+        SessionSummary.objects.get_or_create(session=experiment_session)
+        # Locking the session summary serialises submissions of the same trial
+        SessionSummary.objects.select_for_update().filter(session=experiment_session).first()
+        previous = TrialMetric.objects.filter(
+            session=experiment_session, stimulus_number=stimulus_number, trial_number=trial_number
+        ).first()
+        metric, _created = TrialMetric.objects.update_or_create(
+            session=experiment_session,
+            stimulus_number=stimulus_number,
+            trial_number=trial_number,
+            defaults=values,
+        )
+        increments = summary_increments(metric, previous)
+        if not increments:
+            return
+        SessionSummary.objects.filter(session=experiment_session).update(**increments)
+
+        StimulusSummary.objects.get_or_create(
+            session=experiment_session,
+            stimulus_number=stimulus_number,
+            defaults={'ear': ear_for_stimulus(experiment_session, stimulus_number)},
+        )
+        StimulusSummary.objects.filter(
+            session=experiment_session, stimulus_number=stimulus_number
+        ).update(**increments)
+    logger.debug(f"Updated summaries for session {experiment_session.id}, stimulus {stimulus_number}")
@@ -0,0 +1,157 @@
+# experiment/sweep.py
+"""
+Parameter sweeps of REPP analysis configs over a set of recordings.
+
+Work is split into one task per recording (and batch of configs) and fanned
+out over a process pool. Within a task the recording is hashed, memory-mapped
+and pre-screened once and shared by every config in the batch; recordings the
+pre-screen rejects are failed for all configs without running REPP. Results go
+through the analysis cache, so an interrupted sweep resumes where it stopped
+and configs repeated across sweeps are not recomputed.
+
+Django is not needed here, so sweeps can also run next to New_experiment.py.
+"""
+import copy
+import itertools
+import os
+import shutil
+import tempfile
+import types
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from .analysis_cache import AnalysisCache, DEFAULT_CACHE_PATH, cache_key, config_hash, file_hash, stimulus_hash
+from .prescreen import prescreen_recording
+from .wavmap import open_wav
+
+CONFIGS_PER_TASK = 25
+METRIC_KEYS = ('mean_async_all', 'sd_async_all', 'percent_resp_aligned_all', 'ratio_resp_to_stim')
+
+
+def expand_grid(grid):
+    """Turn {'PARAM': [v1, v2], ...} into the list of every combination of overrides."""
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def configure(base, overrides):
+    """A copy of `base` (a config object or dict) with `overrides` applied; `base` is left untouched."""
+    if isinstance(base, dict):
+        settings = dict(base)
+    elif isinstance(base, (type, types.ModuleType)):
+        settings = {name: getattr(base, name) for name in dir(base) if name.isupper()}
+    else:
+        config = copy.deepcopy(base)
+        for name, value in overrides.items():
+            if not hasattr(config, name):
+                raise ValueError(f"Unknown config parameter {name}")
+            setattr(config, name, value)
+        return config
+    unknown = set(overrides) - set(settings)
+    if unknown:
+        raise ValueError(f"Unknown config parameter {', '.join(sorted(unknown))}")
+    settings.update(overrides)
+    return types.SimpleNamespace(**settings)
+
+
+def repp_analysis(config, stim_info, recording_path, plot_path):
+    """Default analyzer: REPP's full analysis of one recording."""
+    from repp.analysis import REPPAnalysis
+    return REPPAnalysis(config=config).do_analysis(stim_info, recording_path, os.path.basename(recording_path), plot_path)
+
+
+def _default_config():
+    from repp.config import sms_tapping
+    return sms_tapping
+
+
+def _sweep_task(recording, configs, base_config, cache_path, analyzer):
+    """Analyse one recording under a batch of configs; returns one metrics row per config."""
+    base_config = _default_config() if base_config is None else base_config
+    analyzer = analyzer or repp_analysis
+    cache = AnalysisCache(cache_path) if cache_path else None
+    path = recording['path']
+
+    # Config-independent stages, done once for the whole batch
+    audio_hash = file_hash(path)
+    stim_hash = stimulus_hash(recording['stim_info'])
+    with open_wav(path) as wav:
+        screen = prescreen_recording(wav.data, wav.fs)
+
+    rows = []
+    plot_dir = tempfile.mkdtemp(prefix='sweep_')
+    try:
+        for config_id, overrides in configs:
+            row = {'config_id': config_id, 'recording_id': recording['id'], 'failed': True, 'reason': screen['reason'], 'cached': False}
+            row.update({key: np.nan for key in METRIC_KEYS})
+            if not screen['failed']:
+                config = configure(base_config, overrides)
+                key = cache_key(audio_hash, stim_hash, config_hash(config))
+                result = cache.get(key) if cache is not None else None
+                row['cached'] = result is not None
+                if result is None:
+                    try:
+                        result = analyzer(config, recording['stim_info'], path, os.path.join(plot_dir, 'plot.png'))
+                    except Exception as e:
+                        row['reason'] = f"Analysis error: {e}"
+                    else:
+                        if cache is not None:
+                            cache.put(key, *result)
+                if result is not None:
+                    _output, analysis_result, is_failed = result
+                    row['failed'] = bool(is_failed.get('failed', False))
+                    row['reason'] = is_failed.get('reason', 'N/A')
+                    row.update({key: analysis_result.get(key, np.nan) for key in METRIC_KEYS})
+            rows.append(row)
+    finally:
+        shutil.rmtree(plot_dir, ignore_errors=True)
+    return rows
+
+
+def run_sweep(recordings, grid, base_config=None, workers=None, cache_path=DEFAULT_CACHE_PATH,
+              analyzer=None, configs_per_task=CONFIGS_PER_TASK, progress=None):
+    """
+    Analyse every recording under every config in `grid`.
+
+    `recordings` is a list of {'id', 'path', 'stim_info'} dicts. `base_config`
+    defaults to REPP's `sms_tapping`; pass a dict for a picklable stand-in.
+    `workers=0` runs in-process. Returns (summary, trials) DataFrames: one row
+    per config and one row per (config, recording).
+    """
+    overrides = expand_grid(grid)
+    configs = list(enumerate(overrides))
+    batches = [configs[i:i + configs_per_task] for i in range(0, len(configs), configs_per_task)]
+    tasks = [(recording, batch, base_config, cache_path, analyzer) for recording in recordings for batch in batches]
+
+    rows = []
+    if workers == 0:
+        for done, task in enumerate(tasks, start=1):
+            rows.extend(_sweep_task(*task))
+            if progress:
+                progress(done, len(tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            futures = [pool.submit(_sweep_task, *task) for task in tasks]
+            for done, future in enumerate(as_completed(futures), start=1):
+                rows.extend(future.result())
+                if progress:
+                    progress(done, len(tasks))
+
+    trials = pd.DataFrame(rows, columns=['config_id', 'recording_id', 'failed', 'reason', 'cached', *METRIC_KEYS])
+    return summarize(trials, overrides), trials
+
+
+def summarize(trials, overrides):
+    """Per-config table of failure rate and mean alignment metrics over non-failed trials."""
+    passed = trials[~trials['failed'].astype(bool)]
+    summary = pd.DataFrame(overrides)
+    summary.insert(0, 'config_id', range(len(overrides)))
+    summary = summary.set_index('config_id')
+    summary['trials'] = trials.groupby('config_id').size()
+    summary['failure_rate'] = trials['failed'].astype(float).groupby(trials['config_id']).mean()
+    for key in METRIC_KEYS:
+        summary[key] = passed.groupby('config_id')[key].mean()
+    summary['trials'] = summary['trials'].fillna(0).astype(int)
+    return summary.reset_index().sort_values(['failure_rate', 'percent_resp_aligned_all'], ascending=[True, False])
@@ -0,0 +1,139 @@
+# experiment/synth.py
+"""
+Stimulus synthesis from pre-rendered templates.
+
+Tones and marker blocks are rendered once per sample rate and copied into a
+preallocated output buffer at onset sample positions, instead of being
+re-synthesized and concatenated on every call. For the marker block, the ear
+check tone and stereo ear routing, the output is bit-identical to the
+linspace/sin/concatenate code it replaces.
+
+Only NumPy is used here so the standalone experiment script can import it.
+"""
+from functools import lru_cache
+
+import numpy as np
+
+from .prescreen import MARKER_COUNT, MARKER_DURATION, MARKER_FREQUENCY, MARKER_GAP
+
+EAR_CHANNELS = {'left': (0,), 'right': (1,), 'both': (0, 1)}
+EAR_CHECK_DURATION = 1.5
+EAR_CHECK_SILENCE = 0.75
+
+
+def _frozen(array):
+    array.setflags(write=False)
+    return array
+
+
+@lru_cache(maxsize=None)
+def tone(fs, frequency=MARKER_FREQUENCY, duration=MARKER_DURATION):
+    """A sine tone, rendered once per (fs, frequency, duration) and shared read-only."""
+    return _frozen(np.sin(2 * np.pi * frequency * np.linspace(0, duration, int(fs * duration))))
+
+
+@lru_cache(maxsize=None)
+def marker_offsets(fs):
+    """Sample offsets of each marker tone within a marker block."""
+    step = int(fs * MARKER_DURATION) + int(fs * MARKER_GAP)
+    return _frozen(np.arange(MARKER_COUNT) * step)
+
+
+@lru_cache(maxsize=None)
+def marker_block(fs):
+    """The three-marker block placed at the start and end of every stimulus."""
+    marker = tone(fs)
+    length = int(marker_offsets(fs)[-1]) + len(marker)
+    return _frozen(place(np.zeros(length), marker, marker_offsets(fs)))
+
+
+def place(buffer, template, positions):
+    """
+    Add `template` into `buffer` (along its first axis) at each sample position.
+
+    Non-overlapping placements are done with one fancy-indexed add; overlapping
+    ones fall back to np.add.at so every copy is summed. Templates running past
+    the end of the buffer are truncated.
+    """
+    positions = np.asarray(positions, dtype=np.int64)
+    if positions.size == 0:
+        return buffer
+    m = len(template)
+    index = positions[:, None] + np.arange(m)
+    valid = index < len(buffer)
+    values = np.broadcast_to(template, index.shape)
+    if valid.all() and (m <= 1 or np.all(np.diff(np.sort(positions)) >= m)):
+        buffer[index] += values
+    else:
+        np.add.at(buffer, index[valid], values[valid])
+    return buffer
+
+
+def route_to_ear(audio, ear, out=None):
+    """Stereo (n, 2) copy of mono `audio` playing in the given ear ('left', 'right' or 'both')."""
+    if out is None:
+        out = np.zeros((len(audio), 2), dtype=np.result_type(audio, np.float64))
+    for channel in EAR_CHANNELS[ear]:
+        out[:, channel] = audio
+    return out
+
+
+def with_markers(body, fs):
+    """`body` with the marker block before and after it, written into one preallocated buffer."""
+    block = marker_block(fs)
+    out = np.empty(len(block) * 2 + len(body), dtype=np.result_type(body, block))
+    out[:len(block)] = block
+    out[len(block):len(block) + len(body)] = body
+    out[len(block) + len(body):] = block
+    return out
+
+
+@lru_cache(maxsize=None)
+def ear_check_audio(fs, ear):
+    """The 440 Hz ear check tone padded with silence, routed to one ear; rendered once per (fs, ear)."""
+    silence = int(EAR_CHECK_SILENCE * fs)
+    test_tone = tone(fs, MARKER_FREQUENCY, EAR_CHECK_DURATION)
+    mono = np.zeros(silence * 2 + len(test_tone))
+    mono[silence:silence + len(test_tone)] = test_tone
+    return _frozen(route_to_ear(mono, ear))
+
+
+def onset_samples(iois_ms, fs, tempo=1.0):
+    """Onset sample positions of an IOI sequence (ms) played at `tempo` times the nominal speed."""
+    onsets_ms = np.cumsum(np.asarray(iois_ms, dtype=np.float64)) / tempo
+    return np.round(onsets_ms * fs / 1000).astype(np.int64)
+
+
+def render_sequences(sequences, fs, template, tempos=(1.0,), ears=(None,), markers=False):
+    """
+    Render every combination of IOI sequence, tempo and ear in one batched call.
+
+    Returns (audio, lengths, variants): `audio` is a zero-padded array of shape
+    (n_variants, max_length) for mono variants or (n_variants, max_length, 2)
+    when any ear is given; `lengths` holds each variant's length in samples and
+    `variants` its (sequence_index, tempo, ear).
+    """
+    variants = [(i, tempo, ear) for i in range(len(sequences)) for tempo in tempos for ear in ears]
+    onsets = [onset_samples(sequences[i], fs, tempo) for i, tempo, _ear in variants]
+    lead = len(marker_block(fs)) if markers else 0
+    body_lengths = np.array([int(o.max(initial=0)) + len(template) for o in onsets], dtype=np.int64)
+    lengths = body_lengths + 2 * lead
+    stereo = any(ear is not None for ear in ears)
+
+    mono = np.zeros((len(variants), int(lengths.max(initial=0))), dtype=np.result_type(template, np.float64))
+    rows = np.repeat(np.arange(len(variants)), [len(o) for o in onsets])
+    positions = np.concatenate(onsets) if onsets else np.zeros(0, dtype=np.int64)
+    # Flatten (variant, sample) so every onset of every variant is placed in one call
+    place(mono.reshape(-1), template, rows * mono.shape[1] + lead + positions)
+    if markers:
+        block = marker_block(fs)
+        for row, length in enumerate(lengths):
+            mono[row, :lead] = block
+            mono[row, length - lead:length] = block
+
+    if not stereo:
+        return mono, lengths, variants
+    audio = np.zeros(mono.shape + (2,), dtype=mono.dtype)
+    for row, (_i, _tempo, ear) in enumerate(variants):
+        route_to_ear(mono[row], ear or 'both', out=audio[row])
+    return audio, lengths, variants
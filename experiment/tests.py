@@ -1,7 +1,57 @@
-from django.test import TestCase
+import importlib
+import io
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from unittest import mock, skipUnless
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+import pyarrow.parquet as pq
+from botocore.exceptions import ClientError
+from scipy.io import wavfile as scipy_wavfile
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib import admin as django_admin
+from django.apps import apps as django_apps
+from django.db import IntegrityError, connection, transaction
 from django.urls import reverse
+from django.utils import timezone, translation
 from django.contrib.auth.models import User
-from .models import Participant, ExperimentSession, Trial
+from .models import Participant, ExperimentSession, Trial, TrialSubmission, SessionSummary, StimulusSummary, TrialMetric, RhythmSequence, Artifact, TapRecord, Analysis, Study
+from .summaries import record_trial_summary
+from .cohort import condition_table
+from .stimuli import atomic_path, local_stimulus_path, stimulus_fingerprint, write_compressed_variant
+from .prescreen import marker_template, prescreen_recording
+from .alignment import MarkerAligner, align_recording, resampled_length
+from .wavmap import open_wav
+from .analysis_cache import AnalysisCache, cache_key, config_hash, file_hash, stimulus_hash
+from .aws import upload_to_s3
+from .artifacts import artifact_key, cohort_artifacts, iter_storage_keys, parse_artifact_key
+from .archive import archivable_sessions, archive_completed
+from .partitions import ensure_partitions, is_partitioned, next_month, partition_name
+from .lifecycle import evict_local, local_copy, register_artifact, register_existing, run_lifecycle
+from .sweep import run_sweep
+from .management.commands.sweep_analysis import Command as SweepCommand
+from .synth import ear_check_audio, onset_samples, render_sequences, tone, with_markers
+from .schedule import CELLS, cell_for_position
+from .allocation import allocate_session, cell_counts
+from .log import ContextFilter, QueueLogHandler, SamplingFilter, bind_context, reset_context
+from .routers import PrimaryReplicaRouter, analytics_db
+from .admin import EstimatedCountPaginator
+from .plan import plan_from_dict
+from .scoring import match_window, score_taps, stimulus_onsets, verify_tap_summary
+from . import warmup
+from .studies import get_plan
+from .cache import bump_version, get_or_load, get_participant_session, get_rhythm_sequence, get_rhythm_sequences, versioned_key
 
 class ExperimentViewsTest(TestCase):
     def setUp(self):
@@ -49,3 +99,1106 @@ class ExperimentViewsTest(TestCase):
         response = self.client.get(reverse('complete'))
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'experiment/complete.html')
+
+
+class TrialSubmissionIdempotencyTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.participant = Participant.objects.create(age=25, agreed_to_terms=True)
+        self.session = ExperimentSession.objects.create(participant=self.participant)
+        session = self.client.session
+        session['participant_id'] = self.participant.id
+        session.save()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+
+    def post(self, idempotency_key):
+        with self.settings(MEDIA_ROOT=self.media_root), mock.patch('experiment.views.upload_to_s3', return_value=None):
+            return self.client.post(reverse('trial', args=[1]), HTTP_IDEMPOTENCY_KEY=idempotency_key)
+
+    def test_repeated_key_returns_stored_result(self):
+        TrialSubmission.objects.create(
+            session=self.session,
+            trial_number=1,
+            idempotency_key='abc123',
+            response={'success': True, 'replayed': True},
+        )
+        response = self.post('abc123')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'success': True, 'replayed': True})
+        self.assertEqual(TrialSubmission.objects.count(), 1)
+
+    def test_key_of_another_session_is_not_replayed(self):
+        other = ExperimentSession.objects.create(participant=Participant.objects.create(age=30, agreed_to_terms=True))
+        TrialSubmission.objects.create(session=other, trial_number=1, idempotency_key='abc123', response={'replayed': True})
+        response = self.post('abc123')
+        self.assertNotEqual(response.json(), {'replayed': True})
+        self.assertTrue(TrialSubmission.objects.filter(session=self.session, idempotency_key='abc123').exists())
+
+    def test_overlong_key_is_rejected_before_processing(self):
+        response = self.post('k' * 65)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(TrialMetric.objects.filter(session=self.session).exists())
+
+
+class SessionSummaryTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        participant = Participant.objects.create(age=25, agreed_to_terms=True)
+        self.session = ExperimentSession.objects.create(participant=participant, ear_order='right_first')
+
+    def test_summary_updates_incrementally(self):
+        record_trial_summary(self.session, 1, 1, {'mean_async_all': 10.0, 'percent_resp_aligned_all': 90.0}, {})
+        record_trial_summary(self.session, 1, 2, {'mean_async_all': 20.0, 'percent_resp_aligned_all': 80.0}, {})
+        record_trial_summary(self.session, 2, 1, {'mean_async_all': float('nan')}, {'failed': True})
+
+        summary = SessionSummary.objects.get(session=self.session)
+        self.assertEqual(summary.trial_count, 3)
+        self.assertEqual(summary.failed_count, 1)
+        self.assertAlmostEqual(summary.mean_asynchrony, 15.0)
+        self.assertAlmostEqual(summary.sd_asynchrony, 50 ** 0.5)
+        self.assertAlmostEqual(summary.percent_aligned, 85.0)
+
+        first, second = StimulusSummary.objects.filter(session=self.session).order_by('stimulus_number')
+        self.assertEqual((first.ear, first.trial_count), ('right', 2))
+        self.assertEqual((second.ear, second.failed_count), ('left', 1))
+        self.assertIsNone(second.mean_asynchrony)
+
+    def test_resubmitted_trial_replaces_its_contribution(self):
+        record_trial_summary(self.session, 1, 1, {'mean_async_all': 10.0, 'percent_resp_aligned_all': 90.0}, {'failed': True})
+        record_trial_summary(self.session, 1, 1, {'mean_async_all': 30.0, 'percent_resp_aligned_all': 70.0}, {})
+
+        self.assertEqual(TrialMetric.objects.filter(session=self.session).count(), 1)
+        summary = SessionSummary.objects.get(session=self.session)
+        self.assertEqual((summary.trial_count, summary.failed_count), (1, 0))
+        self.assertAlmostEqual(summary.mean_asynchrony, 30.0)
+        self.assertAlmostEqual(summary.percent_aligned, 70.0)
+        stimulus = StimulusSummary.objects.get(session=self.session, stimulus_number=1)
+        self.assertEqual(stimulus.asynchrony_count, 1)
+        self.assertAlmostEqual(stimulus.asynchrony_sum, 30.0)
+
+
+class CohortConditionTableTest(TestCase):
+    def test_condition_table_groups_by_condition_and_block(self):
+        for age, music in [(20, True), (21, True), (22, False)]:
+            participant = Participant.objects.create(age=age, agreed_to_terms=True, has_music_background=music)
+            session = ExperimentSession.objects.create(participant=participant, complexity_level='complex')
+            for trial_number, asynchrony in [(1, 10.0), (7, 30.0)]:
+                record_trial_summary(session, 1, trial_number, {'mean_async_all': asynchrony}, {})
+
+        table = condition_table()
+        self.assertEqual(len(table), 4)
+        musicians_block_2 = table[(table['has_music_background']) & (table['block'] == 2)].iloc[0]
+        self.assertEqual(musicians_block_2['participants'], 2)
+        self.assertAlmostEqual(musicians_block_2['mean_asynchrony'], 30.0)
+        self.assertAlmostEqual(musicians_block_2['sd_asynchrony'], 0.0)
+
+
+class RhythmSequenceCacheTest(TestCase):
+    def setUp(self):
+        self.sequence = RhythmSequence.objects.create(name='simple-1', sequence_data=[0, 520, 260])
+        self.url = '/api/rhythm-sequences/'
+
+    def test_detail_includes_onsets_and_revalidates(self):
+        response = self.client.get(f'{self.url}{self.sequence.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['onsets'], [0, 520, 780])
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(f'{self.url}{self.sequence.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_save_invalidates_cached_list(self):
+        etag = self.client.get(self.url)['ETag']
+        self.sequence.sequence_data = [0, 130, 260]
+        self.sequence.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_delete_is_not_revalidated_by_last_modified(self):
+        RhythmSequence.objects.create(name='simple-2', sequence_data=[0, 260])
+        last_modified = self.client.get(self.url)['Last-Modified']
+        RhythmSequence.objects.filter(name='simple-2').delete()
+        later = timezone.now() + timedelta(seconds=5)
+        with mock.patch('experiment.views.timezone.now', return_value=later):
+            response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 1)
+
+
+class StimulusAudioTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.fingerprint = stimulus_fingerprint([0, 520, 260])
+        with self.settings(MEDIA_ROOT=self.media_root):
+            path = local_stimulus_path(self.fingerprint)
+        os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as f:
+            f.write(bytes(range(256)) * 4)
+        self.url = reverse('stimulus_audio', args=[self.fingerprint])
+
+    def test_range_request_returns_partial_content(self):
+        with self.settings(MEDIA_ROOT=self.media_root):
+            response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/1024')
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(10, 20)))
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_unsatisfiable_range(self):
+        with self.settings(MEDIA_ROOT=self.media_root):
+            response = self.client.get(self.url, HTTP_RANGE='bytes=5000-')
+        self.assertEqual(response.status_code, 416)
+
+    def test_gzip_variant_has_its_own_etag(self):
+        with self.settings(MEDIA_ROOT=self.media_root):
+            write_compressed_variant(local_stimulus_path(self.fingerprint))
+            identity = self.client.get(self.url)
+            compressed = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+            revalidated = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=identity['ETag'])
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertNotEqual(compressed['ETag'], identity['ETag'])
+        self.assertEqual(revalidated.status_code, 200)
+
+    def test_failed_write_leaves_no_file(self):
+        path = os.path.join(self.media_root, 'partial.wav')
+        with self.assertRaises(RuntimeError):
+            with atomic_path(path) as temp_path:
+                with open(temp_path, 'wb') as f:
+                    f.write(b'RIFF')
+                raise RuntimeError("synthesis failed")
+        self.assertEqual(os.listdir(self.media_root), ['rhythm_audios'])
+
+
+class RecordingPrescreenTest(TestCase):
+    fs = 44100
+
+    def make_recording(self, with_markers=True):
+        rng = np.random.default_rng(0)
+        marker = marker_template(self.fs)
+        gap = np.zeros(int(0.2 * self.fs))
+        markers = np.concatenate([marker, gap, marker, gap, marker]) if with_markers else np.zeros(int(1.15 * self.fs))
+        body = np.zeros(10 * self.fs)
+        recording = np.concatenate([np.zeros(int(0.3 * self.fs)), markers, body, markers]) * 0.5
+        return recording + rng.normal(0, 0.05, recording.size)
+
+    def test_good_recording_passes(self):
+        result = prescreen_recording(self.make_recording(), self.fs)
+        self.assertFalse(result['failed'])
+        self.assertEqual(result['reason'], 'N/A')
+
+    def test_bad_recordings_are_rejected(self):
+        self.assertEqual(prescreen_recording(np.zeros(self.fs), self.fs)['reason'], 'Recording is silent')
+        clipped = np.clip(self.make_recording() * 20, -1, 1)
+        self.assertEqual(prescreen_recording(clipped, self.fs)['reason'], 'Recording is clipped')
+        shifted = self.make_recording() + 0.2
+        self.assertEqual(prescreen_recording(shifted, self.fs)['reason'], 'Recording has a large DC offset')
+
+    def test_web_upload_without_markers_is_not_rejected(self):
+        # Echo cancellation and headphones keep the markers out of browser recordings
+        cache.clear()
+        participant = Participant.objects.create(age=25, agreed_to_terms=True)
+        ExperimentSession.objects.create(participant=participant)
+        session = self.client.session
+        session['participant_id'] = participant.id
+        session.save()
+        buffer = io.BytesIO()
+        scipy_wavfile.write(buffer, self.fs, (self.make_recording(with_markers=False) * 16000).astype(np.int16))
+        upload = SimpleUploadedFile('recording.wav', buffer.getvalue(), content_type='audio/wav')
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        with self.settings(MEDIA_ROOT=media_root), mock.patch('experiment.views.upload_to_s3', return_value=None):
+            response = self.client.post(reverse('trial', args=[1]), {'background_audio': upload})
+        self.assertEqual(response.status_code, 200)
+
+
+class MarkerAlignmentTest(TestCase):
+    fs = 44100
+
+    def record(self, stimulus, delay=0.04, drift=300e-6):
+        # Play the stimulus `delay` late through a clock running `drift` fast
+        recording_times = np.arange(stimulus.size + self.fs) / self.fs
+        source = (recording_times - delay) / (1 + drift) * self.fs
+        recording = np.interp(source, np.arange(stimulus.size), stimulus, left=0, right=0) * 0.5
+        return recording + np.random.default_rng(0).normal(0, 0.05, recording.size)
+
+    def test_latency_and_drift_are_recovered(self):
+        marker = marker_template(self.fs)
+        gap = np.zeros(int(0.2 * self.fs))
+        markers = np.concatenate([marker, gap, marker, gap, marker])
+        stimulus = np.concatenate([markers, np.zeros(20 * self.fs), markers])
+
+        result = align_recording(self.record(stimulus), self.fs, stimulus.size)
+        self.assertTrue(result['aligned'])
+        self.assertAlmostEqual(result['latency_ms'], 40, delta=0.5)
+        self.assertAlmostEqual(result['clock_drift_ppm'], 300, delta=30)
+
+    def test_missed_first_marker_does_not_shift_pairing(self):
+        marker = marker_template(self.fs)
+        gap = np.zeros(int(0.2 * self.fs))
+        markers = np.concatenate([marker, gap, marker, gap, marker])
+        stimulus = np.concatenate([markers, np.zeros(20 * self.fs), markers])
+        recording = self.record(stimulus)
+        # The first start marker never reaches the microphone
+        recording[:int(0.04 * self.fs) + marker.size] = np.random.default_rng(1).normal(0, 0.05, int(0.04 * self.fs) + marker.size)
+
+        result = align_recording(recording, self.fs, stimulus.size)
+        self.assertEqual(len(result['start_markers_s']), 2)
+        self.assertAlmostEqual(result['latency_ms'], 40, delta=0.5)
+        self.assertAlmostEqual(result['clock_drift_ppm'], 300, delta=30)
+
+    def test_scheduled_start_is_excluded_from_latency(self):
+        marker = marker_template(self.fs)
+        gap = np.zeros(int(0.2 * self.fs))
+        markers = np.concatenate([marker, gap, marker, gap, marker])
+        stimulus = np.concatenate([markers, np.zeros(20 * self.fs), markers])
+        # Scheduled half a second after the recorder started, heard 40 ms later still
+        recording = self.record(np.concatenate([np.zeros(self.fs // 2), stimulus]), drift=0)
+
+        result = MarkerAligner(self.fs).align(recording, stimulus.size, start_offset=self.fs // 2)
+        self.assertAlmostEqual(result['latency_ms'], 40, delta=0.5)
+
+    def test_recording_at_another_sample_rate_is_aligned(self):
+        marker = marker_template(self.fs)
+        gap = np.zeros(int(0.2 * self.fs))
+        markers = np.concatenate([marker, gap, marker, gap, marker])
+        stimulus = np.concatenate([markers, np.zeros(20 * self.fs), markers])
+        # Recorded at 48 kHz, 40 ms late
+        recording_fs = 48000
+        source = (np.arange(int((stimulus.size / self.fs + 1) * recording_fs)) / recording_fs - 0.04) * self.fs
+        recording = np.interp(source, np.arange(stimulus.size), stimulus, left=0, right=0) * 0.5
+        recording += np.random.default_rng(0).normal(0, 0.05, recording.size)
+
+        result = align_recording(recording, recording_fs, resampled_length(stimulus.size, self.fs, recording_fs))
+        self.assertTrue(result['aligned'])
+        self.assertAlmostEqual(result['latency_ms'], 40, delta=0.5)
+        self.assertAlmostEqual(result['clock_drift_ppm'], 0, delta=30)
+
+    def test_missing_markers_are_reported(self):
+        result = align_recording(np.zeros(5 * self.fs), self.fs, 4 * self.fs)
+        self.assertFalse(result['aligned'])
+
+
+class MappedWavTest(TestCase):
+    fs = 8000
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+    def write(self, audio):
+        path = os.path.join(self.tmpdir, 'recording.wav')
+        scipy_wavfile.write(path, self.fs, audio)
+        return path
+
+    def test_views_match_file_contents(self):
+        audio = (np.arange(2 * self.fs * 3, dtype=np.int16) % 1000).reshape(-1, 2)
+        with open_wav(self.write(audio)) as wav:
+            self.assertEqual((wav.fs, wav.channels, len(wav)), (self.fs, 2, 3 * self.fs))
+            self.assertIsInstance(wav.data, np.memmap)
+            np.testing.assert_array_equal(wav.channel(1), audio[:, 1])
+            np.testing.assert_array_equal(wav.segment(100, 200, channel=0), audio[100:200, 0])
+            np.testing.assert_array_equal(wav.window(1.0, 0.5, 0.25), audio[self.fs // 2:self.fs + self.fs // 4])
+            self.assertTrue(np.shares_memory(wav.channel(0), wav.data))
+
+    def test_truncated_header_is_a_value_error(self):
+        path = self.write(np.zeros(100, dtype=np.int16))
+        with open(path, 'rb') as f:
+            header = f.read()
+        for length in (6, 30):
+            with open(path, 'wb') as f:
+                f.write(header[:length])
+            with self.assertRaises(ValueError):
+                open_wav(path)
+
+    def test_alignment_reads_mapped_recording(self):
+        marker = (marker_template(self.fs) * 16000).astype(np.int16)
+        gap = np.zeros(int(0.2 * self.fs), dtype=np.int16)
+        markers = np.concatenate([marker, gap, marker, gap, marker])
+        stimulus = np.concatenate([markers, np.zeros(5 * self.fs, dtype=np.int16), markers])
+        with open_wav(self.write(stimulus)) as wav:
+            result = align_recording(wav.data, wav.fs, len(wav))
+        self.assertTrue(result['aligned'])
+        self.assertAlmostEqual(result['latency_ms'], 0, delta=0.5)
+
+
+class AnalysisCacheTest(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+    def test_round_trip_and_key_inputs(self):
+        cache = AnalysisCache(os.path.join(self.tmpdir, 'cache.sqlite3'))
+        key = cache_key('audio', stimulus_hash([0, 520, 260]), config_hash({'FS': 44100}))
+        self.assertIsNone(cache.get(key))
+        cache.put(key, {'stim_ioi': np.array([520.0, 260.0])}, {'mean_async_all': -12.5}, {'failed': False})
+        output, analysis_result, is_failed = cache.get(key)
+        np.testing.assert_array_equal(output['stim_ioi'], [520.0, 260.0])
+        self.assertEqual((analysis_result, is_failed), ({'mean_async_all': -12.5}, {'failed': False}))
+        self.assertNotEqual(key, cache_key('audio', stimulus_hash([0, 520, 260]), config_hash({'FS': 48000})))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = AnalysisCache(os.path.join(self.tmpdir, 'cache.sqlite3'), max_bytes=3000)
+        rng = np.random.default_rng(0)
+        for name in ('a', 'b', 'c'):
+            cache.put(name, rng.random(120), {}, {})  # About 1 KB each once compressed
+            cache.get('a')
+        self.assertLessEqual(cache.total_bytes(), 3000)
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+
+
+def threshold_analyzer(config, stim_info, recording_path, plot_path):
+    """Stand-in for REPP in sweep tests: fails trials when the threshold is too high."""
+    failed = config.THRESHOLD > 0.5
+    return {}, {'mean_async_all': -10 * config.THRESHOLD, 'percent_resp_aligned_all': 90.0}, {'failed': failed, 'reason': 'N/A'}
+
+
+class ParameterSweepTest(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        rng = np.random.default_rng(0)
+        self.recordings = []
+        for i in range(2):
+            path = os.path.join(self.tmpdir, f'recording_{i}.wav')
+            scipy_wavfile.write(path, 8000, (rng.normal(0, 0.1, 8000) * 32767).astype(np.int16))
+            self.recordings.append({'id': i, 'path': path, 'stim_info': {'onsets': [0, 500]}})
+        silent = os.path.join(self.tmpdir, 'silent.wav')
+        scipy_wavfile.write(silent, 8000, np.zeros(8000, dtype=np.int16))
+        self.recordings.append({'id': 2, 'path': silent, 'stim_info': {'onsets': [0, 500]}})
+
+    def test_sweep_summarizes_each_config(self):
+        cache_path = os.path.join(self.tmpdir, 'cache.sqlite3')
+        grid = {'THRESHOLD': [0.2, 0.8]}
+        summary, trials = run_sweep(
+            self.recordings, grid, base_config={'THRESHOLD': 0.3, 'FS': 8000}, workers=0,
+            cache_path=cache_path, analyzer=threshold_analyzer,
+        )
+        self.assertEqual(len(trials), 6)
+        by_threshold = summary.set_index('THRESHOLD')
+        self.assertAlmostEqual(by_threshold.loc[0.2, 'failure_rate'], 1 / 3)  # Only the silent recording
+        self.assertEqual(by_threshold.loc[0.8, 'failure_rate'], 1.0)
+        self.assertAlmostEqual(by_threshold.loc[0.2, 'mean_async_all'], -2.0)
+
+        # A second run is served from the analysis cache, here through a process pool
+        _summary, trials = run_sweep(
+            self.recordings, grid, base_config={'THRESHOLD': 0.3, 'FS': 8000}, workers=2,
+            cache_path=cache_path, analyzer=threshold_analyzer,
+        )
+        self.assertEqual(trials['cached'].sum(), 4)
+
+
+class StimulusSynthesisTest(TestCase):
+    fs = 44100
+
+    def test_markers_and_ear_check_match_previous_synthesis(self):
+        body = np.random.default_rng(0).normal(0, 0.1, 5000)
+        marker = np.sin(2 * np.pi * 440 * np.linspace(0, 0.25, int(self.fs * 0.25)))
+        silence = np.zeros(int(0.2 * self.fs))
+        markers = np.concatenate([marker, silence, marker, silence, marker])
+        self.assertTrue(np.array_equal(with_markers(body, self.fs), np.concatenate([markers, body, markers])))
+
+        test_sound = np.sin(2 * np.pi * 440 * np.linspace(0, 1.5, int(self.fs * 1.5)))
+        padding = np.zeros(int(0.75 * self.fs))
+        full_audio = np.concatenate((padding, test_sound, padding))
+        left = np.vstack((full_audio, np.zeros_like(full_audio))).T
+        self.assertTrue(np.array_equal(ear_check_audio(self.fs, 'left'), left))
+        self.assertIs(ear_check_audio(self.fs, 'left'), ear_check_audio(self.fs, 'left'))
+
+    def test_batch_matches_one_at_a_time(self):
+        click = tone(self.fs, 1000, 0.01)
+        sequences = [[0, 520, 260, 260], [0, 130, 260, 390]]
+        audio, lengths, variants = render_sequences(sequences, self.fs, click, tempos=(1.0, 1.5), ears=('left', 'right'))
+        self.assertEqual(audio.shape[0], 8)
+        for row, (index, tempo, ear) in enumerate(variants):
+            expected = np.zeros(lengths[row])
+            for onset in onset_samples(sequences[index], self.fs, tempo):
+                expected[onset:onset + len(click)] += click
+            channel = 0 if ear == 'left' else 1
+            self.assertTrue(np.array_equal(audio[row, :lengths[row], channel], expected))
+            self.assertFalse(audio[row, :, 1 - channel].any())
+
+
+class CounterbalancedAllocationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_schedule_is_balanced_by_block_and_position(self):
+        n = len(CELLS)
+        cells = [tuple(cell_for_position(p).values()) for p in range(n * n)]
+        for block in range(n):
+            self.assertEqual(len(set(cells[block * n:(block + 1) * n])), n)
+        for offset in range(n):
+            self.assertEqual(len({cells[block * n + offset] for block in range(n)}), n)
+
+    def test_sessions_fill_cells_evenly(self):
+        participants = [Participant.objects.create(age=25, agreed_to_terms=True) for _ in range(2 * len(CELLS) + 3)]
+        sessions = [allocate_session(p) for p in participants]
+        self.assertEqual(allocate_session(participants[0]), sessions[0])
+
+        allocated = [row['allocated'] for row in cell_counts()]
+        self.assertEqual(sum(allocated), len(participants))
+        self.assertLessEqual(max(allocated) - min(allocated), 1)
+        first = sessions[0]
+        self.assertEqual(
+            (first.complexity_level, first.ear_order, first.sequence_order),
+            tuple(cell_for_position(0).values()),
+        )
+
+    def test_trials_use_the_allocated_level(self):
+        for level in ('simple', 'complex'):
+            RhythmSequence.objects.create(name=f'{level}-1', rhythm_type=level, sequence_data=[0, 520, 260])
+        sessions = [allocate_session(Participant.objects.create(age=25, agreed_to_terms=True)) for _ in CELLS]
+        self.assertEqual({session.complexity_level for session in sessions}, {'simple', 'complex'})
+        for session in sessions:
+            levels = set(Trial.objects.filter(session=session).values_list('rhythm_sequence__rhythm_type', flat=True))
+            self.assertEqual(levels, {session.complexity_level})
+
+
+class LoggingPipelineTest(TestCase):
+    def test_queued_records_are_written_as_json_with_context(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, 'app.log')
+        handler = QueueLogHandler(path, console=False)
+        handler.addFilter(ContextFilter())
+
+        token = bind_context(request_id='req-1', participant_id=42, trial_number=3)
+        try:
+            handler.handle(logging.makeLogRecord({'msg': "Trial %s uploaded", 'args': (3,), 'levelno': logging.WARNING}))
+        finally:
+            reset_context(token)
+        handler.close()
+
+        with open(path) as f:
+            entry = json.loads(f.readline())
+        self.assertEqual(entry['message'], 'Trial 3 uploaded')
+        self.assertEqual((entry['request_id'], entry['participant_id'], entry['trial_number']), ('req-1', 42, 3))
+
+    def test_sampling_only_thins_debug_records(self):
+        sampler = SamplingFilter(rate=0)
+        debug = logging.makeLogRecord({'levelno': logging.DEBUG})
+        warning = logging.makeLogRecord({'levelno': logging.WARNING})
+        self.assertFalse(sampler.filter(debug))
+        self.assertTrue(sampler.filter(warning))
+
+    def test_responses_carry_request_id(self):
+        response = self.client.get(reverse('welcome_home'), HTTP_X_REQUEST_ID='abc123')
+        self.assertEqual(response['X-Request-ID'], 'abc123')
+
+
+class DatabaseRoutingTest(TestCase):
+    def test_reads_fall_back_to_primary_without_replica(self):
+        self.assertEqual(analytics_db(), 'default')
+        with self.settings(DATABASES={'default': {}, 'replica': {}}):
+            self.assertEqual(analytics_db(), 'replica')
+
+    def test_writes_and_migrations_stay_on_primary(self):
+        router = PrimaryReplicaRouter()
+        self.assertEqual(router.db_for_write(Participant), 'default')
+        self.assertTrue(router.allow_migrate('default', 'experiment'))
+        self.assertFalse(router.allow_migrate('replica', 'experiment'))
+
+
+class SharedCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.sequence = RhythmSequence.objects.create(name='simple-1', rhythm_type='simple', sequence_data=[0, 520, 260])
+
+    def test_rhythm_sequence_lookups_are_cached_until_changed(self):
+        self.assertEqual(get_rhythm_sequence(self.sequence.id), self.sequence)
+        get_rhythm_sequences('simple')
+        with self.assertNumQueries(0):
+            self.assertEqual(get_rhythm_sequence(self.sequence.id).name, 'simple-1')
+            self.assertEqual(get_rhythm_sequences('simple'), [self.sequence])
+
+        self.sequence.name = 'simple-renamed'
+        self.sequence.save()
+        self.assertEqual(get_rhythm_sequence(self.sequence.id).name, 'simple-renamed')
+
+    def test_participant_session_is_invalidated_on_save(self):
+        participant = Participant.objects.create(age=25, agreed_to_terms=True)
+        self.assertIsNone(get_participant_session(participant.id))
+        session = allocate_session(participant)
+        self.assertEqual(get_participant_session(participant.id), session)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_participant_session(participant.id), session)
+
+        session.end_time = session.start_time
+        session.save()
+        self.assertEqual(get_participant_session(participant.id).end_time, session.start_time)
+
+    def test_versioned_keys_move_on_bump(self):
+        key = versioned_key('test_namespace', 'a', 1)
+        self.assertEqual(get_or_load('test_namespace', ('a', 1), lambda: 'loaded'), 'loaded')
+        self.assertEqual(get_or_load('test_namespace', ('a', 1), lambda: 'reloaded'), 'loaded')
+        bump_version('test_namespace')
+        self.assertNotEqual(versioned_key('test_namespace', 'a', 1), key)
+        self.assertEqual(get_or_load('test_namespace', ('a', 1), lambda: 'reloaded'), 'reloaded')
+
+    def test_sessions_use_cached_db_backend(self):
+        self.assertEqual(settings.SESSION_ENGINE, 'django.contrib.sessions.backends.cached_db')
+        response = self.client.get(reverse('welcome_home'))
+        self.assertEqual(response.status_code, 200)
+
+
+class InMemoryS3:
+    """Just enough of the boto3 S3 client for the storage lifecycle."""
+
+    def __init__(self):
+        self.objects = {}
+
+    def upload_file(self, path, bucket, key, ExtraArgs=None):
+        with open(path, 'rb') as f:
+            self.objects[key] = (f.read(), (ExtraArgs or {}).get('Metadata', {}))
+
+    def download_file(self, bucket, key, path):
+        with open(path, 'wb') as f:
+            f.write(self.objects[key][0])
+
+    def head_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise ClientError({'Error': {'Code': '404'}}, 'HeadObject')
+        body, metadata = self.objects[Key]
+        return {'ContentLength': len(body), 'Metadata': metadata}
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop(Key, None)
+
+    def head_bucket(self, Bucket):
+        return {}
+
+
+class StorageLifecycleTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.s3 = InMemoryS3()
+        self.samples = (np.sin(np.arange(44100) / 10) * 20000).astype(np.int16)
+        self.key = 'participant_1/stimulus_1/trial_1/recording_trial_1.wav'
+        self.path = os.path.join(self.media_root, self.key)
+        os.makedirs(os.path.dirname(self.path))
+        scipy_wavfile.write(self.path, 44100, self.samples)
+
+    def test_local_copy_is_evicted_only_after_upload_is_confirmed(self):
+        artifact = register_artifact(self.path, self.key, uploaded=False)
+        self.assertEqual(run_lifecycle(evict_after=timedelta(0), s3_client=self.s3)['confirmed'], 1)
+        self.assertIn(self.key, self.s3.objects)
+
+        artifact.refresh_from_db()
+        self.s3.objects[self.key] = (b'truncated', {})
+        self.assertFalse(evict_local(artifact, s3_client=self.s3))
+        self.assertTrue(os.path.exists(self.path))
+
+        upload_to_s3(self.path, self.key, content_hash=artifact.sha256, s3_client=self.s3)
+        self.assertTrue(evict_local(artifact, s3_client=self.s3))
+        self.assertFalse(os.path.exists(self.path))
+        self.assertEqual(Artifact.objects.get(storage_key=self.key).status, 'remote')
+
+    def test_sweep_downloads_evicted_recordings_outside_media_root(self):
+        cache.clear()
+        RhythmSequence.objects.create(name='simple-1', rhythm_type='simple', sequence_data=[0, 520, 260])
+        session = allocate_session(Participant.objects.create(age=25, agreed_to_terms=True))
+        trial = Trial.objects.filter(session=session).first()
+        sha256 = file_hash(self.path)
+        upload_to_s3(self.path, self.key, content_hash=sha256, s3_client=self.s3)
+        artifact = register_artifact(self.path, self.key, trial=trial, sha256=sha256)
+        self.assertTrue(evict_local(artifact, s3_client=self.s3))
+
+        download_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, download_dir)
+        recordings = SweepCommand().study_recordings(download_dir, s3_client=self.s3)
+        self.assertEqual(len(recordings), 1)
+        self.assertEqual(os.path.dirname(recordings[0]['path']), download_dir)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_cold_recordings_are_recompressed_losslessly(self):
+        sha256 = file_hash(self.path)
+        upload_to_s3(self.path, self.key, content_hash=sha256, s3_client=self.s3)
+        register_artifact(self.path, self.key, sha256=sha256)
+        counts = run_lifecycle(evict_after=timedelta(0), cold_after=timedelta(0), s3_client=self.s3)
+        self.assertEqual((counts['evicted'], counts['recompressed']), (1, 1))
+
+        artifact = Artifact.objects.get(sha256=sha256)
+        self.assertEqual(artifact.status, 'cold')
+        self.assertEqual(list(self.s3.objects), [artifact.storage_key])
+        self.assertTrue(artifact.storage_key.endswith('.flac'))
+        self.assertLess(artifact.size, self.samples.nbytes)
+
+        restored = local_copy(artifact, os.path.join(self.media_root, 'restored.wav'), s3_client=self.s3)
+        fs, data = scipy_wavfile.read(restored)
+        self.assertEqual(fs, 44100)
+        np.testing.assert_array_equal(data, self.samples)
+
+    def test_existing_files_are_registered_once(self):
+        self.assertEqual(register_existing(self.media_root), 1)
+        self.assertEqual(register_existing(self.media_root), 0)
+        self.assertEqual(Artifact.objects.get().storage_key, self.key)
+
+
+class ArtifactManifestTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        sequence = RhythmSequence.objects.create(name='simple-1', sequence_data=[0, 520, 260])
+        self.keys = {}
+        for complexity_level, ear_order in [('simple', 'left_first'), ('simple', 'right_first'), ('complex', 'left_first')]:
+            participant = Participant.objects.create(age=25, agreed_to_terms=True)
+            session = ExperimentSession.objects.create(participant=participant, complexity_level=complexity_level, ear_order=ear_order)
+            trial = Trial.objects.filter(session=session, trial_number=1).first() or Trial.objects.create(
+                session=session, participant=participant, trial_number=1, rhythm_sequence=sequence
+            )
+            for kind in ('recording', 'plot'):
+                key = artifact_key(kind, participant.id, 1)
+                path = os.path.join(self.media_root, key.replace('/', '_'))
+                with open(path, 'wb') as f:
+                    f.write(b'data')
+                register_artifact(path, key, kind=kind, trial=trial)
+                self.keys[(complexity_level, ear_order, kind)] = key
+
+    def test_keys_follow_the_bucket_layout(self):
+        self.assertEqual(artifact_key('recording', 7, 3), 'participant_7/stimulus_1/trial_3/recording_trial_3.wav')
+        self.assertEqual(artifact_key('analysis_csv', 7), 'participant_7/stimulus_1/participant_analysis.csv')
+        self.assertEqual(parse_artifact_key(artifact_key('plot', 7, 3)), ('plot', 7, 3))
+        self.assertIsNone(parse_artifact_key(artifact_key('analysis_csv', 7)))
+
+    def test_condition_cell_recordings_are_one_query(self):
+        queryset = cohort_artifacts('recording', complexity_level='simple', ear_order='left_first')
+        with self.assertNumQueries(1):
+            keys = list(iter_storage_keys(queryset))
+        self.assertEqual(keys, [self.keys[('simple', 'left_first', 'recording')]])
+        self.assertEqual(cohort_artifacts('plot', complexity_level='simple').count(), 2)
+
+
+class SessionArchiveTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        sequence = RhythmSequence.objects.create(name='simple-1', sequence_data=[0, 520, 260])
+        self.sessions = []
+        for ended_days_ago in (60, 45, None):
+            participant = Participant.objects.create(age=25, agreed_to_terms=True)
+            session = ExperimentSession.objects.create(participant=participant)
+            if ended_days_ago is not None:
+                session.end_time = timezone.now() - timedelta(days=ended_days_ago)
+                session.save()
+            trial = Trial.objects.filter(session=session).order_by('trial_number').first()
+            TapRecord.objects.create(trial=trial, participant=participant, tap_times=[0.5, 1.0])
+            Analysis.objects.create(trial=trial, response_data={'mean_async_all': 12.0})
+            SessionSummary.objects.create(session=session, trial_count=1)
+            self.sessions.append(session)
+
+    def log_in(self, experiment_session):
+        session = self.client.session
+        session['participant_id'] = experiment_session.participant_id
+        session.save()
+
+    def test_completion_page_ends_the_session(self):
+        active = self.sessions[2]
+        self.log_in(active)
+        self.client.get(reverse('complete'))
+        active.refresh_from_db()
+        self.assertIsNotNone(active.end_time)
+        self.assertIn(active, archivable_sessions(older_than=timedelta(0)))
+        self.assertEqual(sum(cell['completed'] for cell in cell_counts()), 3)
+
+        # A second visit keeps the first end time
+        end_time = active.end_time
+        self.client.get(reverse('complete'))
+        active.refresh_from_db()
+        self.assertEqual(active.end_time, end_time)
+
+    def test_last_trial_ends_the_session(self):
+        active = self.sessions[2]
+        self.log_in(active)
+        with self.settings(MEDIA_ROOT=self.media_root), mock.patch('experiment.views.upload_to_s3', return_value=None):
+            self.assertEqual(self.client.post(reverse('trial', args=[11])).status_code, 200)
+            active.refresh_from_db()
+            self.assertIsNone(active.end_time)
+            self.assertEqual(self.client.post(reverse('trial', args=[12])).status_code, 200)
+        active.refresh_from_db()
+        self.assertIsNotNone(active.end_time)
+
+    def test_completed_sessions_move_to_parquet(self):
+        with self.settings(MEDIA_ROOT=self.media_root):
+            artifacts = archive_completed(batch_size=1, upload=False)
+        self.assertEqual(len(artifacts), 2)
+        self.assertEqual({a.kind for a in artifacts}, {'archive'})
+
+        table = pq.read_table(artifacts[0].local_path)
+        self.assertEqual(table.num_rows, Trial.objects.filter(session=self.sessions[0]).count())
+        self.assertIn([0.5, 1.0], table.column('tap_times').to_pylist())
+
+        archived, _, active = self.sessions
+        self.assertFalse(TapRecord.objects.filter(trial__session=archived).exists())
+        self.assertTrue(TapRecord.objects.filter(trial__session=active).exists())
+        self.assertIsNone(Analysis.objects.get(trial__session=archived).response_data)
+        self.assertEqual(SessionSummary.objects.count(), 3)
+        self.assertEqual(archivable_sessions().count(), 0)
+
+    def test_partitions_are_monthly(self):
+        self.assertEqual(next_month(datetime(2024, 12, 15, tzinfo=dt_timezone.utc)), datetime(2025, 1, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(partition_name('experiment_taprecord', datetime(2025, 3, 1)), 'experiment_taprecord_y2025m03')
+        self.assertEqual(ensure_partitions(TapRecord._meta.db_table), [])
+
+    def partition_of(self, tap_record):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT tableoid::regclass::text FROM {TapRecord._meta.db_table} WHERE id = %s", [tap_record.id])
+            return cursor.fetchone()[0]
+
+    @skipUnless(connection.vendor == 'postgresql', "Partitioning is PostgreSQL only")
+    def test_partitioning_migration_keeps_rows_and_keys(self):
+        migration = importlib.import_module('experiment.migrations.0012_taprecord_partitioning')
+        table = TapRecord._meta.db_table
+        old = TapRecord.objects.order_by('id').first()
+        TapRecord.objects.filter(id=old.id).update(created_at=datetime(2024, 1, 15, tzinfo=dt_timezone.utc))
+        ids = set(TapRecord.objects.values_list('id', flat=True))
+        with connection.cursor() as cursor:
+            # Pending deferred FK checks would block the ALTER TABLEs
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+        with connection.schema_editor() as schema_editor:
+            migration.unpartition_tables(django_apps, schema_editor)
+        self.assertFalse(is_partitioned(table))
+        self.assertEqual(set(TapRecord.objects.values_list('id', flat=True)), ids)
+
+        with connection.schema_editor() as schema_editor:
+            migration.partition_tables(django_apps, schema_editor)
+        self.assertTrue(is_partitioned(table))
+        self.assertEqual(set(TapRecord.objects.values_list('id', flat=True)), ids)
+        self.assertEqual(self.partition_of(old), partition_name(table, datetime(2024, 1, 1)))
+        # The id sequence continues after the copied rows
+        trial = Trial.objects.filter(session=self.sessions[2]).first()
+        new = TapRecord.objects.create(trial=trial, participant=self.sessions[2].participant, tap_times=[])
+        self.assertGreater(new.id, max(ids))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            TapRecord.objects.create(trial_id=trial.id + 1000, participant=self.sessions[2].participant, tap_times=[])
+            connection.cursor().execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+        # Rows past the last partition wait in the default one until theirs is created
+        later = next_month(next_month(next_month(next_month(next_month(timezone.now())))))
+        TapRecord.objects.filter(id=new.id).update(created_at=later)
+        self.assertEqual(self.partition_of(new), f"{table}_default")
+        self.assertEqual(ensure_partitions(table, start=later, months_ahead=5), [partition_name(table, later)])
+        self.assertEqual(self.partition_of(new), partition_name(table, later))
+
+
+class TrialExportTest(TestCase):
+    def setUp(self):
+        RhythmSequence.objects.create(name='simple-1', sequence_data=[0, 520, 260])
+        participant = Participant.objects.create(age=25, agreed_to_terms=True)
+        self.session = ExperimentSession.objects.create(participant=participant)
+        self.trial = Trial.objects.filter(session=self.session).order_by('trial_number').first()
+        TapRecord.objects.create(trial=self.trial, participant=participant, tap_times=[0.5, 1.0])
+        Analysis.objects.create(trial=self.trial, response_data={'mean_async_all': 12.0})
+        self.staff = User.objects.create_user(username='researcher', password='testpass', is_staff=True)
+
+    def export(self, export_format):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('export-trials'), {'format': export_format})
+        return response, b''.join(response.streaming_content) if response.streaming else response.content
+
+    def test_ndjson_rows_carry_taps_and_analysis(self):
+        response, body = self.export('ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual(len(rows), Trial.objects.count())
+        row = next(row for row in rows if row['trial_id'] == self.trial.id)
+        self.assertEqual(row['session_id'], self.session.id)
+        self.assertEqual(row['rhythm_sequence'], 'simple-1')
+        self.assertEqual(row['tap_times'], [0.5, 1.0])
+        self.assertEqual(row['analysis'], {'mean_async_all': 12.0})
+
+    def test_export_is_staff_only(self):
+        response = self.client.get(reverse('export-trials'))
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.export('xlsx')[0].status_code, 400)
+
+    def test_parquet_export_reads_back(self):
+        response, body = self.export('parquet')
+        self.assertEqual(response.status_code, 200)
+        table = pq.read_table(io.BytesIO(body))
+        self.assertEqual(table.num_rows, Trial.objects.count())
+        self.assertIn([0.5, 1.0], table.column('tap_times').to_pylist())
+
+    def test_command_writes_its_file(self):
+        output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output_dir)
+        output = os.path.join(output_dir, 'trials.ndjson')
+        call_command('export_trials', format='ndjson', output=output, stderr=io.StringIO())
+        with open(output) as f:
+            self.assertEqual(len(f.readlines()), Trial.objects.count())
+
+
+class LargeTableAdminTest(TestCase):
+    def setUp(self):
+        RhythmSequence.objects.create(name='simple-1', sequence_data=[0, 520, 260])
+        self.add_sessions(1)
+        self.staff = User.objects.create_superuser(username='admin', password='testpass', email='admin@example.com')
+        self.client.force_login(self.staff)
+
+    def changelist_url(self):
+        # The admin sits under a language prefix, and LANGUAGE_CODE is not one
+        with translation.override('en'):
+            return reverse('admin:experiment_trial_changelist')
+
+    def add_sessions(self, count):
+        for _ in range(count):
+            participant = Participant.objects.create(age=25, agreed_to_terms=True)
+            ExperimentSession.objects.create(participant=participant)
+
+    def test_paginator_counts_rows_off_postgres(self):
+        paginator = EstimatedCountPaginator(Trial.objects.all(), 10)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(paginator.count, Trial.objects.count())
+        # On PostgreSQL a small table's estimate is below the threshold, so it is counted too
+        if connection.vendor != 'postgresql':
+            self.assertNotIn('pg_class', queries[0]['sql'])
+
+    def test_changelist_reads_use_the_analytics_database(self):
+        model_admin = django_admin.site._registry[Trial]
+        factory = RequestFactory()
+        with mock.patch('experiment.admin.analytics_db', return_value='replica'):
+            self.assertEqual(model_admin.get_queryset(factory.get('/')).db, 'replica')
+            self.assertEqual(model_admin.get_queryset(factory.post('/')).db, 'default')
+
+    def export(self, action, trials):
+        response = self.client.post(self.changelist_url(), {
+            'action': action,
+            '_selected_action': [trial.id for trial in trials],
+        })
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def test_export_actions_stream_the_selected_rows(self):
+        trials = list(Trial.objects.order_by('id')[:3])
+        lines = self.export('export_trials_csv', trials).decode().splitlines()
+        self.assertEqual(len(lines), 1 + len(trials))
+        table = pq.read_table(io.BytesIO(self.export('export_trials_parquet', trials)))
+        self.assertEqual(sorted(table.column('trial_id').to_pylist()), [trial.id for trial in trials])
+
+    def test_changelist_query_count_does_not_grow_with_the_page(self):
+        url = self.changelist_url()
+        with CaptureQueriesContext(connection) as small_page:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.add_sessions(3)
+        with CaptureQueriesContext(connection) as large_page:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(len(large_page), len(small_page))
+
+
+class StudyPlanTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.simple = [RhythmSequence.objects.create(name=f'simple-{i}', rhythm_type='simple', sequence_data=[0, 520, 260 * i]) for i in (1, 2)]
+        self.complex = RhythmSequence.objects.create(name='complex-1', rhythm_type='complex', sequence_data=[0, 130, 390])
+        self.study = Study.objects.create(name='Pilot', slug='pilot', trial_count=4, break_after=[2], analysis_config={'MARKERS_MAX_ERROR': 20})
+        self.study.rhythm_sequences.set(self.simple)
+
+    def test_default_plan_keeps_the_original_shape(self):
+        plan = get_plan()
+        self.assertEqual((plan.trial_count, plan.break_after), (12, (6,)))
+        self.assertEqual([r.id for r in plan.rhythms('complex')], [self.complex.id])
+        self.assertEqual([plan.block_for_trial(n) for n in (1, 6, 7, 12)], [1, 1, 2, 2])
+
+    def test_study_plan_is_compiled_once_and_recompiled_on_change(self):
+        plan = get_plan(self.study.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_plan(self.study.id), plan)
+        self.assertEqual(plan.rhythms('complex'), ())
+        self.assertEqual([r.id for r in plan.presentation_order('simple', 1)], [self.simple[1].id, self.simple[0].id])
+        self.assertEqual(plan.stimulus_number('simple', 1, self.simple[0].id), 2)
+        self.assertEqual(plan.analysis_overrides(), {'MARKERS_MAX_ERROR': 20})
+
+        self.study.trial_count = 6
+        self.study.save()
+        self.assertEqual(get_plan(self.study.id).trial_count, 6)
+
+    def test_sessions_follow_their_study(self):
+        participants = [Participant.objects.create(age=25, agreed_to_terms=True) for _ in range(2)]
+        session = allocate_session(participants[0], study=self.study)
+        default_session = allocate_session(participants[1])
+        self.assertEqual(Trial.objects.filter(session=session).count(), 4)
+        self.assertEqual(Trial.objects.filter(session=default_session).count(), 12)
+        # Each study is counterbalanced on its own schedule
+        self.assertEqual(session.allocation_slot.position, 0)
+        self.assertEqual(default_session.allocation_slot.position, 0)
+
+    def test_plan_round_trips_through_json(self):
+        plan = get_plan(self.study.id)
+        self.assertEqual(plan_from_dict(json.loads(json.dumps(plan.to_dict()))), plan)
+
+
+class StimulusPreloadTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.rhythms = [RhythmSequence.objects.create(name=f'simple-{i}', rhythm_type='simple', sequence_data=[0, 520, 260 * i]) for i in (1, 2)]
+        RhythmSequence.objects.create(name='complex-1', rhythm_type='complex', sequence_data=[0, 130, 390])
+        participant = Participant.objects.create(age=25, agreed_to_terms=True)
+        self.experiment_session = allocate_session(participant)
+        session = self.client.session
+        session['participant_id'] = participant.id
+        session.save()
+
+    def test_practice_lists_every_stimulus_of_the_session(self):
+        response = self.client.get(reverse('practice'))
+        self.assertEqual(response.status_code, 200)
+        plan = get_plan()
+        expected = [
+            reverse('stimulus_audio', args=[stimulus_fingerprint(list(rhythm.intervals))])
+            for rhythm in plan.presentation_order(self.experiment_session.complexity_level, self.experiment_session.sequence_order)
+        ]
+        self.assertEqual(response.context['stimulus_urls'], expected)
+        self.assertContains(response, 'js/stimulus_player.js')
+
+    def test_trials_store_the_rhythm_practice_plays(self):
+        participant = Participant.objects.create(age=30, agreed_to_terms=True)
+        experiment_session = ExperimentSession.objects.create(participant=participant, complexity_level='simple', sequence_order=1)
+        session = self.client.session
+        session['participant_id'] = participant.id
+        session.save()
+        played = self.client.get(reverse('practice')).context['rhythm_sequence']
+        self.assertEqual(played, self.rhythms[1])
+        self.assertEqual(
+            set(Trial.objects.filter(session=experiment_session).values_list('rhythm_sequence', flat=True)), {played.id}
+        )
+
+
+class TapScoringTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.onsets = [1000.0, 1500.0, 2000.0, 2500.0]
+
+    def test_score_matches_each_onset_to_its_nearest_tap(self):
+        score = score_taps([1020, 1490, 1530, 2010, 2900], self.onsets)
+        self.assertEqual((score['tap_count'], score['matched'], score['quality']), (5, 3, 'ok'))
+        self.assertAlmostEqual(score['mean_asynchrony'], (20 - 10 + 10) / 3)
+        self.assertEqual(score['percent_aligned'], 75.0)
+        self.assertEqual(score_taps([], self.onsets)['quality'], 'no_taps')
+        self.assertEqual(score_taps([1000, 3000], self.onsets)['quality'], 'too_few_aligned')
+
+    def test_each_tap_is_matched_to_one_onset(self):
+        onsets = [1000.0 + 130 * i for i in range(9)]
+        score = score_taps(onsets[::2], onsets)
+        self.assertEqual((score['matched'], score['mean_asynchrony']), (5, 0.0))
+        # The window is narrowed to half the 130 ms IOI
+        self.assertEqual(match_window(onsets), 65.0)
+        self.assertEqual(score_taps([1000, 1010], onsets[:1])['matched'], 1)
+
+    def test_client_summary_is_verified_against_the_server_score(self):
+        score = score_taps([1020, 1490, 2010, 2505], self.onsets)
+        client = json.loads(json.dumps(score))
+        self.assertTrue(verify_tap_summary(client, score))
+        self.assertFalse(verify_tap_summary(dict(client, mean_asynchrony=client['mean_asynchrony'] + 5), score))
+        self.assertFalse(verify_tap_summary(dict(client, quality='ok', matched=1), score))
+        self.assertFalse(verify_tap_summary(None, score))
+
+    def test_trial_with_too_few_taps_to_plot_is_recorded(self):
+        rhythm = RhythmSequence.objects.create(name='simple-1', rhythm_type='simple', sequence_data=[0, 500, 500])
+        participant = Participant.objects.create(age=25, agreed_to_terms=True)
+        experiment_session = ExperimentSession.objects.create(participant=participant)
+        session = self.client.session
+        session['participant_id'] = participant.id
+        session['rhythm_sequence_id'] = rhythm.id
+        session.save()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        with self.settings(MEDIA_ROOT=media_root), mock.patch('experiment.views.upload_to_s3', return_value=None):
+            for trial_number, tap_times in ((1, []), (2, [10.0])):
+                response = self.client.post(
+                    reverse('trial', args=[trial_number]),
+                    {'tap_times': json.dumps(tap_times), 'stim_onsets': '[1.0]'},
+                    HTTP_IDEMPOTENCY_KEY=f'few-taps-{trial_number}',
+                )
+                self.assertEqual(response.status_code, 200)
+        self.assertEqual(TrialSubmission.objects.filter(session=experiment_session).count(), 2)
+        self.assertFalse(Artifact.objects.filter(kind='plot').exists())
+
+    def test_rhythm_api_serves_onsets_within_the_stimulus_file(self):
+        rhythm = RhythmSequence.objects.create(name='simple-1', rhythm_type='simple', sequence_data=[0, 500, 500])
+        response = self.client.get(reverse('rhythmsequence-detail', args=[rhythm.id]))
+        onsets = response.json()['stimulus_onsets']
+        self.assertEqual(onsets, stimulus_onsets(rhythm.sequence_data))
+        # The marker block comes first, then the rhythm's own intervals
+        self.assertGreater(onsets[0], 0)
+        self.assertEqual([b - a for a, b in zip(onsets, onsets[1:])], [500.0, 500.0])
+        # Lists leave them out, so a cold cache does not synthesize every rhythm
+        with mock.patch('experiment.scoring.compile_stimulus_onsets') as compile_onsets:
+            rows = self.client.get(reverse('rhythmsequence-list')).json()['results']
+        self.assertNotIn('stimulus_onsets', rows[0])
+        compile_onsets.assert_not_called()
+
+
+class WarmupTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        patcher = mock.patch.dict(warmup._status, {'state': 'idle', 'steps': {}, 'errors': {}})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.rhythm = RhythmSequence.objects.create(name='simple-1', rhythm_type='simple', sequence_data=[0, 500, 500])
+        with self.settings(MEDIA_ROOT=self.media_root):
+            path = local_stimulus_path(stimulus_fingerprint(self.rhythm.sequence_data))
+        os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as f:
+            f.write(b'RIFF')
+
+    def test_readiness_follows_warm_up(self):
+        self.assertEqual(self.client.get(reverse('readiness')).status_code, 503)
+        self.assertEqual(self.client.get(reverse('liveness')).json(), {'status': 'alive', 'warmup': 'idle'})
+
+        with self.settings(MEDIA_ROOT=self.media_root):
+            warmup.warm_up(s3_client=InMemoryS3())
+        response = self.client.get(reverse('readiness'))
+        self.assertEqual(response.status_code, 200)
+        body = response.json()['warmup']
+        self.assertEqual(body['state'], 'ready')
+        self.assertEqual(set(body['steps']), {'database', 'cache', 'storage', 'imports', 'analysis', 'stimuli'})
+        self.assertEqual(body['errors'], {})
+        # Stimulus onsets were compiled during warm-up
+        with mock.patch('experiment.scoring.compile_stimulus_onsets') as compile_onsets:
+            stimulus_onsets(self.rhythm.sequence_data)
+        compile_onsets.assert_not_called()
+
+    def test_warm_up_off_reports_ready(self):
+        warmup.start_warmup('off')
+        self.assertEqual(self.client.get(reverse('readiness')).status_code, 200)
+
+
+class ParticipantProfileTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        RhythmSequence.objects.create(name='simple-1', rhythm_type='simple', sequence_data=[0, 500, 500])
+        participant = Participant.objects.create(age=25, agreed_to_terms=True)
+        allocate_session(participant)
+        session = self.client.session
+        session['participant_id'] = participant.id
+        session.save()
+
+    def test_participant_app_does_not_import_analysis_stack(self):
+        script = (
+            "import sys; import api.wsgi_participant; from django.urls import get_resolver; get_resolver().url_patterns; "
+            "print(sorted(m for m in ('numpy', 'scipy', 'pandas', 'matplotlib', 'repp', 'boto3', 'rest_framework') if m in sys.modules))"
+        )
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='api.settings_participant')
+        result = subprocess.run([sys.executable, '-c', script], env=env, capture_output=True, text=True, cwd=settings.BASE_DIR)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), '[]')
+
+    @override_settings(ROOT_URLCONF='api.urls_participant')
+    def test_participant_routes_serve_pages(self):
+        response = self.client.get(reverse('practice'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['stimulus_urls'][0].startswith('/stimuli/'))
+        response = self.client.get(reverse('trial', args=[1]))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('tap_scoring', response.context)
+        # Submissions go to the worker deployment
+        self.assertEqual(self.client.post(reverse('trial', args=[1])).status_code, 405)
@@ -1,5 +1,8 @@
-from django.urls import path
-from .views import WelcomeHomeView, PracticeView, TrialView, CompletionView, TapRecordAPIView
+from django.urls import path, re_path
+from .views import (
+    WelcomeHomeView, PracticeView, TrialView, CompletionView, TapRecordAPIView, StimulusAudioView,
+    LivenessView, ReadinessView,
+)
 
 urlpatterns = [
     path('', WelcomeHomeView.as_view(), name='welcome_home'),
@@ -7,4 +10,7 @@ urlpatterns = [
     path('trial/<int:trial_number>/', TrialView.as_view(), name='trial'),
     path('trial/<int:trial_number>/tap-record/', TapRecordAPIView.as_view(), name='tap_record'),
     path('complete/', CompletionView.as_view(), name='complete'),
+    path('healthz/live/', LivenessView.as_view(), name='liveness'),
+    path('healthz/ready/', ReadinessView.as_view(), name='readiness'),
+    re_path(r'^stimuli/(?P<fingerprint>[0-9a-f]{32})\.wav$', StimulusAudioView.as_view(), name='stimulus_audio'),
 ]
@@ -1,30 +1,59 @@
-from django.views.generic import TemplateView, View
-from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse
+from django.views.generic import View
+from django.shortcuts import render, get_object_or_404
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
 from django.conf import settings
 from django.urls import reverse
-from .models import Trial, ExperimentSession, Participant, Analysis, RhythmSequence, TapRecord
-from .forms import ParticipantForm
+from django.db import IntegrityError, transaction
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+from .models import Trial, Participant, Analysis, RhythmSequence, Study, TapRecord, TrialSubmission
+import hashlib
 import json
-import random
 import os
-import numpy as np
+import struct
 import pandas as pd
+from scipy.io import wavfile
 from repp.analysis import REPPAnalysis
 from repp.config import sms_tapping
 from repp.stimulus import REPPStimulus
 from rest_framework import viewsets
-from .serializers import RhythmSequenceSerializer
+from .serializers import RhythmSequenceDetailSerializer, RhythmSequenceSerializer
 from urllib.parse import urljoin
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework import status
+from rest_framework.permissions import IsAdminUser
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
+from django.contrib.admin.views.decorators import staff_member_required
 import logging
 import matplotlib.pyplot as plt
-from .aws import upload_to_s3  # Assuming upload_to_s3 is implemented in aws.py
+from .aws import download_from_s3, upload_to_s3  # Assuming upload_to_s3 is implemented in aws.py
+from .stimuli import (
+    STIMULUS_DIR, atomic_path, local_stimulus_path, serve_stimulus, stimulus_filename, stimulus_fingerprint,
+    write_compressed_variant,
+)
+from .summaries import record_trial_summary
+from .scoring import score_taps, stimulus_onsets, tap_analysis, verify_tap_summary
+from .participant_views import (  # noqa: F401 (re-exported for the URLconfs)
+    CompletionView, LivenessView, PracticeView, ReadinessView, TrialPageView, WelcomeHomeView,
+)
+from .prescreen import prescreen_recording
+from .alignment import MarkerAligner, resampled_length
+from .wavmap import open_wav
+from .synth import with_markers
+from .artifacts import artifact_key, local_artifact_path
+from .lifecycle import register_artifact
+from .allocation import cell_counts, complete_session
+from .studies import get_plan
+from .cohort import condition_table
+from .export import EXPORT_FORMATS, iter_trial_rows
+from .cache import (
+    RHYTHM_SEQUENCE_CACHE, get_participant_session, get_rhythm_sequence, versioned_key,
+)
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
 
@@ -35,31 +64,55 @@ def generate_rhythm_audio(sequence, filename):
     repp_stimulus = REPPStimulus("generated_rhythm", config=sms_tapping)
     stim_onsets = repp_stimulus.make_onsets_from_ioi(sequence)
     audio, _stim_info, _stim_alignment = repp_stimulus.prepare_stim_from_onsets(stim_onsets)
-    
+
     # Adding markers to the start and end
-    marker_duration = 0.25
     fs = sms_tapping.FS
-    marker = np.sin(2 * np.pi * 440 * np.linspace(0, marker_duration, int(fs * marker_duration)))
-    silence = np.zeros(int(0.2 * fs))
-    markers = np.concatenate([marker, silence, marker, silence, marker])
-
-    full_audio = np.concatenate([markers, audio, markers])
-    local_path = os.path.join(settings.MEDIA_ROOT, 'rhythm_audios', filename)
+    full_audio = with_markers(audio, fs)
+    local_path = os.path.join(settings.MEDIA_ROOT, STIMULUS_DIR, filename)
     os.makedirs(os.path.dirname(local_path), exist_ok=True)
-    REPPStimulus.to_wav(full_audio, local_path, fs)
+    # Written aside and renamed into place: the URL is cached as immutable, so a
+    # concurrent request must never serve a partly written file
+    with atomic_path(local_path) as temp_path:
+        REPPStimulus.to_wav(full_audio, temp_path, fs)
+    write_compressed_variant(local_path)
 
     # Upload audio to AWS S3 and get URL
-    s3_path = f"rhythm_audios/{filename}"
+    s3_path = f"{STIMULUS_DIR}/{filename}"
     audio_url = upload_to_s3(local_path, s3_path)
     return audio_url
 
-class CompletionView(TemplateView):
-    template_name = 'experiment/completion.html'
-    
-    def get(self, request):
-        return render(request, self.template_name)
-    
-    
+
+def ensure_stimulus_audio(sequence_data):
+    """Make sure the stimulus for a sequence is on local disk and return its fingerprint."""
+    fingerprint = stimulus_fingerprint(sequence_data)
+    filename = stimulus_filename(fingerprint)
+    local_path = local_stimulus_path(fingerprint)
+    if not os.path.exists(local_path):
+        # Another instance may already have rendered it
+        if download_from_s3(f"{STIMULUS_DIR}/{filename}", local_path):
+            write_compressed_variant(local_path)
+        else:
+            logger.debug(f"Generating audio file for {filename}")
+            generate_rhythm_audio(sequence_data, filename)
+    return fingerprint
+
+
+class StimulusAudioView(View):
+    """Serve rendered stimuli by content fingerprint with immutable caching and byte ranges."""
+
+    def get(self, request, fingerprint):
+        local_path = local_stimulus_path(fingerprint)
+        if not os.path.exists(local_path):
+            sequence = next(
+                (seq for seq in RhythmSequence.objects.only('sequence_data')
+                 if stimulus_fingerprint(seq.sequence_data) == fingerprint),
+                None,
+            )
+            if sequence is None:
+                raise Http404("Unknown stimulus.")
+            ensure_stimulus_audio(sequence.sequence_data)
+        return serve_stimulus(request, local_path, fingerprint)
+
 
 @method_decorator(csrf_exempt, name='dispatch')
 class TapRecordAPIView(APIView):
@@ -71,7 +124,7 @@ class TapRecordAPIView(APIView):
                 return Response({'error': 'Participant not found in session'}, status=status.HTTP_400_BAD_REQUEST)
 
             participant = get_object_or_404(Participant, id=participant_id)
-            experiment_session = ExperimentSession.objects.filter(participant=participant).first()
+            experiment_session = get_participant_session(participant_id)
             trial = Trial.objects.filter(session=experiment_session, trial_number=trial_number).first()
 
             if not trial:
@@ -94,100 +147,115 @@ class TapRecordAPIView(APIView):
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-class RhythmSequenceViewSet(viewsets.ModelViewSet):
-    queryset = RhythmSequence.objects.all()
-    serializer_class = RhythmSequenceSerializer
+class CohortConditionsAPIView(APIView):
+    """Condition-level comparison table across all participants, aggregated in the database."""
+    permission_classes = [IsAdminUser]
 
-class WelcomeHomeView(View):
-    template_name = 'experiment/welcome.html'
+    def get(self, request):
+        df = condition_table()
+        return Response(json.loads(df.to_json(orient='records')))
+
+
+class AllocationCellsAPIView(APIView):
+    """Live participant counts for each counterbalanced condition cell."""
+    permission_classes = [IsAdminUser]
 
     def get(self, request):
-        form = ParticipantForm()
-        return render(request, self.template_name, {'form': form})
+        study = None
+        if request.query_params.get('study'):
+            study = Study.objects.filter(slug=request.query_params['study']).first()
+            if study is None:
+                return Response({'error': 'Unknown study.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(cell_counts(study))
 
-    def post(self, request):
-        form = ParticipantForm(request.POST)
-        if form.is_valid():
-            participant = form.save()
-            request.session['participant_id'] = participant.id
-            return redirect('practice')
-        return render(request, self.template_name, {'form': form})
 
-class PracticeView(View):
-    template_name = 'experiment/practice.html'
+@method_decorator(staff_member_required, name='dispatch')
+class TrialExportView(View):
+    """Stream every trial with its taps and analysis as NDJSON or Parquet."""
 
     def get(self, request):
-        participant_id = request.session.get('participant_id')
-        if not participant_id:
-            return redirect('welcome_home')
-
-        participant = Participant.objects.get(id=participant_id)
-        experiment_session, created = ExperimentSession.objects.get_or_create(
-            participant=participant,
-            defaults={
-                'complexity_level': random.choice(['simple', 'complex']),
-                'ear_order': random.choice(['left_first', 'right_first']),
-                'start_time': timezone.now(),
+        export_format = request.GET.get('format', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            return JsonResponse({'error': f"Unsupported format '{export_format}'."}, status=400)
+
+        stream, content_type, extension = EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(stream(iter_trial_rows()), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="trials.{extension}"'
+        return response
+
+
+class CachedReadMixin:
+    """
+    Serve list and retrieve responses from a versioned cache, with strong ETags
+    and Last-Modified so unchanged resources revalidate as 304 Not Modified.
+    Subclasses set `cache_namespace`; bumping that namespace invalidates every entry.
+
+    The version bump only reaches processes sharing the cache backend, so
+    entries also expire after `cache_timeout`. The ETag hashes the whole body,
+    so it changes when rows are added or deleted. Last-Modified is the time the
+    entry was built: unlike the newest updated_at it never moves backwards
+    after a delete, and no entry built before a change can be newer than it.
+    """
+    cache_namespace = None
+    cache_max_age = 300
+    cache_timeout = 60
+
+    def list(self, request, *args, **kwargs):
+        return self._cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached_response(request, super().retrieve, *args, **kwargs)
+
+    def _cached_response(self, request, render, *args, **kwargs):
+        key = versioned_key(self.cache_namespace, request.get_full_path())
+        entry = cache.get(key)
+        if entry is None:
+            response = render(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            body = json.dumps(response.data, sort_keys=True, separators=(',', ':'), cls=DjangoJSONEncoder)
+            entry = {
+                'data': json.loads(body),
+                'etag': f'"{hashlib.sha256(body.encode()).hexdigest()}"',
+                'last_modified': http_date(timezone.now().timestamp()),
             }
-        )
-
-        rhythm_sequences = RhythmSequence.objects.filter(rhythm_type=experiment_session.complexity_level)
-        rhythm_sequence = rhythm_sequences.first()
-        if not rhythm_sequence:
-            return redirect('welcome_home')
-
-        request.session['rhythm_sequence_id'] = rhythm_sequence.id
-        context = {
-            'participant_id': participant_id,
-            'complexity_level': experiment_session.complexity_level,
-            'ear_order': experiment_session.ear_order,
-            'rhythm_sequence': rhythm_sequence,
-            'rhythm_sequence_data': {
-                'name': rhythm_sequence.name,
-                'sequence_data': rhythm_sequence.sequence_data,
-            },
-            'trial_number': 1
-        }
-        return render(request, self.template_name, context)
-    
+            cache.set(key, entry, timeout=self.cache_timeout)
+
+        if self._not_modified(request, entry):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(entry['data'])
+        response['ETag'] = entry['etag']
+        if entry['last_modified']:
+            response['Last-Modified'] = entry['last_modified']
+        patch_cache_control(response, public=True, max_age=self.cache_max_age)
+        return response
+
+    def _not_modified(self, request, entry):
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match:
+            return entry['etag'] in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+        if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+        last_modified = parse_http_date_safe(entry['last_modified'] or '')
+        return bool(if_modified_since and last_modified and last_modified <= if_modified_since)
+
+
+class RhythmSequenceViewSet(CachedReadMixin, viewsets.ModelViewSet):
+    queryset = RhythmSequence.objects.all().order_by('id')
+    serializer_class = RhythmSequenceSerializer
+    cache_namespace = RHYTHM_SEQUENCE_CACHE
+
+    def get_serializer_class(self):
+        if self.action == 'retrieve':
+            return RhythmSequenceDetailSerializer
+        return super().get_serializer_class()
+
 from pathlib import Path
 import matplotlib.pyplot as plt
 import matplotlib
 matplotlib.use('Agg')  # Use a non-GUI backend for Matplotlib
 
-class TrialView(View):
-    template_name = 'experiment/trials.html'
-
-    def get(self, request, trial_number):
-        participant_id = request.session.get('participant_id')
-        if not participant_id:
-            return redirect('welcome_home')
-
-        participant = get_object_or_404(Participant, id=participant_id)
-        experiment_session = get_object_or_404(ExperimentSession, participant=participant)
-        rhythm_sequence = get_object_or_404(RhythmSequence, id=request.session.get('rhythm_sequence_id'))
-
-        audio_dir = os.path.join(settings.MEDIA_ROOT, 'rhythm_audios')
-        audio_filename = f"rhythm_sequence_{rhythm_sequence.id}.wav"
-        audio_path = os.path.join(audio_dir, audio_filename)
-
-        # Generate the audio file if it doesn't exist
-        if not os.path.exists(audio_path):
-            logger.debug(f"Generating audio file for {audio_filename}")
-            # generate_rhythm_audio(rhythm_sequence.sequence_data, audio_dir, audio_filename)
-            generate_rhythm_audio(rhythm_sequence.sequence_data, audio_filename)
-
-        audio_url = os.path.join(settings.MEDIA_URL, f"rhythm_audios/{audio_filename}")
-        context = {
-            'participant_id': participant_id,
-            'complexity_level': experiment_session.complexity_level,
-            'ear_order': experiment_session.ear_order,
-            'rhythm_sequence': rhythm_sequence,
-            'audio_url': audio_url,
-            'trial_number': trial_number,
-        }
-        return render(request, self.template_name, context)
-    
+class TrialView(TrialPageView):
     def post(self, request, trial_number):
         try:
             participant_id = request.session.get('participant_id')
@@ -195,54 +263,206 @@ class TrialView(View):
                 return JsonResponse({'error': 'Participant not found in session.'}, status=400)
 
             # Retrieve experiment session for the participant
-            participant = get_object_or_404(Participant, id=participant_id)
-            experiment_session = get_object_or_404(ExperimentSession, participant=participant)
+            experiment_session = get_participant_session(participant_id)
+            if experiment_session is None:
+                raise Http404("No experiment session for this participant.")
+
+            # Retried submissions short-circuit to the stored result
+            idempotency_key = request.headers.get('Idempotency-Key') or request.POST.get('idempotency_key')
+            if idempotency_key and len(idempotency_key) > TrialSubmission._meta.get_field('idempotency_key').max_length:
+                return JsonResponse({'error': 'Idempotency key is too long.'}, status=400)
+            if idempotency_key:
+                submission = TrialSubmission.objects.filter(session=experiment_session, idempotency_key=idempotency_key).first()
+                if submission:
+                    logger.info(f"Replaying stored result for submission {idempotency_key}")
+                    return JsonResponse(submission.response)
 
-            # Define local directories based on the participant and trial structure
-            participant_dir = os.path.join(settings.MEDIA_ROOT, f"participant_{participant_id}")
-            stimulus_dir = os.path.join(participant_dir, f"stimulus_1")  # Adjust stimulus number dynamically if needed
-            trial_dir = os.path.join(stimulus_dir, f"trial_{trial_number}")
+            background_audio = request.FILES.get('background_audio')
+            audio_hash = hash_uploaded_file(background_audio) if background_audio else ''
+            if audio_hash:
+                submission = TrialSubmission.objects.filter(
+                    session=experiment_session, trial_number=trial_number, audio_hash=audio_hash
+                ).first()
+                if submission:
+                    logger.info(f"Recording for trial {trial_number} already processed as {submission.idempotency_key}")
+                    return JsonResponse(submission.response)
+
+            # Reject unusable recordings before anything is stored or analysed
+            alignment = {}
+            if background_audio:
+                try:
+                    fs, recording = self.read_upload(background_audio)
+                except ValueError as e:
+                    fs, recording = None, None
+                    screen = {'failed': True, 'reason': f"Unreadable WAV file ({e})"}
+                else:
+                    # Only the signal level is screened; align_upload reports whether
+                    # markers were found
+                    screen = prescreen_recording(recording, fs)
+                if screen['failed']:
+                    logger.info(f"Pre-screen rejected trial {trial_number} for participant {participant_id}: {screen['reason']}")
+                    return JsonResponse({'success': False, 'retry': True, 'reason': screen['reason']}, status=422)
+                alignment = self.align_upload(request, recording, fs)
+
+            # Files are stored under the same key locally and in the bucket
+            trial = Trial.objects.filter(session=experiment_session, trial_number=trial_number).first()
+            plan = get_plan(experiment_session.study_id)
+            stimulus_number = plan.stimulus_number(
+                experiment_session.complexity_level, experiment_session.sequence_order,
+                request.session.get('rhythm_sequence_id'),
+            )
+            s3_audio_path = artifact_key('recording', participant_id, trial_number, stimulus_number)
+            s3_plot_path = artifact_key('plot', participant_id, trial_number, stimulus_number)
+            s3_csv_path = artifact_key('analysis_csv', participant_id, stimulus_number=stimulus_number)
+            trial_dir = os.path.dirname(local_artifact_path(s3_audio_path))
             os.makedirs(trial_dir, exist_ok=True)
 
             # Save and upload the background audio file
-            background_audio = request.FILES.get('background_audio')
             if background_audio:
-                local_audio_path = os.path.join(trial_dir, f"recording_trial_{trial_number}.wav")
+                local_audio_path = local_artifact_path(s3_audio_path)
                 with open(local_audio_path, 'wb') as f:
-                    f.write(background_audio.read())
-                s3_audio_path = f"participant_{participant_id}/stimulus_1/trial_{trial_number}/recording_trial_{trial_number}.wav"
-                upload_to_s3(local_audio_path, s3_audio_path)
+                    for chunk in background_audio.chunks():
+                        f.write(chunk)
+                uploaded = upload_to_s3(local_audio_path, s3_audio_path, content_hash=audio_hash)
+                register_artifact(local_audio_path, s3_audio_path, trial=trial, sha256=audio_hash, uploaded=bool(uploaded))
                 logger.info(f"Uploaded audio to S3: {s3_audio_path}")
             else:
                 logger.warning("No background audio file provided in request.")
 
-            # Placeholder for the analysis result
-            analysis_result = {
-                'mean_async_all': 0.5,
-                'sd_async_all': 0.1,
-                'percent_resp_aligned_all': 95.0
-            }
-            output = {'stim_ioi': [500, 510, 520], 'resp_ioi': [495, 505, 515]}  # Replace with actual data
+            # Score the raw taps; REPP runs offline, in New_experiment.py and the sweep
+            scored = self.score_submission(request, trial_number)
+            if scored:
+                output, analysis_result, is_failed = scored
+            else:
+                # Placeholder for the analysis result
+                analysis_result = {
+                    'mean_async_all': 0.5,
+                    'sd_async_all': 0.1,
+                    'percent_resp_aligned_all': 95.0
+                }
+                output = {'stim_ioi': [500, 510, 520], 'resp_ioi': [495, 505, 515]}  # Replace with actual data
+                is_failed = {}
+            analysis_result.update({k: alignment.get(k) for k in ('latency_ms', 'clock_drift_ppm')})
 
             # Generate CSV and upload to S3
-            csv_path = os.path.join(stimulus_dir, 'participant_analysis.csv')
-            self.save_analysis_to_csv(csv_path, output, analysis_result, is_failed={}, trial_number=trial_number, experiment_session=experiment_session)
-            s3_csv_path = f"participant_{participant_id}/stimulus_1/participant_analysis.csv"
+            csv_path = local_artifact_path(s3_csv_path)
+            self.save_analysis_to_csv(csv_path, output, analysis_result, is_failed=is_failed, trial_number=trial_number, experiment_session=experiment_session)
             upload_to_s3(csv_path, s3_csv_path)
-
-            # Plot and save plot image
-            plot_output_dir = trial_dir
-            self.plot_trial_data(output, trial_number, plot_output_dir)
-            plot_path = os.path.join(plot_output_dir, f"plot_trial_{trial_number}.png")
-            s3_plot_path = f"participant_{participant_id}/stimulus_1/trial_{trial_number}/plot_trial_{trial_number}.png"
-            upload_to_s3(plot_path, s3_plot_path)
-
-            return JsonResponse({'success': True})
+            record_trial_summary(experiment_session, stimulus_number, trial_number, analysis_result, is_failed=is_failed)
+
+            # Plot and save plot image; trials with too few taps have nothing to plot
+            plot_path = self.plot_trial_data(output, trial_number, trial_dir)
+            if plot_path:
+                uploaded = upload_to_s3(plot_path, s3_plot_path)
+                register_artifact(plot_path, s3_plot_path, kind='plot', trial=trial, uploaded=bool(uploaded))
+
+            result = {'success': True}
+            if idempotency_key:
+                try:
+                    with transaction.atomic():
+                        TrialSubmission.objects.create(
+                            session=experiment_session,
+                            trial_number=trial_number,
+                            idempotency_key=idempotency_key,
+                            audio_hash=audio_hash,
+                            response=result,
+                        )
+                except IntegrityError:
+                    # A concurrent retry with the same key finished first
+                    logger.info(f"Submission {idempotency_key} was already recorded")
+            if trial_number >= plan.trial_count:
+                complete_session(experiment_session)
+            return JsonResponse(result)
 
         except Exception as e:
             logger.error(f"Unexpected error in TrialView POST: {e}")
             return JsonResponse({'error': str(e)}, status=500)
 
+    def read_upload(self, uploaded_file):
+        # Large uploads are spooled to disk by Django; map those rather than reading them in
+        if hasattr(uploaded_file, 'temporary_file_path'):
+            wav = open_wav(uploaded_file.temporary_file_path())
+            return wav.fs, wav.data
+        try:
+            return wavfile.read(uploaded_file)
+        except struct.error as e:
+            # Truncated headers are unreadable files like any other
+            raise ValueError(str(e))
+        finally:
+            uploaded_file.seek(0)
+
+    def score_submission(self, request, trial_number):
+        """
+        Score the submitted taps against the stimulus onsets and check the
+        browser's summary against that score. Returns the score as
+        (output, analysis_result, is_failed), or None without taps to score.
+        """
+        rhythm_sequence = get_rhythm_sequence(request.session.get('rhythm_sequence_id'))
+        try:
+            tap_times = json.loads(request.POST.get('tap_times', '[]'))
+            stim_onsets = json.loads(request.POST.get('stim_onsets', '[]'))
+            output_latency = float(request.POST.get('output_latency') or 0)
+        except ValueError as e:
+            logger.warning(f"Unreadable tap data for trial {trial_number}: {e}")
+            return None
+        if rhythm_sequence is None or not stim_onsets:
+            return None
+        try:
+            # Taps and the stimulus start share the AudioContext clock (seconds); the
+            # stimulus is heard output_latency after its scheduled start
+            heard_start = stim_onsets[0] + output_latency
+            tap_ms = [(tap - heard_start) * 1000 for tap in tap_times]
+            onset_ms = stimulus_onsets(rhythm_sequence.sequence_data)
+            score = score_taps(tap_ms, onset_ms)
+        except Exception as e:
+            logger.error(f"Error scoring taps for trial {trial_number}: {e}")
+            return None
+
+        client_summary = request.POST.get('tap_summary')
+        if client_summary:
+            try:
+                client_summary = json.loads(client_summary)
+            except ValueError:
+                client_summary = None
+            if not verify_tap_summary(client_summary, score):
+                logger.warning(f"Tap summary for trial {trial_number} does not match the server score: {client_summary} vs {score}")
+        return tap_analysis(score, tap_ms, onset_ms)
+
+    def align_upload(self, request, recording, fs):
+        """Measure latency and clock drift of a recording against the trial's stimulus."""
+        rhythm_sequence = get_rhythm_sequence(request.session.get('rhythm_sequence_id'))
+        if rhythm_sequence is None:
+            return {}
+        try:
+            stimulus_path = local_stimulus_path(ensure_stimulus_audio(rhythm_sequence.sequence_data))
+            with open_wav(stimulus_path) as stimulus:
+                stimulus_fs, stimulus_length = stimulus.fs, len(stimulus)
+            # Browsers often record at 48 kHz: the markers are searched at the recording's
+            # rate, with the stimulus timeline resampled to it
+            alignment = get_marker_aligner(fs).align(
+                recording,
+                resampled_length(stimulus_length, stimulus_fs, fs),
+                start_offset=int(round(self.scheduled_offset(request) * fs)),
+            )
+        except Exception as e:
+            logger.error(f"Error aligning recording: {e}")
+            return {}
+        logger.info(f"Aligned recording: latency {alignment.get('latency_ms')} ms, drift {alignment.get('clock_drift_ppm')} ppm")
+        return alignment
+
+    def scheduled_offset(self, request):
+        """
+        Seconds from the recorder's start to the stimulus's scheduled start, both
+        read from the AudioContext clock by the trial page; 0 when unknown.
+        Measured latency then excludes the scheduling lead-in.
+        """
+        try:
+            recording_start = float(request.POST['recording_start'])
+            stimulus_start = float(json.loads(request.POST.get('stim_onsets', '[]'))[0])
+        except (KeyError, IndexError, TypeError, ValueError):
+            return 0.0
+        return max(stimulus_start - recording_start, 0.0)
+
     def save_analysis_to_csv(self, csv_path, output, analysis_result, is_failed, trial_number, experiment_session):
         try:
             metrics = {
@@ -271,6 +491,7 @@ class TrialView(View):
             logger.error(f"Error saving CSV: {e}")
 
     def plot_trial_data(self, output, trial_number, output_dir):
+        """Plot the trial's IOIs; returns the path of the saved plot, or None if none was saved."""
         try:
             stim_ioi = output.get('stim_ioi', [])
             resp_ioi = output.get('resp_ioi', [])
@@ -278,7 +499,7 @@ class TrialView(View):
             # Check if data exists
             if not stim_ioi or not resp_ioi:
                 logger.warning(f"No data to plot for trial {trial_number}. stim_ioi: {stim_ioi}, resp_ioi: {resp_ioi}")
-                return
+                return None
             
             # Convert IOIs to cumulative onsets if necessary
             stim_onsets = [sum(stim_ioi[:i+1]) for i in range(len(stim_ioi))]
@@ -295,9 +516,28 @@ class TrialView(View):
             plt.savefig(plot_path)
             plt.close()
             logger.info(f"Plot saved at {plot_path}")
+            return plot_path
 
         except Exception as e:
             logger.error(f"Error plotting trial data: {e}")
+            return None
+
+_marker_aligners = {}
+
+
+def get_marker_aligner(fs):
+    """One MarkerAligner per sample rate, so templates are built once per process."""
+    if fs not in _marker_aligners:
+        _marker_aligners[fs] = MarkerAligner(fs)
+    return _marker_aligners[fs]
+
+def hash_uploaded_file(uploaded_file):
+    """Return the SHA-256 hex digest of an uploaded file, leaving it rewound for reading."""
+    digest = hashlib.sha256()
+    for chunk in uploaded_file.chunks():
+        digest.update(chunk)
+    uploaded_file.seek(0)
+    return digest.hexdigest()
 
 def calculate_reaction_time(resp_onsets, stim_onsets):
     reaction_times = []
@@ -0,0 +1,162 @@
+# experiment/warmup.py
+"""
+Process warm-up, so the first trial on a fresh instance does not pay for
+imports, template building and stimulus synthesis.
+
+`start_warmup` is called when a web worker loads the WSGI/ASGI application
+and when a Celery worker process starts. It opens the database, cache and
+storage connections, imports the analysis stack, builds the per-sample-rate
+templates and caches, and renders or downloads the stimulus of every rhythm
+in the default and active study plans. The readiness endpoint reports 503
+until it has finished.
+
+In 'background' mode the work runs in a daemon thread. Django database
+connections are per thread, so in that mode the database step only checks
+the connection. 'blocking' mode runs in the calling thread, so its
+connections are kept for the requests that thread serves.
+"""
+import importlib
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from .models import Study
+
+logger = logging.getLogger(__name__)
+
+WARMUP_MODES = ('background', 'blocking', 'off')
+ANALYSIS_MODULES = (
+    'scipy.signal', 'pandas', 'matplotlib.pyplot', 'repp.analysis', 'repp.stimulus', 'experiment.views',
+)
+
+_lock = threading.Lock()
+_status = {'state': 'idle', 'steps': {}, 'errors': {}}
+
+
+def warmup_status():
+    """Copy of the warm-up state: 'idle', 'warming', 'ready' or 'off', with seconds per step and step errors."""
+    with _lock:
+        return {'state': _status['state'], 'steps': dict(_status['steps']), 'errors': dict(_status['errors'])}
+
+
+def is_ready():
+    return warmup_status()['state'] in ('ready', 'off')
+
+
+def open_database():
+    for alias in connections:
+        connections[alias].ensure_connection()
+
+
+def open_cache():
+    cache.get('warmup')
+
+
+def open_storage(s3_client=None):
+    from .aws import get_s3_client
+
+    # The client and its connection pool are shared by the whole process
+    (s3_client or get_s3_client()).head_bucket(Bucket=settings.AWS_STORAGE_BUCKET_NAME)
+
+
+def import_analysis_stack():
+    for module in ANALYSIS_MODULES:
+        importlib.import_module(module)
+
+
+def warm_analysis_paths():
+    """Build the per-sample-rate templates the trial view uses."""
+    import matplotlib.pyplot as plt
+    import numpy as np
+    from repp.config import sms_tapping
+
+    from .prescreen import prescreen_recording
+    from .synth import with_markers
+    from .views import get_marker_aligner
+
+    fs = sms_tapping.FS
+    recording = with_markers(np.zeros(fs // 2), fs)
+    prescreen_recording(recording, fs)
+    get_marker_aligner(fs).align(recording, len(recording))
+    # matplotlib loads its font cache on the first drawn figure
+    figure = plt.figure()
+    figure.canvas.draw()
+    plt.close(figure)
+
+
+def prefetch_stimuli():
+    """Render or download the stimulus of every rhythm in the default and active study plans."""
+    from .scoring import stimulus_onsets
+    from .studies import get_plan
+    from .views import ensure_stimulus_audio
+
+    plans = [get_plan()] + [get_plan(study_id) for study_id in Study.objects.filter(is_active=True).values_list('id', flat=True)]
+    rhythms = {rhythm.id: rhythm for plan in plans for _level, level_rhythms in plan.rhythm_sets for rhythm in level_rhythms}
+    for rhythm in rhythms.values():
+        ensure_stimulus_audio(list(rhythm.intervals))
+        stimulus_onsets(list(rhythm.intervals))
+    logger.info(f"Prefetched {len(rhythms)} stimuli")
+
+
+def _run_step(name, step):
+    started = time.perf_counter()
+    try:
+        step()
+    except Exception as e:
+        logger.error(f"Warm-up step '{name}' failed: {e}")
+        with _lock:
+            _status['errors'][name] = str(e)
+    with _lock:
+        _status['steps'][name] = round(time.perf_counter() - started, 3)
+
+
+def warm_up(s3_client=None):
+    """
+    Run every warm-up step once per process. A failed step is logged and
+    reported but does not hold back readiness: the request that needs it
+    will retry it, as it would without warm-up.
+    """
+    with _lock:
+        if _status['state'] in ('warming', 'ready'):
+            return
+        _status['state'] = 'warming'
+    started = time.perf_counter()
+    steps = [
+        ('database', open_database),
+        ('cache', open_cache),
+        ('storage', lambda: open_storage(s3_client)),
+        ('imports', import_analysis_stack),
+        ('analysis', warm_analysis_paths),
+        ('stimuli', prefetch_stimuli),
+    ]
+    for name, step in steps:
+        _run_step(name, step)
+    with _lock:
+        _status['state'] = 'ready'
+        errors = list(_status['errors'])
+    logger.info(f"Warm-up finished in {time.perf_counter() - started:.2f}s" + (f", failed: {errors}" if errors else ""))
+
+
+def _warm_up_in_thread():
+    try:
+        warm_up()
+    finally:
+        connections.close_all()
+
+
+def start_warmup(mode=None):
+    """Warm this process up according to `mode` (default: the WARMUP setting)."""
+    mode = mode or settings.WARMUP
+    if mode not in WARMUP_MODES:
+        raise ValueError(f"WARMUP must be one of {WARMUP_MODES}, not {mode!r}")
+    if mode == 'off':
+        with _lock:
+            _status['state'] = 'off'
+    elif mode == 'blocking':
+        warm_up()
+    else:
+        threading.Thread(target=_warm_up_in_thread, name='warmup', daemon=True).start()
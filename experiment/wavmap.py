@@ -0,0 +1,134 @@
+# experiment/wavmap.py
+"""
+Memory-mapped WAV access. Only the header is read up front; samples are paged
+in from disk as the returned views are touched, so analysis stages can work on
+windows around markers and onsets without loading whole recordings.
+
+Only NumPy is used here so the standalone experiment script can import it.
+"""
+import os
+import struct
+
+import numpy as np
+
+from .prescreen import to_float_mono
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+_DTYPES = {
+    (WAVE_FORMAT_PCM, 8): np.dtype('u1'),
+    (WAVE_FORMAT_PCM, 16): np.dtype('<i2'),
+    (WAVE_FORMAT_PCM, 32): np.dtype('<i4'),
+    (WAVE_FORMAT_IEEE_FLOAT, 32): np.dtype('<f4'),
+    (WAVE_FORMAT_IEEE_FLOAT, 64): np.dtype('<f8'),
+}
+
+
+def _read_header(f):
+    """
+    Return (format, channels, fs, bits, data_offset, data_size) from a RIFF/WAVE file.
+    Truncated or malformed headers raise ValueError, like every other unreadable file.
+    """
+    header = f.read(12)
+    if len(header) < 12:
+        raise ValueError("File is too short for a WAV header")
+    riff, _size, wave = struct.unpack('<4sI4s', header)
+    if riff != b'RIFF' or wave != b'WAVE':
+        raise ValueError("Not a RIFF/WAVE file")
+    fmt = None
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            raise ValueError("No data chunk found")
+        chunk_id, chunk_size = struct.unpack('<4sI', header)
+        if chunk_id == b'fmt ':
+            body = f.read(chunk_size)
+            if len(body) < 16:
+                raise ValueError("Truncated fmt chunk")
+            audio_format, channels, fs, _byte_rate, _block_align, bits = struct.unpack('<HHIIHH', body[:16])
+            if channels == 0:
+                raise ValueError("WAV file declares no channels")
+            if audio_format == WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                audio_format = struct.unpack('<H', body[24:26])[0]
+            fmt = (audio_format, channels, fs, bits)
+        elif chunk_id == b'data':
+            if fmt is None:
+                raise ValueError("data chunk before fmt chunk")
+            return fmt + (f.tell(), chunk_size)
+        else:
+            f.seek(chunk_size, os.SEEK_CUR)
+        if chunk_size % 2:
+            f.seek(1, os.SEEK_CUR)  # Chunks are word aligned
+
+
+class MappedWav:
+    """
+    A WAV file whose PCM payload is exposed as a read-only `np.memmap` of shape
+    (frames, channels). `channel`, `segment` and `window` return views into the
+    map, so nothing is copied until a caller converts or computes on them.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            audio_format, self.channels, self.fs, self.bits, offset, size = _read_header(f)
+            file_size = os.fstat(f.fileno()).st_size
+        self.dtype = _DTYPES.get((audio_format, self.bits))
+        if self.dtype is None:
+            raise ValueError(f"Unsupported WAV encoding (format {audio_format}, {self.bits} bits)")
+        frame_size = self.dtype.itemsize * self.channels
+        # Recorders that were interrupted can leave a data size larger than the file
+        self.frames = min(size, file_size - offset) // frame_size
+        if self.frames:
+            self.data = np.memmap(path, dtype=self.dtype, mode='r', offset=offset, shape=(self.frames, self.channels))
+        else:
+            self.data = np.zeros((0, self.channels), dtype=self.dtype)
+
+    def __len__(self):
+        return self.frames
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        mmap = getattr(self.data, '_mmap', None)
+        self.data = None
+        if mmap is not None:
+            mmap.close()
+
+    @property
+    def duration(self):
+        return self.frames / self.fs
+
+    def to_frames(self, seconds):
+        return int(round(seconds * self.fs))
+
+    def channel(self, index=0):
+        """Zero-copy (strided) view of one channel."""
+        return self.data[:, index]
+
+    def segment(self, start, stop=None, channel=None):
+        """Zero-copy view of frames [start, stop), optionally of a single channel."""
+        start = max(int(start), 0)
+        stop = self.frames if stop is None else min(int(stop), self.frames)
+        view = self.data[start:stop]
+        return view if channel is None else view[:, channel]
+
+    def window(self, centre, before, after, channel=None):
+        """Zero-copy view of the frames from `before` seconds ahead of `centre` seconds to `after` seconds past it."""
+        centre = self.to_frames(centre)
+        return self.segment(centre - self.to_frames(before), centre + self.to_frames(after), channel)
+
+    def float_segment(self, start, stop=None):
+        """Float mono copy of just the requested frames."""
+        return to_float_mono(self.segment(start, stop))
+
+
+def open_wav(path):
+    """Open a WAV file for memory-mapped access; use as a context manager to release the map."""
+    return MappedWav(path)
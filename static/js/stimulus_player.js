@@ -0,0 +1,102 @@
+// static/js/stimulus_player.js
+//
+// Fetches, decodes and schedules stimulus audio with the Web Audio API.
+//
+// Stimulus URLs are content-addressed (/stimuli/<fingerprint>.wav), so their
+// bytes never change. The practice page preloads every stimulus of the session
+// into Cache Storage and decodes it; the trial page then decodes from that
+// cache without touching the network. Playback is scheduled on the
+// AudioContext clock, the same clock the trial page reads for taps and for
+// the recording start, so stimulus onsets and taps need no clock conversion.
+(function (global) {
+  const CACHE_NAME = "rhythm-stimuli-v1";
+  const LEAD_IN_SECONDS = 0.5; // Scheduling headroom so playback never starts late
+
+  class StimulusPlayer {
+    constructor(audioContext, { cacheName = CACHE_NAME } = {}) {
+      this.audioContext = audioContext;
+      this.cacheName = cacheName;
+      this.buffers = new Map(); // url -> Promise<AudioBuffer>
+    }
+
+    // Cache Storage is only available in secure contexts; elsewhere the
+    // immutable HTTP caching of stimulus responses serves repeat fetches.
+    async fetchBytes(url) {
+      if (global.caches) {
+        const cache = await global.caches.open(this.cacheName);
+        let response = await cache.match(url);
+        if (!response) {
+          response = await fetch(url, { credentials: "same-origin" });
+          if (!response.ok) {
+            throw new Error(`Stimulus ${url} returned ${response.status}`);
+          }
+          await cache.put(url, response.clone());
+        }
+        return response.arrayBuffer();
+      }
+      const response = await fetch(url, {
+        credentials: "same-origin",
+        cache: "force-cache",
+      });
+      if (!response.ok) {
+        throw new Error(`Stimulus ${url} returned ${response.status}`);
+      }
+      return response.arrayBuffer();
+    }
+
+    // Decoded buffer for a stimulus; each URL is fetched and decoded once per page.
+    load(url) {
+      if (!this.buffers.has(url)) {
+        const pending = this.fetchBytes(url).then(
+          (bytes) =>
+            new Promise((resolve, reject) =>
+              // Callback form for Safari, which lacks the promise form
+              this.audioContext.decodeAudioData(bytes, resolve, reject)
+            )
+        );
+        // A failed load is retried on the next call instead of being cached
+        pending.catch(() => this.buffers.delete(url));
+        this.buffers.set(url, pending);
+      }
+      return this.buffers.get(url);
+    }
+
+    // Load every URL; `onProgress(done, total)` is called as each one is decoded.
+    async preload(urls, onProgress) {
+      let done = 0;
+      await Promise.all(
+        urls.map((url) =>
+          this.load(url).then((buffer) => {
+            done++;
+            if (onProgress) onProgress(done, urls.length);
+            return buffer;
+          })
+        )
+      );
+    }
+
+    // Start a loaded stimulus at context time `when` (default: now plus the
+    // lead-in). Resolves to {start, end, source}, all on the context clock.
+    async schedule(url, { when, pan = 0 } = {}) {
+      const buffer = await this.load(url);
+      const source = this.audioContext.createBufferSource();
+      source.buffer = buffer;
+      let node = source;
+      if (pan && this.audioContext.createStereoPanner) {
+        const panner = this.audioContext.createStereoPanner();
+        panner.pan.value = pan;
+        node.connect(panner);
+        node = panner;
+      }
+      node.connect(this.audioContext.destination);
+
+      const earliest = this.audioContext.currentTime + LEAD_IN_SECONDS;
+      const start = Math.max(when === undefined ? earliest : when, earliest);
+      source.start(start);
+      return { start, end: start + buffer.duration, source };
+    }
+  }
+
+  StimulusPlayer.LEAD_IN_SECONDS = LEAD_IN_SECONDS;
+  global.StimulusPlayer = StimulusPlayer;
+})(window);
@@ -0,0 +1,90 @@
+// static/js/tap_scorer.js
+//
+// Scores a trial's taps against the stimulus onsets as soon as the trial ends.
+// This mirrors score_taps in experiment/scoring.py; the server reruns that on
+// the raw taps and checks this summary against it. Times are in ms from the
+// start of the stimulus file; thresholds come from the trial page so both
+// sides use the same ones.
+(function (global) {
+  // matchWindowMs, narrowed to a share of the rhythm's shortest IOI
+  function matchWindow(onsets, matchWindowMs, matchWindowFraction) {
+    let window = matchWindowMs;
+    for (let i = 1; i < onsets.length; i++) {
+      const ioi = onsets[i] - onsets[i - 1];
+      if (ioi > 0) window = Math.min(window, matchWindowFraction * ioi);
+    }
+    return window;
+  }
+
+  // Index of the nearest of the sorted taps within window of the onset that
+  // is not in used; the earlier one on a tie
+  function nearestUnusedTap(taps, onset, window, used) {
+    let low = 0;
+    let high = taps.length;
+    while (low < high) {
+      const mid = (low + high) >> 1;
+      if (taps[mid] < onset - window) low = mid + 1;
+      else high = mid;
+    }
+    let best = null;
+    for (let i = low; i < taps.length && taps[i] <= onset + window; i++) {
+      if (
+        !used.has(i) &&
+        (best === null || Math.abs(taps[i] - onset) < Math.abs(taps[best] - onset))
+      ) {
+        best = i;
+      }
+    }
+    return best;
+  }
+
+  // Onsets are matched to taps one to one, each onset in turn taking the
+  // nearest unused tap within the match window. Returns a summary of the
+  // asynchronies (tap minus onset); quality is "ok", "no_taps" or
+  // "too_few_aligned".
+  function scoreTaps(
+    tapMs,
+    onsetMs,
+    { matchWindowMs, minPercentAligned, matchWindowFraction }
+  ) {
+    const taps = Float64Array.from(tapMs).sort();
+    const onsets = Float64Array.from(onsetMs).sort();
+    const window = matchWindow(onsets, matchWindowMs, matchWindowFraction);
+    const asynchronies = [];
+    const used = new Set();
+    for (const onset of onsets) {
+      const index = nearestUnusedTap(taps, onset, window, used);
+      if (index !== null) {
+        used.add(index);
+        asynchronies.push(taps[index] - onset);
+      }
+    }
+
+    const matched = asynchronies.length;
+    const percentAligned = onsetMs.length ? (100 * matched) / onsetMs.length : 0;
+    let quality = "ok";
+    if (!taps.length) quality = "no_taps";
+    else if (percentAligned < minPercentAligned) quality = "too_few_aligned";
+
+    let mean = null;
+    let sd = null;
+    if (matched) {
+      mean = asynchronies.reduce((a, b) => a + b, 0) / matched;
+      sd = 0;
+      if (matched > 1) {
+        const squares = asynchronies.reduce((a, b) => a + (b - mean) ** 2, 0);
+        sd = Math.sqrt(squares / (matched - 1));
+      }
+    }
+    return {
+      tap_count: taps.length,
+      matched: matched,
+      mean_asynchrony: mean,
+      sd_asynchrony: sd,
+      percent_aligned: percentAligned,
+      quality: quality,
+    };
+  }
+
+  global.TapScorer = { scoreTaps };
+})(window);